@@ -1,11 +1,165 @@
+import hashlib
+import os
+import pickle
+import re
+from collections import namedtuple
+import numpy as np
 import pandas as pd
-import numpy_financial as npf
-import openpyxl
+import instrumentation
+import model_results
+import summary_metrics
 
-def load_input_file(filepath):
-    input_data = pd.read_excel(filepath, sheet_name='Input Details')
-    scenario_input_data = pd.read_excel(filepath, sheet_name='Scenarios')
-    return input_data, scenario_input_data
+INPUT_COLUMNS = [
+    'Capacity (kWp)',
+    'Specific Yield (kWh/kWp/year)',
+    'Annual Performance Drop (%)',
+    'Years Projection',
+    'Electricity Tariff (RM/kWh)',
+    'TNB Buyback Rate (RM/kWh)',
+    'Cost per kWp (RM/kWp)',
+    'Additional Structure Cost (RM)',
+    'OPEX (RM)',
+    'Tariff Hike Percentage (%)',
+    'Tariff Hike Interval (years)',
+    'Buyback Hike Percentage (%)',
+    'Buyback Hike Interval (years)',
+    'OPEX Hike Percentage (%)',
+    'OPEX Hike Interval (years)',
+    'OPEX Start Year',
+    'Energy Export Allowed',
+]
+
+SCENARIO_COLUMNS = ['Scenario Name', 'Baseline Consumption (kWh/year)']
+MAX_CONSUMPTION_CHANGES = 5
+
+class InputValidationError(ValueError):
+    def __init__(self, problems):
+        self.problems = problems
+        super().__init__('Invalid input workbook:\n' + '\n'.join(f'  - {problem}' for problem in problems))
+
+INTEGER_INPUT_COLUMNS = ['Years Projection', 'Tariff Hike Interval (years)', 'Buyback Hike Interval (years)',
+                         'OPEX Hike Interval (years)', 'OPEX Start Year']
+POSITIVE_INPUT_COLUMNS = ['Years Projection', 'Tariff Hike Interval (years)', 'Buyback Hike Interval (years)',
+                          'OPEX Hike Interval (years)']
+
+# Excel row numbers (the header is row 1) of the flagged rows, shortened for the error report
+def _sheet_rows(data, flagged):
+    rows = (data.index[np.asarray(flagged)] + 2).tolist()
+    return ', '.join(map(str, rows[:10])) + (f' and {len(rows) - 10} more' if len(rows) > 10 else '')
+
+def _check_numbers(data, sheet, column, problems, integer=False, positive=False, required=None):
+    values = pd.to_numeric(data[column], errors='coerce').to_numpy(dtype=float)
+    required = np.ones(len(data), dtype=bool) if required is None else required
+    missing = required & np.isnan(values)
+    if missing.any():
+        problems.append(f"'{sheet}' column '{column}' needs a number in rows {_sheet_rows(data, missing)}")
+    present = ~np.isnan(values)
+    fractional = present & (values != np.round(values))
+    if integer and fractional.any():
+        problems.append(f"'{sheet}' column '{column}' needs whole numbers in rows {_sheet_rows(data, fractional)}")
+    too_small = present & (values < 1)
+    if positive and too_small.any():
+        problems.append(f"'{sheet}' column '{column}' must be at least 1 in rows {_sheet_rows(data, too_small)}")
+
+def _is_boolean(value):
+    return isinstance(value, (bool, np.bool_)) or (isinstance(value, (int, float, np.number)) and value in (0, 1))
+
+# Checks every required column and value up front and raises one InputValidationError listing all
+# problems, instead of failing part-way through run_model on a KeyError or int(NaN).
+def validate_inputs(input_data, scenario_input_data):
+    problems = [f"'Input Details' is missing column '{column}'" for column in INPUT_COLUMNS if column not in input_data]
+    problems += [f"'Scenarios' is missing column '{column}'" for column in SCENARIO_COLUMNS if column not in scenario_input_data]
+
+    for column in INPUT_COLUMNS[:-1]:
+        if column in input_data:
+            _check_numbers(input_data, 'Input Details', column, problems,
+                           integer=column in INTEGER_INPUT_COLUMNS, positive=column in POSITIVE_INPUT_COLUMNS)
+    if 'Energy Export Allowed' in input_data:
+        not_boolean = ~input_data['Energy Export Allowed'].map(_is_boolean).to_numpy(dtype=bool)
+        if not_boolean.any():
+            problems.append(f"'Input Details' column 'Energy Export Allowed' needs TRUE or FALSE in rows {_sheet_rows(input_data, not_boolean)}")
+
+    if 'Scenario Name' in scenario_input_data:
+        unnamed = scenario_input_data['Scenario Name'].isna().to_numpy()
+        if unnamed.any():
+            problems.append(f"'Scenarios' column 'Scenario Name' is empty in rows {_sheet_rows(scenario_input_data, unnamed)}")
+    if 'Baseline Consumption (kWh/year)' in scenario_input_data:
+        _check_numbers(scenario_input_data, 'Scenarios', 'Baseline Consumption (kWh/year)', problems)
+    for i in range(1, MAX_CONSUMPTION_CHANGES + 1):
+        change_key = f'Change {i} Percentage Change'
+        if change_key not in scenario_input_data:
+            continue
+        changes = scenario_input_data[change_key]
+        not_numeric = changes.notna().to_numpy() & pd.to_numeric(changes, errors='coerce').isna().to_numpy()
+        if not_numeric.any():
+            problems.append(f"'Scenarios' column '{change_key}' needs a number in rows {_sheet_rows(scenario_input_data, not_numeric)}")
+        for key in (f'Change {i} Start Year', f'Change {i} Duration'):
+            if key not in scenario_input_data:
+                problems.append(f"'Scenarios' is missing column '{key}'")
+            else:
+                _check_numbers(scenario_input_data, 'Scenarios', key, problems, integer=True, required=changes.notna().to_numpy())
+
+    if problems:
+        raise InputValidationError(problems)
+
+SIDECAR_SUFFIX = '.sidecar.pkl'
+SIDECAR_FORMAT_VERSION = 1
+
+def _file_digest(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as workbook:
+        for block in iter(lambda: workbook.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Re-reading the workbook is always safe, so a sidecar that cannot be used for any reason (truncated,
+# written by another pandas or model version, not the expected dict) is ignored
+def _read_sidecar(filepath, stat):
+    try:
+        with open(filepath + SIDECAR_SUFFIX, 'rb') as sidecar_file:
+            sidecar = pickle.load(sidecar_file)
+        if sidecar.get('format') != SIDECAR_FORMAT_VERSION or sidecar['size'] != stat.st_size:
+            return None
+        if sidecar['mtime_ns'] != stat.st_mtime_ns and sidecar['sha256'] != _file_digest(filepath):
+            return None
+        return sidecar['input_data'], sidecar['scenario_input_data']
+    except Exception:
+        return None
+
+def _write_sidecar(filepath, stat, input_data, scenario_input_data):
+    sidecar = {
+        'format': SIDECAR_FORMAT_VERSION,
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'sha256': _file_digest(filepath),
+        'input_data': input_data,
+        'scenario_input_data': scenario_input_data,
+    }
+    temporary_path = f'{filepath}{SIDECAR_SUFFIX}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as sidecar_file:
+        pickle.dump(sidecar, sidecar_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, filepath + SIDECAR_SUFFIX)
+
+# Opens the workbook once for both sheets and validates it. With sidecar=True the parsed sheets are
+# also kept in a binary file next to the workbook and reused while the workbook's mtime (or content
+# hash) is unchanged, so repeated runs skip Excel parsing.
+def load_input_file(filepath, validate=True, sidecar=False):
+    stat = os.stat(filepath)
+    with instrumentation.stage('load_input_file', bytes_read=stat.st_size) as record:
+        sheets = _read_sidecar(filepath, stat) if sidecar else None
+        if sheets is None:
+            with pd.ExcelFile(filepath) as workbook:
+                missing_sheets = [name for name in ('Input Details', 'Scenarios') if name not in workbook.sheet_names]
+                if missing_sheets:
+                    raise InputValidationError([f"workbook has no '{name}' sheet" for name in missing_sheets])
+                sheets = workbook.parse('Input Details'), workbook.parse('Scenarios')
+            if sidecar:
+                _write_sidecar(filepath, stat, *sheets)
+        record.add(rows=len(sheets[0]), scenarios=len(sheets[1]))
+    if validate:
+        with instrumentation.stage('validate_inputs', rows=len(sheets[0])):
+            validate_inputs(*sheets)
+    return sheets
 
 def generate_consumption_scenarios(years, baseline, percentage_changes):
     scenarios = []
@@ -16,158 +170,375 @@ def generate_consumption_scenarios(years, baseline, percentage_changes):
         scenarios.append(baseline)
     return scenarios
 
-def run_model(input_data, scenario_input_data, progress_var):
-    scenario_results = {}
-
-    for input_index, input_row in input_data.iterrows():
-        capacity_kWp = input_row['Capacity (kWp)']
-        specific_yield = input_row['Specific Yield (kWh/kWp/year)']
-        performance_drop = input_row['Annual Performance Drop (%)'] / 100
-        years_projection = int(input_row['Years Projection'])
-        base_electricity_tariff = input_row['Electricity Tariff (RM/kWh)']
-        base_tnb_buyback_rate = input_row['TNB Buyback Rate (RM/kWh)']
-        cost_per_kwp = input_row['Cost per kWp (RM/kWp)']
-        additional_structure_cost = input_row['Additional Structure Cost (RM)']
-        base_opex = input_row['OPEX (RM)']
-        tariff_hike_percentage = input_row['Tariff Hike Percentage (%)'] / 100
-        tariff_hike_interval = int(input_row['Tariff Hike Interval (years)'])
-        buyback_hike_percentage = input_row['Buyback Hike Percentage (%)'] / 100
-        buyback_hike_interval = int(input_row['Buyback Hike Interval (years)'])
-        opex_hike_percentage = input_row['OPEX Hike Percentage (%)'] / 100
-        opex_hike_interval = int(input_row['OPEX Hike Interval (years)'])
-        opex_start_year = int(input_row['OPEX Start Year'])
-        energy_export_allowed = input_row['Energy Export Allowed']
-
-        base_investment_cost = capacity_kWp * cost_per_kwp
-        total_investment_cost = base_investment_cost + additional_structure_cost
-        tax_saving_gita = 0.3 * base_investment_cost
-
-        scenarios = {}
-        for index, row in scenario_input_data.iterrows():
-            scenario_name = row['Scenario Name']
-            baseline_consumption = row['Baseline Consumption (kWh/year)']
-            percentage_changes = []
-            for i in range(1, 6):
-                change_key = f'Change {i} Percentage Change'
-                start_year_key = f'Change {i} Start Year'
-                duration_key = f'Change {i} Duration'
-                if change_key in row and not pd.isna(row[change_key]):
-                    percentage_changes.append({
-                        'Percentage Change': row[change_key],
-                        'Start Year': int(row[start_year_key]),
-                        'Duration': int(row[duration_key])
-                    })
-            scenarios[scenario_name] = generate_consumption_scenarios(years_projection, baseline_consumption, percentage_changes)
-
-        for scenario_name, annual_consumptions in scenarios.items():
-            pv_generation_rates = []
-            pv_generations = []
-            consumed_pv_powers = []
-            excess_energy_exported = []
-            energy_savings = []
-            exported_energy_savings = []
-            tax_savings = []
-            electricity_tariffs = []
-            cumulative_cash_flows_total = []
-            cumulative_cash_flows_base = []
-            tnb_buyback_rates = []
-            opex_values = []
-            capital_expenses = []
-            capital_expenses_base = []
-            total_expenses = []
-            total_expenses_base = []
-            total_incomes = []
-
-            cumulative_savings_total = 0
-            cumulative_savings_base = 0
-
-            electricity_tariff = base_electricity_tariff
-            tnb_buyback_rate = base_tnb_buyback_rate
-            opex = base_opex
-
-            for year in range(1, years_projection + 1):
-                if (year - 1) % tariff_hike_interval == 0 and year > 1:
-                    electricity_tariff = base_electricity_tariff * ((1 + tariff_hike_percentage) ** ((year - 1) // tariff_hike_interval))
-                electricity_tariffs.append(electricity_tariff)
-
-                if (year - 1) % buyback_hike_interval == 0 and year > 1:
-                    tnb_buyback_rate *= (1 + buyback_hike_percentage)
-                tnb_buyback_rates.append(tnb_buyback_rate)
-
-                if year >= opex_start_year:
-                    if (year - opex_start_year) % opex_hike_interval == 0 and year > opex_start_year:
-                        opex *= (1 + opex_hike_percentage)
-                    opex_values.append(opex)
-                else:
-                    opex_values.append(0)
-
-                pv_generation_rate = specific_yield * ((1 - performance_drop) ** (year - 1))
-                pv_generation_rates.append(pv_generation_rate)
-
-                pv_generation = capacity_kWp * pv_generation_rate
-                pv_generations.append(pv_generation)
-
-                consumed_pv_power = min(pv_generation, annual_consumptions[year - 1])
-                excess_energy = max(0, pv_generation - annual_consumptions[year - 1]) if energy_export_allowed else 0
-                consumed_pv_powers.append(consumed_pv_power)
-                excess_energy_exported.append(excess_energy)
-
-                consumption_saving = consumed_pv_power * electricity_tariff
-                export_saving = excess_energy * tnb_buyback_rate if energy_export_allowed else 0
-                energy_savings.append(consumption_saving)
-                exported_energy_savings.append(export_saving)
-
-                tax_saving = tax_saving_gita if year == 1 else 0
-                tax_savings.append(tax_saving)
-
-                capital_expense = total_investment_cost if year == 1 else 0
-                capital_expense_base = base_investment_cost if year == 1 else 0
-                capital_expenses.append(capital_expense)
-                capital_expenses_base.append(capital_expense_base)
-
-                total_expense = opex_values[-1] + capital_expense
-                total_expense_base = opex_values[-1] + capital_expense_base
-                total_expenses.append(total_expense)
-                total_expenses_base.append(total_expense_base)
-
-                total_income = consumption_saving + export_saving + tax_saving
-                total_incomes.append(total_income)
-
-                annual_cash_flow = total_income - total_expense
-                cumulative_savings_total += annual_cash_flow
-                cumulative_savings_base += (total_income - total_expense_base)
-                cumulative_cash_flows_total.append(cumulative_savings_total)
-                cumulative_cash_flows_base.append(cumulative_savings_base)
-
-            data = {
-                'Year': list(range(1, years_projection + 1)),
-                'PV Generation Rate (kWh/kWp/year)': pv_generation_rates,
-                'PV Generation (kWh/year)': pv_generations,
-                'Consumed PV Power (kWh/year)': consumed_pv_powers,
-                'Excess Energy Exported (kWh/year)': excess_energy_exported,
-                'Electricity Tariff (RM/kWh)': electricity_tariffs,
-                'TNB Buyback Rate (RM/kWh)': tnb_buyback_rates,
-                'Energy Consumption Saving (RM)': energy_savings,
-                'Exported Energy Saving (RM)': exported_energy_savings,
-                'Tax Saving from GITA (RM)': tax_savings,
-                'OPEX (RM)': opex_values,
-                'Capital Expense (base) (RM)': capital_expenses_base,
-                'Capital Expense (RM)': capital_expenses,
-                'Total Expense (base)(RM)': total_expenses_base,
-                'Total Expense (RM)': total_expenses,
-                'Total Income (RM)': total_incomes,
-                'Cumulative Cash Flow (base) (RM)': cumulative_cash_flows_base,
-                'Cumulative Cash Flow (RM)': cumulative_cash_flows_total,
-            }
-
-            scenario_key = f"Input_{input_index + 1}_{scenario_name}"
-            scenario_results[scenario_key] = pd.DataFrame(data)
-
-            progress_var.set(progress_var.get() + (30 / len(input_data) / len(scenarios)))
+RESULT_COLUMNS = [
+    'Year',
+    'PV Generation Rate (kWh/kWp/year)',
+    'PV Generation (kWh/year)',
+    'Consumed PV Power (kWh/year)',
+    'Excess Energy Exported (kWh/year)',
+    'Electricity Tariff (RM/kWh)',
+    'TNB Buyback Rate (RM/kWh)',
+    'Energy Consumption Saving (RM)',
+    'Exported Energy Saving (RM)',
+    'Tax Saving from GITA (RM)',
+    'OPEX (RM)',
+    'Capital Expense (base) (RM)',
+    'Capital Expense (RM)',
+    'Total Expense (base)(RM)',
+    'Total Expense (RM)',
+    'Total Income (RM)',
+    'Cumulative Cash Flow (base) (RM)',
+    'Cumulative Cash Flow (RM)',
+]
+
+CASH_FLOW_COLUMNS = ['Annual Cash Flow (base) (RM)', 'Annual Cash Flow (RM)']
+
+# Typed parameter block: one structured record per Input Details row, with percentages as fractions
+PARAMETER_FIELDS = [
+    ('capacity_kWp', 'Capacity (kWp)', np.float64, 1),
+    ('specific_yield', 'Specific Yield (kWh/kWp/year)', np.float64, 1),
+    ('performance_drop', 'Annual Performance Drop (%)', np.float64, 100),
+    ('years_projection', 'Years Projection', np.int64, 1),
+    ('electricity_tariff', 'Electricity Tariff (RM/kWh)', np.float64, 1),
+    ('tnb_buyback_rate', 'TNB Buyback Rate (RM/kWh)', np.float64, 1),
+    ('cost_per_kwp', 'Cost per kWp (RM/kWp)', np.float64, 1),
+    ('additional_structure_cost', 'Additional Structure Cost (RM)', np.float64, 1),
+    ('opex', 'OPEX (RM)', np.float64, 1),
+    ('tariff_hike_percentage', 'Tariff Hike Percentage (%)', np.float64, 100),
+    ('tariff_hike_interval', 'Tariff Hike Interval (years)', np.int64, 1),
+    ('buyback_hike_percentage', 'Buyback Hike Percentage (%)', np.float64, 100),
+    ('buyback_hike_interval', 'Buyback Hike Interval (years)', np.int64, 1),
+    ('opex_hike_percentage', 'OPEX Hike Percentage (%)', np.float64, 100),
+    ('opex_hike_interval', 'OPEX Hike Interval (years)', np.int64, 1),
+    ('opex_start_year', 'OPEX Start Year', np.int64, 1),
+    ('energy_export_allowed', 'Energy Export Allowed', np.bool_, 1),
+]
+PARAMETER_DTYPE = np.dtype([(name, dtype) for name, _, dtype, _ in PARAMETER_FIELDS])
+
+def input_parameters(input_data):
+    params = np.empty(len(input_data), dtype=PARAMETER_DTYPE)
+    for name, column, dtype, scale in PARAMETER_FIELDS:
+        values = input_data[column].to_numpy()
+        if dtype is np.bool_:
+            params[name] = values.astype(bool)
+        elif dtype is np.int64:
+            params[name] = values.astype(float).astype(np.int64)
+        else:
+            params[name] = values.astype(float) / scale
+    return params
+
+# Parses the Scenarios sheet once into a compact change table. A repeated scenario name keeps the
+# position of its first row and the values of its last row, like filling a dict row by row.
+def parse_scenarios(scenario_input_data):
+    rows = {}
+    for position, scenario_name in enumerate(scenario_input_data['Scenario Name']):
+        rows[scenario_name] = position
+    rows_taken = list(rows.values())
+    scenario_rows = scenario_input_data.iloc[rows_taken]
+
+    n_scenarios = len(rows_taken)
+    percentage_changes = np.zeros((n_scenarios, MAX_CONSUMPTION_CHANGES))
+    start_years = np.zeros((n_scenarios, MAX_CONSUMPTION_CHANGES), dtype=int)
+    durations = np.zeros((n_scenarios, MAX_CONSUMPTION_CHANGES), dtype=int)
+    for i in range(1, MAX_CONSUMPTION_CHANGES + 1):
+        change_key = f'Change {i} Percentage Change'
+        if change_key not in scenario_rows:
+            continue
+        change = scenario_rows[change_key].to_numpy(dtype=float)
+        present = ~np.isnan(change)
+        percentage_changes[present, i - 1] = change[present]
+        start_years[present, i - 1] = scenario_rows[f'Change {i} Start Year'].to_numpy(dtype=float)[present].astype(int)
+        durations[present, i - 1] = scenario_rows[f'Change {i} Duration'].to_numpy(dtype=float)[present].astype(int)
+
+    return {
+        'names': list(rows),
+        'baseline_consumption': scenario_rows['Baseline Consumption (kWh/year)'].to_numpy(dtype=float),
+        'percentage_change': percentage_changes,
+        'start_year': start_years,
+        'duration': durations,
+    }
+
+# Builds the (scenario, year) consumption matrix as a cumulative product of growth factors.
+# Each change is applied as its own step, in sheet order, so the rounding matches
+# generate_consumption_scenarios. Shorter projections are prefixes of this matrix.
+def consumption_matrix(change_table, years):
+    year = np.arange(1, years + 1)[None, :, None]
+    start_year = change_table['start_year'][:, None, :]
+    active = (year >= start_year) & (year < start_year + change_table['duration'][:, None, :])
+    factors = np.where(active, 1 + change_table['percentage_change'][:, None, :] / 100, 1.0)
+
+    n_scenarios, _, n_changes = factors.shape
+    steps = np.concatenate([change_table['baseline_consumption'][:, None], factors.reshape(n_scenarios, -1)], axis=1)
+    trajectory = np.multiply.accumulate(steps, axis=1)
+    if n_changes == 0:
+        return np.repeat(trajectory, years, axis=1)
+    return trajectory[:, n_changes::n_changes]
+
+# Compounding path where the value is multiplied by (1 + hike) in every year flagged by hike_years.
+# Multiplying step by step keeps the rounding identical to the year-by-year loop.
+def _compounded_path(base, hike, hike_years):
+    factors = np.where(hike_years, 1 + hike[:, None], 1.0)
+    path = np.multiply.accumulate(np.concatenate([base[:, None], factors], axis=1), axis=1)
+    return path[:, 1:]
+
+# Tariff, buyback and OPEX paths of shape (input, year); what_if recomputes each on its own
+def tariff_path(params, n_years):
+    year = np.arange(1, n_years + 1)
+    tariff_steps = (year - 1) // params['tariff_hike_interval'][:, None]
+    return params['electricity_tariff'][:, None] * ((1 + params['tariff_hike_percentage'][:, None]) ** tariff_steps)
+
+def buyback_path(params, n_years):
+    year = np.arange(1, n_years + 1)
+    buyback_interval = params['buyback_hike_interval'][:, None]
+    buyback_hike_years = ((year - 1) % buyback_interval == 0) & (year > 1)
+    return _compounded_path(params['tnb_buyback_rate'], params['buyback_hike_percentage'], buyback_hike_years)
+
+def opex_path(params, n_years):
+    year = np.arange(1, n_years + 1)
+    opex_start_year = params['opex_start_year'][:, None]
+    opex_interval = params['opex_hike_interval'][:, None]
+    opex_hike_years = ((year - opex_start_year) % opex_interval == 0) & (year > opex_start_year)
+    opex_values = _compounded_path(params['opex'], params['opex_hike_percentage'], opex_hike_years)
+    return np.where(year >= opex_start_year, opex_values, 0.0)
 
+def escalation_paths(params, n_years):
+    return tariff_path(params, n_years), buyback_path(params, n_years), opex_path(params, n_years)
+
+def pv_generation_paths(params, n_years):
+    year = np.arange(1, n_years + 1)
+    pv_generation_rates = params['specific_yield'][:, None] * ((1 - params['performance_drop'][:, None]) ** (year - 1))
+    pv_generations = params['capacity_kWp'][:, None] * pv_generation_rates
+    return pv_generation_rates, pv_generations
+
+def energy_balance(pv_generations, annual_consumptions, energy_export_allowed):
+    consumed_pv_powers = np.minimum(pv_generations, annual_consumptions)
+    excess_energy_exported = np.where(energy_export_allowed, np.maximum(0, pv_generations - annual_consumptions), 0.0)
+    return consumed_pv_powers, excess_energy_exported
+
+# First-year tax saving and capital expenses (base and with structure cost), shape (input, year)
+def investment_paths(params, n_years):
+    first_year = np.arange(1, n_years + 1) == 1
+    base_investment_cost = params['capacity_kWp'] * params['cost_per_kwp']
+    total_investment_cost = base_investment_cost + params['additional_structure_cost']
+    tax_savings = np.where(first_year, 0.3 * base_investment_cost[:, None], 0.0)
+    capital_expenses_base = np.where(first_year, base_investment_cost[:, None], 0.0)
+    capital_expenses = np.where(first_year, total_investment_cost[:, None], 0.0)
+    return tax_savings, capital_expenses_base, capital_expenses
+
+def energy_savings(params, energy, electricity_tariffs, tnb_buyback_rates):
+    consumed_pv_powers, excess_energy_exported = energy
+    export_allowed = params['energy_export_allowed'][:, None, None]
+    savings = consumed_pv_powers * electricity_tariffs[:, None, :]
+    exported_energy_savings = np.where(export_allowed, excess_energy_exported * tnb_buyback_rates[:, None, :], 0.0)
+    return savings, exported_energy_savings
+
+# Expenses per input row and incomes and annual cash flows (base and total) per input/scenario pair.
+# Years past an input row's 'Years Projection' carry zero cash flow.
+def cash_flow_paths(params, savings, opex_values, investment):
+    n_years = savings[0].shape[-1]
+    tax_savings, capital_expenses_base, capital_expenses = investment
+    active = (np.arange(1, n_years + 1) <= params['years_projection'][:, None])[:, None, :]
+    total_expenses = opex_values + capital_expenses
+    total_expenses_base = opex_values + capital_expenses_base
+    total_incomes = savings[0] + savings[1] + tax_savings[:, None, :]
+    cash_flows = np.where(active, total_incomes - total_expenses[:, None, :], 0.0)
+    cash_flows_base = np.where(active, total_incomes - total_expenses_base[:, None, :], 0.0)
+    return total_expenses_base, total_expenses, total_incomes, cash_flows_base, cash_flows
+
+# Batched engine: every output is an array of shape (input, scenario, year). annual_consumptions is
+# broadcastable to that shape, so one (scenario, year) matrix can be shared by all input rows.
+# Years past an input row's 'Years Projection' are padding and carry zero cash flow.
+def compute_cash_flows(params, annual_consumptions, energy=None):
+    annual_consumptions = np.asarray(annual_consumptions, dtype=float)
+    n_years = annual_consumptions.shape[-1]
+    shape = (len(params), annual_consumptions.shape[-2], n_years)
+
+    electricity_tariffs, tnb_buyback_rates, opex_values = escalation_paths(params, n_years)
+    pv_generation_rates, pv_generations = pv_generation_paths(params, n_years)
+    if energy is None:
+        energy = energy_balance(pv_generations[:, None, :], annual_consumptions, params['energy_export_allowed'][:, None, None])
+    savings = energy_savings(params, energy, electricity_tariffs, tnb_buyback_rates)
+    investment = investment_paths(params, n_years)
+    total_expenses_base, total_expenses, total_incomes, cash_flows_base, cash_flows = cash_flow_paths(params, savings, opex_values, investment)
+
+    per_input = lambda values: np.broadcast_to(values[:, None, :], shape)
+    return {
+        'PV Generation Rate (kWh/kWp/year)': per_input(pv_generation_rates),
+        'PV Generation (kWh/year)': per_input(pv_generations),
+        'Consumed PV Power (kWh/year)': np.broadcast_to(energy[0], shape),
+        'Excess Energy Exported (kWh/year)': np.broadcast_to(energy[1], shape),
+        'Electricity Tariff (RM/kWh)': per_input(electricity_tariffs),
+        'TNB Buyback Rate (RM/kWh)': per_input(tnb_buyback_rates),
+        'Energy Consumption Saving (RM)': np.broadcast_to(savings[0], shape),
+        'Exported Energy Saving (RM)': np.broadcast_to(savings[1], shape),
+        'Tax Saving from GITA (RM)': per_input(investment[0]),
+        'OPEX (RM)': per_input(opex_values),
+        'Capital Expense (base) (RM)': per_input(investment[1]),
+        'Capital Expense (RM)': per_input(investment[2]),
+        'Total Expense (base)(RM)': per_input(total_expenses_base),
+        'Total Expense (RM)': per_input(total_expenses),
+        'Total Income (RM)': np.broadcast_to(total_incomes, shape),
+        'Cumulative Cash Flow (base) (RM)': np.cumsum(cash_flows_base, axis=-1),
+        'Cumulative Cash Flow (RM)': np.cumsum(cash_flows, axis=-1),
+        'Annual Cash Flow (base) (RM)': cash_flows_base,
+        'Annual Cash Flow (RM)': cash_flows,
+    }
+
+def results_table(flows, input_position, scenario_position, years_projection):
+    data = {'Year': np.arange(1, years_projection + 1)}
+    for column in RESULT_COLUMNS[1:]:
+        data[column] = flows[column][input_position, scenario_position, :years_projection]
+    return pd.DataFrame(data)
+
+# The RESULT_COLUMNS series of one engine chunk as one contiguous (pair, year, metric) array, pairs in
+# (input, scenario) order, for model_results.ModelResults
+def pack_results(flows):
+    values = np.stack([flows[column] for column in RESULT_COLUMNS[1:]], axis=-1)
+    return values.reshape(-1, *values.shape[2:])
+
+PAIR_METRICS = ['irr_base', 'irr_total', 'payback_base', 'payback_total']
+# Summary column and display scale (IRR in percent) of each pair metric
+PAIR_METRIC_LABELS = {
+    'irr_base': 'PV IRR (%)',
+    'irr_total': 'Overall IRR (%)',
+    'payback_base': 'PV Payback Period (years)',
+    'payback_total': 'Overall Payback Period (years)',
+}
+PAIR_METRIC_SCALE = {'irr_base': 100, 'irr_total': 100, 'payback_base': 1, 'payback_total': 1}
+
+# IRR and payback per input/scenario pair, flattened in (input, scenario) order
+def pair_metrics(params, flows):
+    n_inputs, n_scenarios, n_years = flows['Annual Cash Flow (RM)'].shape
+    base_investment_cost = np.repeat(params['capacity_kWp'] * params['cost_per_kwp'], n_scenarios)
+    total_investment_cost = base_investment_cost + np.repeat(params['additional_structure_cost'], n_scenarios)
+    return {
+        'irr_base': summary_metrics.irr(flows['Annual Cash Flow (base) (RM)'].reshape(-1, n_years))[0],
+        'irr_total': summary_metrics.irr(flows['Annual Cash Flow (RM)'].reshape(-1, n_years))[0],
+        'payback_base': summary_metrics.payback_period(flows['Cumulative Cash Flow (base) (RM)'].reshape(-1, n_years), base_investment_cost),
+        'payback_total': summary_metrics.payback_period(flows['Cumulative Cash Flow (RM)'].reshape(-1, n_years), total_investment_cost),
+    }
+
+def summary_table(input_data, params, scenario_names, annual_consumptions, flows, metrics=None):
+    n_inputs, n_scenarios, n_years = flows['Annual Cash Flow (RM)'].shape
+    years_projection = params['years_projection']
+    active = np.arange(1, n_years + 1) <= years_projection[:, None, None]
+    per_pair = lambda values: np.repeat(values, n_scenarios)
+    average = lambda values: (np.where(active, values, 0).sum(axis=-1) / years_projection[:, None]).ravel()
+
+    base_investment_cost = params['capacity_kWp'] * params['cost_per_kwp']
+    total_investment_cost = base_investment_cost + params['additional_structure_cost']
+    if metrics is None:
+        metrics = pair_metrics(params, flows)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        consumption_percentages = flows['Consumed PV Power (kWh/year)'] / annual_consumptions * 100
+    not_achieved = lambda payback: pd.Series(payback, dtype=object).where(~np.isnan(payback), 'Not achieved')
+
+    return pd.DataFrame({
+        'Scenario': np.tile(np.asarray(scenario_names, dtype=object), n_inputs),
+        'Input Set': per_pair(input_data.index.to_numpy() + 1),
+        'Cost per kWp (RM/kWp)': per_pair(params['cost_per_kwp']),
+        'Installed Capacity (kWp)': per_pair(params['capacity_kWp']),
+        'PV Investment Cost (RM)': per_pair(base_investment_cost),
+        'Overall Investment Cost with Structure (RM)': per_pair(total_investment_cost),
+        'Average Annual Building Load (kWh/year)': average(annual_consumptions),
+        'Performance Drop (%)': per_pair(params['performance_drop'] * 100),
+        'PV IRR (%)': metrics['irr_base'] * 100,
+        'Overall IRR (%)': metrics['irr_total'] * 100,
+        'PV Payback Period (years)': not_achieved(metrics['payback_base']),
+        'Overall Payback Period (years)': not_achieved(metrics['payback_total']),
+        'Average Annual Solar Yield (kWh/year)': average(flows['PV Generation (kWh/year)']),
+        'Consumption Percentage (%)': average(consumption_percentages),
+        'Specific Yield (kWh/kWp/year)': per_pair(params['specific_yield']),
+    })
+
+ModelBatch = namedtuple('ModelBatch', ['input_data', 'params', 'scenario_names', 'annual_consumptions', 'flows', 'summary'])
+
+# Runs the engine over Input Details in chunks of chunk_size rows, so callers can consume or write
+# results while only one chunk of arrays is alive. With a result_cache.ResultCache only new or
+# changed input/scenario pairs are computed.
+def iter_model(input_data, scenario_input_data, chunk_size=256, cache=None):
+    with instrumentation.stage('scenarios', scenarios=len(scenario_input_data)):
+        change_table = parse_scenarios(scenario_input_data)
+        annual_consumptions = consumption_matrix(change_table, 0)
+    scenario_names = change_table['names']
+
+    for start in range(0, len(input_data), chunk_size):
+        chunk = input_data.iloc[start:start + chunk_size]
+        params = input_parameters(chunk)
+        n_years = int(params['years_projection'].max())
+        if annual_consumptions.shape[1] < n_years:
+            with instrumentation.stage('scenarios', year_steps=len(scenario_names) * n_years):
+                annual_consumptions = consumption_matrix(change_table, n_years)
+        chunk_consumptions = annual_consumptions[:, :n_years]
+
+        pairs = len(chunk) * len(scenario_names)
+        with instrumentation.stage('engine', rows=len(chunk), pairs=pairs, year_steps=pairs * n_years):
+            if cache is None:
+                flows = compute_cash_flows(params, chunk_consumptions)
+            else:
+                flows, metrics = cache.evaluate(params, chunk_consumptions)
+        with instrumentation.stage('metrics', pairs=pairs):
+            if cache is None:
+                metrics = pair_metrics(params, flows)
+            summary = summary_table(chunk, params, scenario_names, chunk_consumptions, flows, metrics)
+        yield ModelBatch(chunk, params, scenario_names, chunk_consumptions, flows, summary)
+
+# progress(done_pairs, total_pairs) is called once per engine chunk, not per pair. batches can replace
+# iter_model with another source of ModelBatch chunks, e.g. the hourly model. Returns a
+# model_results.ModelResults, which reads like a dict of 'Summary' and one DataFrame per
+# 'Input_{n}_{scenario}' key but keeps the yearly numbers in a few arrays until a table is asked for.
+def run_model(input_data, scenario_input_data, progress=None, cache=None, batches=None):
+    scenario_results = None
+    done_pairs = 0
+
+    if batches is None:
+        batches = iter_model(input_data, scenario_input_data, cache=cache)
+    for batch in batches:
+        if scenario_results is None:
+            scenario_results = model_results.ModelResults(RESULT_COLUMNS, batch.scenario_names)
+        with instrumentation.stage('result_tables', pairs=len(batch.input_data) * len(batch.scenario_names)):
+            scenario_results.add(batch.input_data.index.to_numpy() + 1, batch.params['years_projection'],
+                                 pack_results(batch.flows), batch.summary)
+
+        if progress is not None:
+            done_pairs += len(batch.input_data) * len(batch.scenario_names)
+            progress(done_pairs, len(input_data) * len(batch.scenario_names))
+
+    if scenario_results is None:
+        scenario_results = model_results.ModelResults(RESULT_COLUMNS)
     return scenario_results
 
+INVALID_SHEET_NAME_CHARACTERS = re.compile(r'[\[\]:*?/\\]')
+MAX_SHEET_NAME_LENGTH = 31
+
+# Excel sheet names are at most 31 characters, case-insensitively unique and cannot contain []:*?/\.
+# Truncated names that collide get a ~2, ~3, ... suffix.
+def unique_sheet_name(name, used_names):
+    cleaned = INVALID_SHEET_NAME_CHARACTERS.sub('_', str(name)).strip("'")[:MAX_SHEET_NAME_LENGTH] or 'Sheet'
+    candidate = cleaned
+    suffix_number = 2
+    while candidate.lower() in used_names:
+        suffix = f'~{suffix_number}'
+        candidate = cleaned[:MAX_SHEET_NAME_LENGTH - len(suffix)] + suffix
+        suffix_number += 1
+    used_names.add(candidate.lower())
+    return candidate
+
+def append_dataframe(worksheet, df, header=True):
+    if header:
+        worksheet.append(list(df.columns))
+    for row in df.itertuples(index=False, name=None):
+        worksheet.append(row)
+
+# openpyxl is imported on first use, so loading this module for the engine alone stays quick
 def save_results(results, filepath):
-    with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
+    import openpyxl
+    with instrumentation.stage('save_results', sheets=len(results)) as record:
+        workbook = openpyxl.Workbook(write_only=True)
+        used_names = set()
         for scenario_key, df in results.items():
-            df.to_excel(writer, sheet_name=scenario_key, index=False)
+            append_dataframe(workbook.create_sheet(unique_sheet_name(scenario_key, used_names)), df)
+            record.add(rows=len(df))
+        workbook.save(filepath)
+        if instrumentation.active() and isinstance(filepath, (str, os.PathLike)):
+            record.add(bytes_written=os.path.getsize(filepath))
@@ -0,0 +1,375 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+import SolarFinancialModelFunctions as sfm
+import instrumentation
+
+# Benchmarks and correctness checks on synthetic workbooks:
+#   python benchmark.py run --suite small medium --output baseline.json
+#   python benchmark.py compare baseline.json current.json --threshold 0.1
+#   python benchmark.py check
+#   python benchmark.py startup --output startup.json
+# compare exits with 1 when a stage got slower (or used more memory) than the threshold allows, check
+# exits with 1 when an engine disagrees with the original row-by-row loop in reference/loop_model.py.
+EXIT_OK = 0
+EXIT_REGRESSION = 1
+
+# rows x scenarios x consumption change columns x Years Projection
+WORKLOADS = {
+    'small': {'rows': 100, 'scenarios': 10, 'changes': 3, 'years': 25},
+    'medium': {'rows': 2000, 'scenarios': 20, 'changes': 5, 'years': 25},
+    'large': {'rows': 20000, 'scenarios': 50, 'changes': 5, 'years': 30},
+}
+STAGES = ['load', 'scenarios', 'engine', 'metrics', 'export_parquet', 'export_xlsx']
+# openpyxl writes a few thousand rows a second, so the xlsx export is skipped above this many result rows
+MAX_XLSX_EXPORT_ROWS = 50000
+# Differences below these floors are timer and allocator noise, not regressions
+MIN_SECONDS_CHANGE = 0.005
+MIN_MB_CHANGE = 1.0
+CHECK_TOLERANCE = 1e-9
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+# Input Details and Scenarios tables that pass validate_inputs. Years Projection varies between half of
+# years and years so short projections and padded years are exercised too.
+def synthetic_inputs(rows, scenarios, changes, years, seed=0):
+    if changes > sfm.MAX_CONSUMPTION_CHANGES:
+        raise ValueError(f'at most {sfm.MAX_CONSUMPTION_CHANGES} consumption change columns are supported')
+    rng = np.random.default_rng(seed)
+    input_data = pd.DataFrame({
+        'Capacity (kWp)': rng.uniform(5, 500, rows).round(1),
+        'Specific Yield (kWh/kWp/year)': rng.uniform(1000, 1500, rows).round(),
+        'Annual Performance Drop (%)': rng.choice([0.4, 0.5, 0.7, 1.0], rows),
+        'Years Projection': rng.integers(max(1, years // 2), years + 1, rows),
+        'Electricity Tariff (RM/kWh)': rng.uniform(0.2, 0.6, rows).round(3),
+        'TNB Buyback Rate (RM/kWh)': rng.uniform(0.1, 0.35, rows).round(3),
+        'Cost per kWp (RM/kWp)': rng.uniform(2000, 5000, rows).round(),
+        'Additional Structure Cost (RM)': rng.uniform(0, 200000, rows).round(),
+        'OPEX (RM)': rng.uniform(0, 8000, rows).round(),
+        'Tariff Hike Percentage (%)': rng.integers(0, 10, rows),
+        'Tariff Hike Interval (years)': rng.integers(1, 6, rows),
+        'Buyback Hike Percentage (%)': rng.integers(0, 10, rows),
+        'Buyback Hike Interval (years)': rng.integers(1, 6, rows),
+        'OPEX Hike Percentage (%)': rng.uniform(0, 5, rows).round(1),
+        'OPEX Hike Interval (years)': rng.integers(1, 4, rows),
+        'OPEX Start Year': rng.integers(1, 5, rows),
+        'Energy Export Allowed': rng.random(rows) < 0.5,
+    })
+    scenario_input_data = pd.DataFrame({
+        'Scenario Name': [f'Scenario {i + 1}' for i in range(scenarios)],
+        'Baseline Consumption (kWh/year)': rng.uniform(20000, 800000, scenarios).round(),
+    })
+    for i in range(1, changes + 1):
+        percentage_change = rng.uniform(-10, 10, scenarios).round(1)
+        percentage_change[rng.random(scenarios) < 0.25] = np.nan
+        scenario_input_data[f'Change {i} Percentage Change'] = percentage_change
+        scenario_input_data[f'Change {i} Start Year'] = rng.integers(1, max(2, years), scenarios)
+        scenario_input_data[f'Change {i} Duration'] = rng.integers(1, 8, scenarios)
+    return input_data, scenario_input_data
+
+def write_workbook(filepath, input_data, scenario_input_data):
+    with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
+        input_data.to_excel(writer, sheet_name='Input Details', index=False)
+        scenario_input_data.to_excel(writer, sheet_name='Scenarios', index=False)
+
+# Wall time and traced peak memory per stage. A stage measured several times (the engine and metrics
+# once per chunk) adds up its time and keeps its highest peak.
+class StageTimer:
+    def __init__(self):
+        self.seconds = {}
+        self.peak_mb = {}
+
+    @contextmanager
+    def measure(self, stage):
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + time.perf_counter() - started
+            if tracemalloc.is_tracing():
+                self.peak_mb[stage] = max(self.peak_mb.get(stage, 0.0), tracemalloc.get_traced_memory()[1] / 1024 ** 2)
+
+# One pass through the pipeline stage by stage, the way iter_model and the exporters chain them
+def run_pipeline(workbook_path, work_directory, timer, chunk_size=256):
+    import excel_export
+    import result_store
+    with timer.measure('load'):
+        input_data, scenario_input_data = sfm.load_input_file(workbook_path)
+    with timer.measure('scenarios'):
+        change_table = sfm.parse_scenarios(scenario_input_data)
+        annual_consumptions = sfm.consumption_matrix(change_table, int(input_data['Years Projection'].max()))
+
+    batches = []
+    for start in range(0, len(input_data), chunk_size):
+        chunk = input_data.iloc[start:start + chunk_size]
+        with timer.measure('engine'):
+            params = sfm.input_parameters(chunk)
+            chunk_consumptions = annual_consumptions[:, :int(params['years_projection'].max())]
+            flows = sfm.compute_cash_flows(params, chunk_consumptions)
+        with timer.measure('metrics'):
+            summary = sfm.summary_table(chunk, params, change_table['names'], chunk_consumptions, flows)
+        batches.append(sfm.ModelBatch(chunk, params, change_table['names'], chunk_consumptions, flows, summary))
+
+    with timer.measure('export_parquet'):
+        result_store.write_results(input_data, scenario_input_data, os.path.join(work_directory, 'results'), batches=iter(batches))
+    result_rows = int(input_data['Years Projection'].sum()) * len(change_table['names'])
+    if result_rows <= MAX_XLSX_EXPORT_ROWS:
+        with timer.measure('export_xlsx'):
+            excel_export.export_results(input_data, scenario_input_data, os.path.join(work_directory, 'results.xlsx'),
+                                        layout='long', batches=iter(batches))
+
+# Times are the fastest of repeat untraced passes; memory comes from one extra pass under tracemalloc,
+# which would otherwise inflate the timings
+def benchmark_workload(name, workload, repeat=3, seed=0, chunk_size=256):
+    with tempfile.TemporaryDirectory() as work_directory:
+        workbook_path = os.path.join(work_directory, 'inputs.xlsx')
+        write_workbook(workbook_path, *synthetic_inputs(seed=seed, **workload))
+        timers = []
+        for _ in range(repeat):
+            timers.append(StageTimer())
+            run_pipeline(workbook_path, work_directory, timers[-1], chunk_size)
+        traced = StageTimer()
+        tracemalloc.start()
+        try:
+            run_pipeline(workbook_path, work_directory, traced, chunk_size)
+        finally:
+            tracemalloc.stop()
+
+    stages = {}
+    for stage in STAGES:
+        if stage in traced.seconds:
+            stages[stage] = {
+                'seconds': min(timer.seconds[stage] for timer in timers),
+                'peak_mb': traced.peak_mb[stage],
+            }
+    return {
+        'workload': dict(workload, seed=seed, chunk_size=chunk_size),
+        'repeat': repeat,
+        'stages': stages,
+        'total_seconds': sum(stage['seconds'] for stage in stages.values()),
+    }
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def run_benchmarks(workloads, repeat=3, seed=0, chunk_size=256):
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'environment': environment(), 'workloads': {}}
+    for name, workload in workloads.items():
+        log(f'benchmark: {name} {workload}')
+        report['workloads'][name] = result = benchmark_workload(name, workload, repeat, seed, chunk_size)
+        for stage, values in result['stages'].items():
+            log(f"  {stage:<15} {values['seconds']:9.4f}s {values['peak_mb']:9.1f} MB")
+    report['process_peak_rss_mb'] = instrumentation.peak_rss_mb()
+    return report
+
+# Every stage of every workload present in both reports, with regressed set where the current value
+# exceeds the baseline by more than threshold (a fraction) and by more than the noise floor
+def compare_reports(baseline, current, threshold=0.1):
+    rows = []
+    for name in baseline['workloads']:
+        if name not in current['workloads']:
+            continue
+        if baseline['workloads'][name]['workload'] != current['workloads'][name]['workload']:
+            log(f"compare: workload '{name}' has different sizes in the two reports, skipped")
+            continue
+        baseline_stages = baseline['workloads'][name]['stages']
+        current_stages = current['workloads'][name]['stages']
+        for stage in baseline_stages:
+            if stage not in current_stages:
+                continue
+            for measure, floor in (('seconds', MIN_SECONDS_CHANGE), ('peak_mb', MIN_MB_CHANGE)):
+                if measure not in baseline_stages[stage] or measure not in current_stages[stage]:
+                    continue
+                before, after = baseline_stages[stage][measure], current_stages[stage][measure]
+                change = (after - before) / before if before else 0.0
+                rows.append({
+                    'workload': name, 'stage': stage, 'measure': measure, 'baseline': before, 'current': after,
+                    'change': change, 'regressed': change > threshold and after - before > floor,
+                })
+    return rows
+
+def print_comparison(rows):
+    for row in rows:
+        flag = 'REGRESSION' if row['regressed'] else ''
+        print(f"{row['workload']:<8} {row['stage']:<15} {row['measure']:<8} {row['baseline']:11.4f} "
+              f"{row['current']:11.4f} {row['change']:+8.1%} {flag}")
+
+def _wait_for(jobs, kind, job_id=None):
+    while True:
+        for message in jobs.poll():
+            if message[1] == kind and message[0] == job_id:
+                return message
+            if message[1] in ('error', 'cancelled'):
+                raise RuntimeError(f'startup benchmark run failed: {message}')
+        time.sleep(0.005)
+
+# GUI startup: how long main.py's imports keep the window from opening, how long a pre-warmed worker
+# takes to load the model, and a small run on a warm worker (first and second in the session) against
+# one on a worker started on demand. Stages only have seconds, in the same report format as run.
+def startup_timings(repeat=3, workload=None):
+    import subprocess
+    import gui_worker
+    workload = workload or {'rows': 20, 'scenarios': 5, 'changes': 3, 'years': 25}
+    repository = os.path.dirname(os.path.abspath(__file__))
+    script = 'import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)'
+    seconds = {'import_gui': [], 'worker_ready': [], 'first_run': [], 'second_run': [], 'cold_run': []}
+    with tempfile.TemporaryDirectory() as work_directory:
+        workbook_path = os.path.join(work_directory, 'inputs.xlsx')
+        write_workbook(workbook_path, *synthetic_inputs(**workload))
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable, '-c', script], cwd=repository, capture_output=True, text=True, check=True)
+            seconds['import_gui'].append(float(output.stdout))
+
+            jobs = gui_worker.JobQueue()
+            started = time.perf_counter()
+            jobs.start_worker()
+            _wait_for(jobs, 'ready')
+            seconds['worker_ready'].append(time.perf_counter() - started)
+            for stage in ('first_run', 'second_run'):
+                started = time.perf_counter()
+                _wait_for(jobs, 'done', jobs.submit(workbook_path, os.path.join(work_directory, f'{stage}.xlsx')))
+                seconds[stage].append(time.perf_counter() - started)
+            jobs.close()
+
+            jobs = gui_worker.JobQueue()
+            started = time.perf_counter()
+            _wait_for(jobs, 'done', jobs.submit(workbook_path, os.path.join(work_directory, 'cold_run.xlsx')))
+            seconds['cold_run'].append(time.perf_counter() - started)
+            jobs.close()
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': environment(),
+        'workloads': {'startup': {
+            'workload': workload,
+            'repeat': repeat,
+            'stages': {stage: {'seconds': min(values)} for stage, values in seconds.items()},
+        }},
+    }
+
+# Result tables of every engine against the loop, as the largest difference relative to max(1, |x|)
+def _worst_difference(expected, results):
+    keys = [key for key in results if key != 'Summary']
+    if keys != list(expected):
+        raise AssertionError(f'result keys differ: {list(expected)[:3]}... vs {keys[:3]}...')
+    worst = 0.0
+    for key, table in expected.items():
+        if list(table.columns) != list(results[key].columns) or len(table) != len(results[key]):
+            raise AssertionError(f"result table '{key}' has a different shape or columns")
+        for column in table.columns:
+            x, y = table[column].to_numpy(dtype=float), results[key][column].to_numpy(dtype=float)
+            if len(x):
+                worst = max(worst, float(np.max(np.abs(x - y) / np.maximum(1, np.abs(x)))))
+    return worst
+
+def engine_results(input_data, scenario_input_data):
+    import parallel_model
+    import result_cache
+    engines = {'vectorized': sfm.run_model(input_data, scenario_input_data)}
+    with tempfile.TemporaryDirectory() as cache_directory:
+        cache = result_cache.ResultCache(cache_directory)
+        try:
+            sfm.run_model(input_data, scenario_input_data, cache=cache)
+            engines['cached'] = sfm.run_model(input_data, scenario_input_data, cache=cache)
+        finally:
+            cache.close()
+    engines['parallel'] = parallel_model.run_model_parallel(input_data, scenario_input_data, workers=2, chunk_size=7)
+    return engines
+
+def check_engines(workload, seeds=(0, 1, 2), tolerance=CHECK_TOLERANCE):
+    from reference.loop_model import run_model_loop
+    failures = 0
+    for seed in seeds:
+        input_data, scenario_input_data = synthetic_inputs(seed=seed, **workload)
+        expected = run_model_loop(input_data, scenario_input_data)
+        for engine, results in engine_results(input_data, scenario_input_data).items():
+            try:
+                worst = _worst_difference(expected, results)
+            except AssertionError as error:
+                worst, message = np.inf, str(error)
+            else:
+                message = f'worst relative difference {worst:.2e}'
+            failures += worst > tolerance
+            log(f"check: seed {seed} {engine:<10} {'ok' if worst <= tolerance else 'FAILED'} ({message})")
+    return failures
+
+def _workload_arguments(parser):
+    parser.add_argument('--rows', type=int, help='Input Details rows of a custom workload')
+    parser.add_argument('--scenarios', type=int, default=10, help='scenarios of a custom workload (default 10)')
+    parser.add_argument('--changes', type=int, default=3, help='consumption change columns of a custom workload (default 3)')
+    parser.add_argument('--years', type=int, default=25, help='maximum Years Projection of a custom workload (default 25)')
+
+def _custom_workload(args):
+    return {'rows': args.rows, 'scenarios': args.scenarios, 'changes': args.changes, 'years': args.years}
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Benchmark and check the solar financial model engines.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='time every stage on synthetic workbooks and write a JSON report')
+    run.add_argument('--suite', nargs='+', choices=sorted(WORKLOADS), default=['small', 'medium'],
+                     help='named workloads to run (default small medium)')
+    _workload_arguments(run)
+    run.add_argument('--repeat', type=int, default=3, help='timed passes per workload, the fastest counts (default 3)')
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--chunk-size', type=int, default=256, help='Input Details rows per engine chunk (default 256)')
+    run.add_argument('--output', help='JSON report path (default: print to stdout)')
+
+    compare = commands.add_parser('compare', help='compare two JSON reports and flag regressions')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=0.1, help='allowed slowdown as a fraction (default 0.1)')
+
+    startup = commands.add_parser('startup', help='time GUI startup and warm versus cold worker runs')
+    startup.add_argument('--repeat', type=int, default=3, help='measurements per stage, the fastest counts (default 3)')
+    startup.add_argument('--output', help='JSON report path (default: print to stdout)')
+
+    check = commands.add_parser('check', help='check every engine against the original loop')
+    _workload_arguments(check)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command in ('run', 'startup'):
+        if args.command == 'startup':
+            report = startup_timings(args.repeat)
+            for stage, values in report['workloads']['startup']['stages'].items():
+                log(f"  {stage:<15} {values['seconds']:9.4f}s")
+        else:
+            workloads = {'custom': _custom_workload(args)} if args.rows else {name: WORKLOADS[name] for name in args.suite}
+            report = run_benchmarks(workloads, args.repeat, args.seed, args.chunk_size)
+        report = json.dumps(report, indent=1)
+        if args.output:
+            with open(args.output, 'w') as report_file:
+                report_file.write(report)
+        else:
+            print(report)
+        return EXIT_OK
+    if args.command == 'compare':
+        with open(args.baseline) as baseline_file, open(args.current) as current_file:
+            rows = compare_reports(json.load(baseline_file), json.load(current_file), args.threshold)
+        print_comparison(rows)
+        regressions = sum(row['regressed'] for row in rows)
+        log(f'compare: {regressions} regressions beyond {args.threshold:.0%}')
+        return EXIT_REGRESSION if regressions else EXIT_OK
+    workload = _custom_workload(args) if args.rows else {'rows': 40, 'scenarios': 7, 'changes': 5, 'years': 30}
+    failures = check_engines(workload)
+    return EXIT_REGRESSION if failures else EXIT_OK
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+import SolarFinancialModelFunctions as sfm
+import summary_metrics
+
+# Parameters that can be solved for. Each enters the cash flows linearly: the investment cost through
+# capex and the GITA tax saving, the tariff and buyback rate through the energy savings.
+BREAK_EVEN_PARAMETERS = ['cost_per_kwp', 'electricity_tariff', 'tnb_buyback_rate']
+PARAMETER_COLUMNS = {name: column for name, column, _, _ in sfm.PARAMETER_FIELDS}
+CASH_FLOW_OF_METRIC = {
+    'irr_base': 'Annual Cash Flow (base) (RM)',
+    'irr_total': 'Annual Cash Flow (RM)',
+    'payback_base': 'Annual Cash Flow (base) (RM)',
+    'payback_total': 'Annual Cash Flow (RM)',
+}
+MAX_BRACKET_DOUBLINGS = 64
+
+# Cash flows of every input/scenario pair as fixed + value * slope of the solved parameter. The engine
+# runs twice, at 0 and 1, sharing one energy balance; each solver step then only recombines these rows.
+class LinearCashFlows:
+    def __init__(self, params, annual_consumptions, parameter, metric):
+        cash_flow_column = CASH_FLOW_OF_METRIC[metric]
+        at_zero, at_one = params.copy(), params.copy()
+        at_zero[parameter], at_one[parameter] = 0, 1
+        flows_at_zero = sfm.compute_cash_flows(at_zero, annual_consumptions)
+        energy = flows_at_zero['Consumed PV Power (kWh/year)'], flows_at_zero['Excess Energy Exported (kWh/year)']
+        flows_at_one = sfm.compute_cash_flows(at_one, annual_consumptions, energy=energy)
+
+        n_years = annual_consumptions.shape[-1]
+        self.fixed = flows_at_zero[cash_flow_column].reshape(-1, n_years)
+        self.slope = flows_at_one[cash_flow_column].reshape(-1, n_years) - self.fixed
+        n_scenarios = len(self.fixed) // len(params)
+        base_investment_cost = params['capacity_kWp'] * (params['cost_per_kwp'] if parameter != 'cost_per_kwp' else 0)
+        structure_cost = params['additional_structure_cost'] if metric.endswith('total') else 0
+        self.investment_fixed = np.repeat(base_investment_cost + structure_cost, n_scenarios)
+        self.investment_slope = np.repeat(params['capacity_kWp'] if parameter == 'cost_per_kwp' else np.zeros(len(params)), n_scenarios)
+
+    def metric(self, rows, values, metric):
+        cash_flows = self.fixed[rows] + values[:, None] * self.slope[rows]
+        if metric.startswith('irr'):
+            # Without a root the NPV keeps the sign of the undiscounted total at every rate, so the IRR
+            # lies beyond either end of the range
+            rates = summary_metrics.irr(cash_flows)[0]
+            return np.where(np.isnan(rates), np.where(cash_flows.sum(axis=1) > 0, np.inf, -np.inf), rates)
+        investment = self.investment_fixed[rows] + values * self.investment_slope[rows]
+        return summary_metrics.payback_period(np.cumsum(cash_flows, axis=1), investment)
+
+# Distance from the target, with paybacks that are never reached as +inf so the sign still says on
+# which side of the target a value lies
+def _gap(model, rows, values, metric, target):
+    achieved = model.metric(rows, values, metric)
+    return np.where(np.isnan(achieved), np.inf, achieved) - target
+
+# Batched bracketed root finding on every row at once. The bracket starts at [0, 2 x sheet value] and
+# its upper end doubles until the gap changes sign; then secant steps alternate with bisection so every
+# two steps at least halve the bracket. Rows leave the active mask once converged. Rows whose target
+# cannot be bracketed by any non-negative value come back as NaN.
+def solve(model, start_values, metric, target, tol=1e-10, max_iter=200):
+    n_rows = len(start_values)
+    all_rows = np.arange(n_rows)
+    lower = np.zeros(n_rows)
+    upper = np.maximum(2 * start_values, 1.0)
+    lower_gap = _gap(model, all_rows, lower, metric, target)
+    upper_gap = _gap(model, all_rows, upper, metric, target)
+
+    expanding = np.sign(lower_gap) == np.sign(upper_gap)
+    for _ in range(MAX_BRACKET_DOUBLINGS):
+        rows = np.flatnonzero(expanding)
+        if not rows.size:
+            break
+        upper[rows] *= 2
+        upper_gap[rows] = _gap(model, rows, upper[rows], metric, target)
+        expanding[rows] = np.sign(lower_gap[rows]) == np.sign(upper_gap[rows])
+    bracketed = np.sign(lower_gap) != np.sign(upper_gap)
+
+    solution = np.where(lower_gap == 0, lower, np.where(upper_gap == 0, upper, np.nan))
+    active = bracketed & np.isnan(solution)
+    for iteration in range(max_iter):
+        rows = np.flatnonzero(active)
+        if not rows.size:
+            break
+        low, high = lower[rows], upper[rows]
+        low_gap, high_gap = lower_gap[rows], upper_gap[rows]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            secant = low - low_gap * (high - low) / (high_gap - low_gap)
+        use_secant = (iteration % 2 == 0) & np.isfinite(secant) & (secant > low) & (secant < high)
+        middle = np.where(use_secant, secant, 0.5 * (low + high))
+        middle_gap = _gap(model, rows, middle, metric, target)
+
+        same_as_lower = np.sign(middle_gap) == np.sign(low_gap)
+        lower[rows] = np.where(same_as_lower, middle, low)
+        lower_gap[rows] = np.where(same_as_lower, middle_gap, low_gap)
+        upper[rows] = np.where(same_as_lower, high, middle)
+        upper_gap[rows] = np.where(same_as_lower, high_gap, middle_gap)
+
+        converged = (middle_gap == 0) | (upper[rows] - lower[rows] <= tol * np.maximum(np.abs(middle), 1))
+        solution[rows[converged]] = middle[converged]
+        active[rows[converged]] = False
+
+    return np.where(bracketed, solution, np.nan)
+
+# Break-even value of one Input Details parameter (from BREAK_EVEN_PARAMETERS) for every input/scenario
+# pair: the value at which metric (a PAIR_METRICS name) hits target, given in the Summary sheet's units
+# (IRR in %, payback in years).
+def break_even(input_data, scenario_input_data, parameter='cost_per_kwp', metric='irr_total', target=8.0,
+               tol=1e-10, chunk_size=256):
+    if parameter not in BREAK_EVEN_PARAMETERS:
+        raise ValueError(f"cannot solve for '{parameter}', expected one of {BREAK_EVEN_PARAMETERS}")
+    if metric not in sfm.PAIR_METRICS:
+        raise ValueError(f"unknown metric '{metric}', expected one of {sfm.PAIR_METRICS}")
+    change_table = sfm.parse_scenarios(scenario_input_data)
+    scenario_names = change_table['names']
+    n_scenarios = len(scenario_names)
+    scaled_target = target / sfm.PAIR_METRIC_SCALE[metric]
+    frames = []
+
+    for start in range(0, len(input_data), chunk_size):
+        chunk = input_data.iloc[start:start + chunk_size]
+        params = sfm.input_parameters(chunk)
+        annual_consumptions = sfm.consumption_matrix(change_table, int(params['years_projection'].max()))
+        model = LinearCashFlows(params, annual_consumptions, parameter, metric)
+        current = np.repeat(params[parameter], n_scenarios)
+        values = solve(model, current, metric, scaled_target, tol)
+
+        # Payback jumps where the cumulative cash flow only touches zero, and the bracket then closes on
+        # the jump instead of a value that hits the target; those pairs are reported as not solved
+        bracketed = np.flatnonzero(~np.isnan(values))
+        achieved = np.full(len(values), np.nan)
+        achieved[bracketed] = model.metric(bracketed, values[bracketed], metric) * sfm.PAIR_METRIC_SCALE[metric]
+        with np.errstate(invalid='ignore'):
+            hit = np.abs(achieved - target) <= 1e-6 * max(abs(target), 1)
+        values = np.where(hit, values, np.nan)
+        achieved = np.where(hit, achieved, np.nan)
+        frames.append(pd.DataFrame({
+            'Input Set': np.repeat(chunk.index.to_numpy() + 1, n_scenarios),
+            'Scenario': np.tile(np.asarray(scenario_names, dtype=object), len(chunk)),
+            'Parameter': PARAMETER_COLUMNS[parameter],
+            'Metric': sfm.PAIR_METRIC_LABELS[metric],
+            'Target': target,
+            'Current Value': current,
+            'Break-even Value': values,
+            'Achieved': achieved,
+        }))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
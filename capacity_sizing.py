@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+import SolarFinancialModelFunctions as sfm
+import summary_metrics
+
+OBJECTIVES = ['npv', 'irr', 'payback']
+# Default search range as multiples of the sheet's 'Capacity (kWp)'
+RELATIVE_BOUNDS = (0.1, 3.0)
+GOLDEN_RATIO = (np.sqrt(5) - 1) / 2
+
+# Overall annual cash flows, shape (input, scenario, capacity, year), for trial capacities of shape
+# (input, scenario, capacity). Tariff, buyback and OPEX paths and the per-kWp generation curve do not
+# depend on the capacity, so they are built once per chunk and reused for every trial.
+class CapacityCashFlows:
+    def __init__(self, params, annual_consumptions):
+        n_years = annual_consumptions.shape[-1]
+        self.params = params
+        self.annual_consumptions = annual_consumptions[None, :, None, :]
+        self.electricity_tariffs, self.tnb_buyback_rates, opex_values = (
+            path[:, None, None, :] for path in sfm.escalation_paths(params, n_years))
+        self.generation_per_kwp = sfm.pv_generation_paths(params, n_years)[0][:, None, None, :]
+        self.active = np.arange(1, n_years + 1) <= params['years_projection'][:, None, None, None]
+        self.first_year = np.arange(n_years) == 0
+        self.opex_values = opex_values
+
+    def investment(self, capacities):
+        base_investment_cost = capacities * self.params['cost_per_kwp'][:, None, None]
+        return base_investment_cost, base_investment_cost + self.params['additional_structure_cost'][:, None, None]
+
+    def __call__(self, capacities):
+        pv_generations = capacities[..., None] * self.generation_per_kwp
+        consumed, exported = sfm.energy_balance(pv_generations, self.annual_consumptions,
+                                                self.params['energy_export_allowed'][:, None, None, None])
+        base_investment_cost, total_investment_cost = self.investment(capacities)
+        incomes = consumed * self.electricity_tariffs + exported * self.tnb_buyback_rates
+        one_off = np.where(self.first_year, (0.3 * base_investment_cost - total_investment_cost)[..., None], 0.0)
+        return np.where(self.active, incomes + one_off - self.opex_values, 0.0)
+
+# Objective to maximise for each trial capacity; unreachable IRRs count as the worst value
+def objective_values(cash_flows, objective, discount_rate):
+    n_years = cash_flows.shape[-1]
+    rows = cash_flows.reshape(-1, n_years)
+    if objective == 'npv':
+        values = summary_metrics.npv(rows, [discount_rate])[:, 0]
+    else:
+        values = summary_metrics.irr(rows)[0]
+    return np.where(np.isnan(values), -np.inf, values).reshape(cash_flows.shape[:-1])
+
+def payback_reached(cash_flows, total_investment_cost, target_payback):
+    n_years = cash_flows.shape[-1]
+    payback = summary_metrics.payback_period(np.cumsum(cash_flows, axis=-1).reshape(-1, n_years), total_investment_cost.ravel())
+    return (payback <= target_payback).reshape(cash_flows.shape[:-1])
+
+# Without export, capacity beyond the point where PV covers the whole load in every year only adds
+# wasted generation, so the search stops there.
+def export_limit(cash_flow_model, upper):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covering = np.where(cash_flow_model.active[:, :, 0], cash_flow_model.annual_consumptions[:, :, 0] / cash_flow_model.generation_per_kwp[:, :, 0], 0.0)
+    saturation = np.nan_to_num(covering.max(axis=-1), nan=np.inf, posinf=np.inf)
+    return np.where(cash_flow_model.params['energy_export_allowed'][:, None], upper, np.minimum(upper, saturation))
+
+def _golden_section(evaluate, lower, upper, tol, max_iter=200):
+    active = upper - lower > tol * np.maximum(upper, 1)
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        inner_lower = upper - GOLDEN_RATIO * (upper - lower)
+        inner_upper = lower + GOLDEN_RATIO * (upper - lower)
+        values = evaluate(np.stack([inner_lower, inner_upper], axis=-1))
+        keep_lower_part = values[..., 0] >= values[..., 1]
+        upper = np.where(active & keep_lower_part, inner_upper, upper)
+        lower = np.where(active & ~keep_lower_part, inner_lower, lower)
+        active &= upper - lower > tol * np.maximum(upper, 1)
+    return 0.5 * (lower + upper)
+
+def _bisect_boundary(feasible, good, bad, tol, max_iter=200):
+    active = np.abs(bad - good) > tol * np.maximum(np.abs(good), 1)
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        middle = 0.5 * (good + bad)
+        reached = feasible(middle[..., None])[..., 0]
+        good = np.where(active & reached, middle, good)
+        bad = np.where(active & ~reached, middle, bad)
+        active &= np.abs(bad - good) > tol * np.maximum(np.abs(good), 1)
+    return good
+
+# Best capacity per (input, scenario) on a coarse grid, refined inside the bracket around it: golden
+# section for npv/irr, bisection of the feasibility boundary for payback (largest capacity that pays
+# back within target_payback). Pairs with no feasible capacity come back as NaN.
+def optimal_capacities(cash_flow_model, lower, upper, objective, discount_rate, target_payback, grid_points, tol):
+    steps = np.linspace(0, 1, grid_points)
+    grid = lower[..., None] + (upper - lower)[..., None] * steps
+    if objective == 'payback':
+        def feasible(capacities):
+            return payback_reached(cash_flow_model(capacities), cash_flow_model.investment(capacities)[1], target_payback)
+        reached = feasible(grid)
+        any_reached = reached.any(axis=-1)
+        last = grid_points - 1 - np.argmax(reached[..., ::-1], axis=-1)
+        good = np.take_along_axis(grid, last[..., None], axis=-1)[..., 0]
+        bad = np.take_along_axis(grid, np.minimum(last + 1, grid_points - 1)[..., None], axis=-1)[..., 0]
+        return np.where(any_reached, _bisect_boundary(feasible, good, bad, tol), np.nan)
+
+    evaluate = lambda capacities: objective_values(cash_flow_model(capacities), objective, discount_rate)
+    values = evaluate(grid)
+    best = np.argmax(values, axis=-1)
+    bracket_lower = np.take_along_axis(grid, np.maximum(best - 1, 0)[..., None], axis=-1)[..., 0]
+    bracket_upper = np.take_along_axis(grid, np.minimum(best + 1, grid_points - 1)[..., None], axis=-1)[..., 0]
+    optimum = _golden_section(evaluate, bracket_lower, bracket_upper, tol)
+    return np.where(np.isfinite(values.max(axis=-1)), optimum, np.nan)
+
+def _bounds(values, default, params):
+    if values is None:
+        return params['capacity_kWp'] * default
+    return np.broadcast_to(np.asarray(values, dtype=float), params.shape).copy()
+
+# Sizing search over 'Capacity (kWp)' for every input row and scenario. objective is 'npv' (overall
+# cash flow at discount_rate), 'irr' (overall IRR) or 'payback' (largest capacity with an overall
+# payback of at most target_payback years). min_capacity/max_capacity are scalars or one value per input
+# row; by default RELATIVE_BOUNDS of the sheet capacity. The table lists the optimum and the model's
+# IRR, payback and NPV at that capacity.
+def size_capacity(input_data, scenario_input_data, objective='npv', discount_rate=0.08, target_payback=None,
+                  min_capacity=None, max_capacity=None, grid_points=33, tol=1e-6, chunk_size=64):
+    if objective not in OBJECTIVES:
+        raise ValueError(f"unknown objective '{objective}', expected one of {OBJECTIVES}")
+    if objective == 'payback' and target_payback is None:
+        raise ValueError("objective 'payback' needs target_payback")
+    change_table = sfm.parse_scenarios(scenario_input_data)
+    scenario_names = change_table['names']
+    all_params = sfm.input_parameters(input_data)
+    min_capacity = _bounds(min_capacity, RELATIVE_BOUNDS[0], all_params)
+    max_capacity = _bounds(max_capacity, RELATIVE_BOUNDS[1], all_params)
+    n_scenarios = len(scenario_names)
+    frames = []
+
+    for start in range(0, len(input_data), chunk_size):
+        chunk = input_data.iloc[start:start + chunk_size]
+        params = all_params[start:start + chunk_size]
+        annual_consumptions = sfm.consumption_matrix(change_table, int(params['years_projection'].max()))
+        cash_flow_model = CapacityCashFlows(params, annual_consumptions)
+        lower = np.broadcast_to(min_capacity[start:start + chunk_size, None], (len(chunk), n_scenarios))
+        upper = export_limit(cash_flow_model, np.broadcast_to(max_capacity[start:start + chunk_size, None], lower.shape))
+        upper = np.maximum(upper, lower)
+        capacities = optimal_capacities(cash_flow_model, lower, upper, objective, discount_rate, target_payback, grid_points, tol)
+
+        # Evaluate the chosen capacities with the full engine for the reported metrics
+        sized = np.repeat(params, n_scenarios)
+        sized['capacity_kWp'] = np.where(np.isnan(capacities), lower, capacities).ravel()
+        scenario_positions = np.tile(np.arange(n_scenarios), len(chunk))
+        flows = sfm.compute_cash_flows(sized, annual_consumptions[scenario_positions][:, None, :])
+        metrics = sfm.pair_metrics(sized, flows)
+        npv = summary_metrics.npv(flows['Annual Cash Flow (RM)'][:, 0], [discount_rate])[:, 0]
+        found = ~np.isnan(capacities.ravel())
+
+        table = {
+            'Input Set': np.repeat(chunk.index.to_numpy() + 1, n_scenarios),
+            'Scenario': np.tile(np.asarray(scenario_names, dtype=object), len(chunk)),
+            'Objective': objective,
+            'Capacity (kWp)': np.repeat(params['capacity_kWp'], n_scenarios),
+            'Lower Bound (kWp)': lower.ravel(),
+            'Upper Bound (kWp)': upper.ravel(),
+            'Optimal Capacity (kWp)': capacities.ravel(),
+            'NPV (RM)': np.where(found, npv, np.nan),
+        }
+        for name, label in sfm.PAIR_METRIC_LABELS.items():
+            table[label] = np.where(found, metrics[name] * sfm.PAIR_METRIC_SCALE[name], np.nan)
+        frames.append(pd.DataFrame(table))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
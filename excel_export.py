@@ -0,0 +1,83 @@
+import os
+import numpy as np
+import openpyxl
+import SolarFinancialModelFunctions as sfm
+import instrumentation
+
+MAX_EXCEL_ROWS = 1048576
+
+# Write-only sheet that continues on "<title> (2)", "<title> (3)", ... once Excel's row limit is reached.
+class RollingSheet:
+    def __init__(self, workbook, title, header, used_names):
+        self.workbook = workbook
+        self.title = title
+        self.header = header
+        self.used_names = used_names
+        self.part = 0
+        self.worksheet = None
+        self.rows = MAX_EXCEL_ROWS
+
+    def append(self, row):
+        if self.rows >= MAX_EXCEL_ROWS:
+            self.part += 1
+            title = self.title if self.part == 1 else f'{self.title} ({self.part})'
+            self.worksheet = self.workbook.create_sheet(sfm.unique_sheet_name(title, self.used_names))
+            self.worksheet.append(self.header)
+            self.rows = 1
+        self.worksheet.append(row)
+        self.rows += 1
+
+def _pair_rows(flows, input_position, scenario_position, years_projection):
+    values = np.stack([flows[column][input_position, scenario_position, :years_projection] for column in sfm.RESULT_COLUMNS[1:]], axis=1)
+    for year, row in enumerate(values.tolist(), start=1):
+        yield [year] + row
+
+# Streams run results straight from iter_model into an openpyxl write-only workbook. Only one chunk of
+# engine arrays and one pair's rows are alive at a time. layout='sheets' writes one sheet per
+# input/scenario pair like save_results; layout='long' writes every pair into a single 'Results' sheet
+# keyed by Input Set and Scenario, which Excel opens much faster. batches can replace the serial
+# iter_model with any iterable of ModelBatch, e.g. parallel_model.iter_model_parallel.
+def export_results(input_data, scenario_input_data, filepath, layout='sheets', chunk_size=256, batches=None):
+    if layout not in ('sheets', 'long'):
+        raise ValueError(f"Unknown layout '{layout}', expected 'sheets' or 'long'")
+
+    workbook = openpyxl.Workbook(write_only=True)
+    used_names = set()
+    input_sheet = RollingSheet(workbook, 'Input Details', list(input_data.columns), used_names)
+    summary_sheet = None
+    long_sheet = None
+    if layout == 'long':
+        long_sheet = RollingSheet(workbook, 'Results', ['Input Set', 'Scenario'] + sfm.RESULT_COLUMNS, used_names)
+
+    if batches is None:
+        batches = sfm.iter_model(input_data, scenario_input_data, chunk_size)
+    for batch in batches:
+        with instrumentation.stage('export_results', pairs=len(batch.input_data) * len(batch.scenario_names),
+                                   rows=int(batch.params['years_projection'].sum()) * len(batch.scenario_names)):
+            for row in batch.input_data.itertuples(index=False, name=None):
+                input_sheet.append(row)
+            if summary_sheet is None:
+                summary_sheet = RollingSheet(workbook, 'Summary', list(batch.summary.columns), used_names)
+            for row in batch.summary.itertuples(index=False, name=None):
+                summary_sheet.append(row)
+
+            for input_position, input_index in enumerate(batch.input_data.index):
+                years_projection = batch.params['years_projection'][input_position]
+                for scenario_position, scenario_name in enumerate(batch.scenario_names):
+                    rows = _pair_rows(batch.flows, input_position, scenario_position, years_projection)
+                    if layout == 'long':
+                        for row in rows:
+                            long_sheet.append([input_index + 1, scenario_name] + row)
+                        continue
+                    scenario_key = f"Input_{input_index + 1}_{scenario_name}"
+                    worksheet = workbook.create_sheet(sfm.unique_sheet_name(scenario_key, used_names))
+                    worksheet.append(sfm.RESULT_COLUMNS)
+                    for row in rows:
+                        worksheet.append(row)
+
+    if input_sheet.worksheet is None:
+        workbook.create_sheet(sfm.unique_sheet_name('Input Details', used_names)).append(input_sheet.header)
+    with instrumentation.stage('export_results') as record:
+        workbook.save(filepath)
+        if instrumentation.active() and isinstance(filepath, (str, os.PathLike)):
+            record.add(bytes_written=os.path.getsize(filepath))
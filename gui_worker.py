@@ -0,0 +1,188 @@
+import multiprocessing
+import os
+import queue
+import time
+from collections import deque
+
+# The GUI runs the model in one long-lived worker process, so the CPU-bound engine never holds the GIL
+# of the Tk process. Jobs go to the worker one at a time; it answers on a message queue that the Tk
+# loop drains with after(). Messages are (job_id, kind, payload) tuples:
+#   ('progress', (percent, text))  at most every PROGRESS_INTERVAL seconds
+#   ('done', save_path) / ('error', message) / ('cancelled', None)  exactly once per job
+# plus (None, 'ready', seconds) once a freshly started worker has loaded the model libraries.
+PROGRESS_INTERVAL = 0.1
+# A cancelled job stops at the next engine chunk; one that has not stopped by then (e.g. while the
+# workbook is being saved) is ended by restarting the worker
+CANCEL_GRACE_SECONDS = 3.0
+PARTIAL_SUFFIX = '.partial'
+# Smaller engine chunks than iter_model's default, for smoother progress and a quicker cancel
+ENGINE_CHUNK_SIZE = 32
+
+class JobCancelled(Exception):
+    pass
+
+class _ProgressReporter:
+    def __init__(self, messages, job_id, cancel_id):
+        self.messages = messages
+        self.job_id = job_id
+        self.cancel_id = cancel_id
+        self.last_sent = 0.0
+
+    def check_cancelled(self):
+        if self.cancel_id.value == self.job_id:
+            raise JobCancelled()
+
+    def __call__(self, percent, text, force=False):
+        self.check_cancelled()
+        now = time.monotonic()
+        if force or now - self.last_sent >= PROGRESS_INTERVAL:
+            self.last_sent = now
+            self.messages.put((self.job_id, 'progress', (percent, text)))
+
+# One GUI run: load, run_model and save_results as before, checking for a cancel request at every
+# engine chunk. The workbook is written under a temporary name and renamed when complete, so a
+# cancelled or failed run never leaves a half-written file at save_path.
+def run_job(job_id, input_file, save_path, messages, cancel_id):
+    import SolarFinancialModelFunctions as sfm
+    report = _ProgressReporter(messages, job_id, cancel_id)
+    partial_path = save_path + PARTIAL_SUFFIX
+    try:
+        report(5, 'Loading input file', force=True)
+        inputs, scenarios = sfm.load_input_file(input_file)
+        report(30, 'Running model', force=True)
+        results = sfm.run_model(inputs, scenarios, batches=sfm.iter_model(inputs, scenarios, ENGINE_CHUNK_SIZE),
+                                progress=lambda done, total: report(30 + 40 * done / total, f'Running model ({done}/{total} scenarios)'))
+        report(70, 'Saving results', force=True)
+        sfm.save_results(results, partial_path)
+        report.check_cancelled()
+        os.replace(partial_path, save_path)
+        messages.put((job_id, 'done', save_path))
+    except JobCancelled:
+        messages.put((job_id, 'cancelled', None))
+    except Exception as error:
+        messages.put((job_id, 'error', str(error)))
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+# The worker imports pandas, numpy and openpyxl before it is asked for anything, so they load while the
+# user is still picking files, and once per session rather than once per run
+def worker_loop(jobs, messages, cancel_id):
+    import SolarFinancialModelFunctions
+    import openpyxl
+    messages.put((None, 'ready', None))
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        run_job(*job, messages, cancel_id)
+
+# Main-process side: a FIFO of submitted runs fed to the worker one at a time. Tk-agnostic; the GUI
+# calls poll() from after() and gets back the messages of every job, including 'started'.
+class JobQueue:
+    def __init__(self):
+        self.context = multiprocessing.get_context('spawn')
+        self.messages = None
+        self.cancel_id = self.context.Value('q', -1)
+        self.jobs = None
+        self.worker = None
+        self.pending = deque()
+        self.current = None
+        self.cancel_deadline = None
+        self.next_id = 1
+        self.ready = False
+        self.worker_started = None
+        self.ready_seconds = None
+
+    # A restarted worker gets fresh queues, since one killed mid-write can leave a queue unusable
+    def start_worker(self):
+        if self.worker is None or not self.worker.is_alive():
+            self.jobs, self.messages = self.context.Queue(), self.context.Queue()
+            self.worker = self.context.Process(target=worker_loop, args=(self.jobs, self.messages, self.cancel_id), daemon=True)
+            self.ready = False
+            self.worker_started = time.perf_counter()
+            self.worker.start()
+
+    def submit(self, input_file, save_path):
+        job_id = self.next_id
+        self.next_id += 1
+        self.pending.append((job_id, input_file, save_path))
+        return job_id
+
+    def queued(self):
+        return [job[0] for job in self.pending]
+
+    def busy(self):
+        return self.current is not None or bool(self.pending)
+
+    # Cancels the given job, or the running one. A job still waiting in the queue is just dropped.
+    def cancel(self, job_id=None):
+        if self.current is not None and job_id in (None, self.current[0]):
+            self.cancel_id.value = self.current[0]
+            self.cancel_deadline = time.monotonic() + CANCEL_GRACE_SECONDS
+            return True
+        for job in self.pending:
+            if job[0] == job_id:
+                self.pending.remove(job)
+                return True
+        return False
+
+    def _finish(self, messages, kind, payload):
+        messages.append((self.current[0], kind, payload))
+        self.current = None
+        self.cancel_deadline = None
+
+    def _restart_worker(self):
+        if self.worker is not None:
+            self.worker.terminate()
+            self.worker.join()
+            self.worker = None
+        partial_path = self.current[2] + PARTIAL_SUFFIX
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+    def poll(self):
+        messages = []
+        while self.messages is not None:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if message[1] == 'ready':
+                self.ready = True
+                self.ready_seconds = time.perf_counter() - self.worker_started
+                messages.append((None, 'ready', self.ready_seconds))
+                continue
+            if self.current is None or message[0] != self.current[0]:
+                continue
+            if message[1] == 'progress':
+                messages.append(message)
+            else:
+                self._finish(messages, message[1], message[2])
+
+        if self.current is not None:
+            if self.cancel_deadline is not None and time.monotonic() > self.cancel_deadline:
+                self._restart_worker()
+                self._finish(messages, 'cancelled', None)
+                self.start_worker()
+            elif not self.worker.is_alive():
+                self._restart_worker()
+                self._finish(messages, 'error', 'the model worker stopped unexpectedly')
+                self.start_worker()
+
+        if self.current is None and self.pending:
+            self.current = self.pending.popleft()
+            self.start_worker()
+            self.jobs.put(self.current)
+            messages.append((self.current[0], 'started', self.current[1:]))
+        return messages
+
+    def close(self):
+        if self.current is not None:
+            self.cancel()
+        self.pending.clear()
+        if self.worker is not None and self.worker.is_alive():
+            self.jobs.put(None)
+            self.worker.join(CANCEL_GRACE_SECONDS)
+            if self.worker.is_alive():
+                self.worker.terminate()
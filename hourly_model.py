@@ -0,0 +1,127 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import SolarFinancialModelFunctions as sfm
+
+HOURS_PER_YEAR = 8760
+PROFILES_FILE = 'profiles.npy'
+INDEX_FILE = 'profiles.json'
+# Optional Input Details columns naming each site's profiles in the profile store
+PV_PROFILE_COLUMN = 'PV Profile'
+LOAD_PROFILE_COLUMN = 'Load Profile'
+
+# A source is an array, a .npy file or a CSV file with a header row and the hourly values in its last column
+def _read_profile(source):
+    if isinstance(source, (str, os.PathLike)):
+        if str(source).endswith('.npy'):
+            source = np.load(source, mmap_mode='r')
+        else:
+            source = pd.read_csv(source).iloc[:, -1]
+    values = np.asarray(source, dtype=float).ravel()
+    if len(values) != HOURS_PER_YEAR:
+        raise ValueError(f'an hourly profile needs {HOURS_PER_YEAR} values, got {len(values)}')
+    return values
+
+# Writes named hourly profiles into one memory-mapped array, one profile at a time. Each profile is
+# stored as a shape that sums to 1, so only its hourly distribution matters: the yearly totals still
+# come from the PV degradation and consumption trajectories of the model.
+def write_profiles(directory, profiles):
+    os.makedirs(directory, exist_ok=True)
+    names = list(profiles)
+    stored = np.lib.format.open_memmap(os.path.join(directory, PROFILES_FILE), mode='w+', dtype=np.float64,
+                                       shape=(len(names), HOURS_PER_YEAR))
+    for row, name in enumerate(names):
+        values = _read_profile(profiles[name])
+        total = values.sum()
+        if not np.isfinite(total) or total <= 0 or (values < 0).any():
+            raise ValueError(f"profile '{name}' needs non-negative values with a positive total")
+        stored[row] = values / total
+    stored.flush()
+    del stored
+    with open(os.path.join(directory, INDEX_FILE), 'w') as index_file:
+        json.dump({str(name): row for row, name in enumerate(names)}, index_file)
+
+# Read-only view of a profile directory; profiles are paged in from disk only when a site uses them
+class ProfileStore:
+    def __init__(self, directory):
+        with open(os.path.join(directory, INDEX_FILE)) as index_file:
+            self.index = json.load(index_file)
+        self.profiles = np.load(os.path.join(directory, PROFILES_FILE), mmap_mode='r')
+
+    def __contains__(self, name):
+        return str(name) in self.index
+
+    def __getitem__(self, name):
+        return self.profiles[self.index[str(name)]]
+
+# Self-consumption of a year with annual PV a and annual load b is sum_h min(a * pv_h, b * load_h)
+# = a * F(b / a), with F(k) = sum_h min(pv_h, k * load_h). F is piecewise linear in k with breakpoints
+# at the hourly ratios pv_h / load_h, so after sorting those once per profile pair every (year,
+# scenario) cell costs a binary search instead of a pass over 8760 hours.
+class SelfConsumptionCurve:
+    def __init__(self, pv_shape, load_shape):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = np.where(pv_shape > 0, pv_shape / load_shape, 0.0)
+        order = np.argsort(ratios)
+        self.ratios = ratios[order]
+        self.pv_below = np.concatenate([[0.0], np.cumsum(pv_shape[order])])
+        self.load_above = np.concatenate([[0.0], np.cumsum(load_shape[order])])
+        self.load_above = self.load_above[-1] - self.load_above
+
+    def __call__(self, k):
+        position = np.searchsorted(self.ratios, k, side='right')
+        return self.pv_below[position] + k * self.load_above[position]
+
+# Hourly replacement for sfm.energy_balance: consumed and exported energy of shape (input, scenario, year)
+def hourly_energy_balance(pv_generations, annual_consumptions, energy_export_allowed, curves):
+    consumed = np.zeros(np.broadcast_shapes(pv_generations.shape, annual_consumptions.shape))
+    for input_position, curve in enumerate(curves):
+        pv = pv_generations[input_position]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            load_per_pv = np.where(pv > 0, annual_consumptions / pv, 0.0)
+        consumed[input_position] = np.where(pv > 0, pv * curve(load_per_pv), 0.0)
+    exported = np.where(energy_export_allowed, np.maximum(0, pv_generations - consumed), 0.0)
+    return consumed, exported
+
+def profile_names(input_data, column, default):
+    if column in input_data:
+        return input_data[column].astype(str).to_numpy()
+    if default is None:
+        raise sfm.InputValidationError([f"'Input Details' has no '{column}' column and no default profile was given"])
+    return np.full(len(input_data), str(default), dtype=object)
+
+# Hourly counterpart of sfm.iter_model: the same ModelBatch chunks, with self-consumption and export
+# computed against each site's hourly PV and load shapes. Sites name their profiles in the optional
+# 'PV Profile' / 'Load Profile' columns, or share pv_profile / load_profile. Feed the batches to
+# sfm.run_model, excel_export.export_results or result_store.write_results.
+def iter_model_hourly(input_data, scenario_input_data, profiles, pv_profile=None, load_profile=None, chunk_size=64):
+    change_table = sfm.parse_scenarios(scenario_input_data)
+    scenario_names = change_table['names']
+    pv_names = profile_names(input_data, PV_PROFILE_COLUMN, pv_profile)
+    load_names = profile_names(input_data, LOAD_PROFILE_COLUMN, load_profile)
+    unknown = sorted({name for name in np.concatenate([pv_names, load_names]) if name not in profiles})
+    if unknown:
+        raise sfm.InputValidationError([f"profile '{name}' is not in the profile store" for name in unknown])
+
+    for start in range(0, len(input_data), chunk_size):
+        chunk = input_data.iloc[start:start + chunk_size]
+        params = sfm.input_parameters(chunk)
+        n_years = int(params['years_projection'].max())
+        annual_consumptions = sfm.consumption_matrix(change_table, n_years)
+
+        curves, chunk_curves = {}, []
+        for pair in zip(pv_names[start:start + chunk_size], load_names[start:start + chunk_size]):
+            if pair not in curves:
+                curves[pair] = SelfConsumptionCurve(np.asarray(profiles[pair[0]]), np.asarray(profiles[pair[1]]))
+            chunk_curves.append(curves[pair])
+        _, pv_generations = sfm.pv_generation_paths(params, n_years)
+        energy = hourly_energy_balance(pv_generations[:, None, :], annual_consumptions[None], params['energy_export_allowed'][:, None, None], chunk_curves)
+
+        flows = sfm.compute_cash_flows(params, annual_consumptions, energy=energy)
+        summary = sfm.summary_table(chunk, params, scenario_names, annual_consumptions, flows)
+        yield sfm.ModelBatch(chunk, params, scenario_names, annual_consumptions, flows, summary)
+
+def run_model_hourly(input_data, scenario_input_data, profiles, pv_profile=None, load_profile=None, progress=None):
+    batches = iter_model_hourly(input_data, scenario_input_data, profiles, pv_profile, load_profile)
+    return sfm.run_model(input_data, scenario_input_data, progress=progress, batches=batches)
@@ -0,0 +1,158 @@
+import json
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Stage-level instrumentation of the model. Code marks its stages with
+#   with instrumentation.stage('engine', rows=n) as record:
+#       ...
+#       record.add(bytes_written=size)
+# While no profile is active, stage() hands back one shared no-op record, so a marked stage costs a
+# function call and an attribute lookup. Inside profiling() every stage records wall time, CPU time,
+# the peak RSS of the process so far and its item counts.
+
+class _NullRecord:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add(self, **counts):
+        pass
+
+_NULL_RECORD = _NullRecord()
+_active_profile = None
+
+# Peak resident memory of the process so far. resource only exists on Unix; elsewhere psutil's peak
+# working set is used when it is installed, and NaN otherwise.
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return math.nan
+        memory = psutil.Process().memory_info()
+        return getattr(memory, 'peak_wset', memory.rss) / 1024 ** 2
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+class _StageRecord:
+    def __init__(self, profile, name, counts):
+        self.profile = profile
+        self.name = name
+        self.counts = dict(counts)
+        self.child_seconds = 0.0
+
+    def add(self, **counts):
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+
+    def __enter__(self):
+        self.stack = self.profile._stack()
+        self.stack.append(self)
+        self.cpu_started = time.process_time()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall_seconds = time.perf_counter() - self.started
+        cpu_seconds = time.process_time() - self.cpu_started
+        self.stack.pop()
+        if self.stack:
+            self.stack[-1].child_seconds += wall_seconds
+        self.profile._record(self, wall_seconds, cpu_seconds)
+        return False
+
+# Everything recorded while one profile was active: every stage call as an event for the trace, and
+# per-stage totals for the report. Stages can nest; self time excludes the nested stages.
+class Profile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.events = []
+        self.totals = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def _record(self, record, wall_seconds, cpu_seconds):
+        peak_rss = peak_rss_mb()
+        with self.lock:
+            self.events.append({
+                'name': record.name,
+                'start': record.started - self.started,
+                'wall_seconds': wall_seconds,
+                'cpu_seconds': cpu_seconds,
+                'thread': threading.get_ident(),
+                'counts': record.counts,
+            })
+            totals = self.totals.setdefault(record.name, {
+                'calls': 0, 'wall_seconds': 0.0, 'self_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_rss_mb': math.nan, 'counts': {},
+            })
+            totals['calls'] += 1
+            totals['wall_seconds'] += wall_seconds
+            totals['self_seconds'] += wall_seconds - record.child_seconds
+            totals['cpu_seconds'] += cpu_seconds
+            totals['peak_rss_mb'] = peak_rss if totals['calls'] == 1 else max(totals['peak_rss_mb'], peak_rss)
+            for key, value in record.counts.items():
+                totals['counts'][key] = totals['counts'].get(key, 0) + value
+
+    def report(self):
+        return {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'wall_seconds': time.perf_counter() - self.started,
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': self.totals,
+        }
+
+    def write_report(self, path):
+        with open(path, 'w') as report_file:
+            json.dump(self.report(), report_file, indent=1)
+
+    # Chrome trace event format (complete events in microseconds), which chrome://tracing, Perfetto and
+    # speedscope open as a timeline / flame graph
+    def chrome_trace(self):
+        process_id = os.getpid()
+        return {'traceEvents': [{
+            'name': event['name'],
+            'ph': 'X',
+            'ts': event['start'] * 1e6,
+            'dur': event['wall_seconds'] * 1e6,
+            'pid': process_id,
+            'tid': event['thread'],
+            'args': dict(event['counts'], cpu_ms=event['cpu_seconds'] * 1e3),
+        } for event in self.events], 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, path):
+        with open(path, 'w') as trace_file:
+            json.dump(self.chrome_trace(), trace_file)
+
+def stage(name, **counts):
+    profile = _active_profile
+    if profile is None:
+        return _NULL_RECORD
+    return _StageRecord(profile, name, counts)
+
+def active():
+    return _active_profile is not None
+
+# Turns instrumentation on for the enclosed code and yields the Profile collecting it. Profiles do not
+# nest; the outer one is restored afterwards.
+@contextmanager
+def profiling():
+    global _active_profile
+    previous, _active_profile = _active_profile, Profile()
+    try:
+        yield _active_profile
+    finally:
+        _active_profile = previous
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import SolarFinancialModelFunctions as sfm
+import excel_export
+import result_cache
+import result_store
+
+# Layout of a job directory:
+#   manifest.json                       job signature and the shards completed so far
+#   shards/<first row>/<table>.parquet  one directory per completed shard
+# A shard is written under a temporary name, renamed into place and only then recorded in the
+# manifest, which is itself replaced atomically. Anything not in the manifest is recomputed.
+MANIFEST_FILE = 'manifest.json'
+SHARDS_DIRECTORY = 'shards'
+
+# Model shards use the result_store table names, so a merged Parquet output is a result store
+def _model_shard(input_data, scenario_input_data, options):
+    tables = {result_store.RESULTS_DIRECTORY: [], result_store.SUMMARY_FILE: []}
+    for batch in sfm.iter_model(input_data, scenario_input_data, options.get('chunk_size', 256)):
+        # Merged shards are not partitioned by scenario, so Scenario stays a plain text column to match
+        # the partition field result_store.open_results declares
+        table = result_store.batch_table(batch)
+        scenario_position = table.schema.get_field_index('Scenario')
+        table = table.set_column(scenario_position, 'Scenario', table['Scenario'].cast(pa.string()))
+        tables[result_store.RESULTS_DIRECTORY].append(table)
+        tables[result_store.SUMMARY_FILE].append(result_store.summary_record_batch(batch.summary))
+    tables = {name: pa.concat_tables(parts) for name, parts in tables.items()}
+    tables[result_store.INPUTS_FILE] = result_store.inputs_table(input_data)
+    return tables
+
+# Every Monte Carlo pair draws from its own seeded streams, so shards reproduce a single full run
+def _monte_carlo_shard(input_data, scenario_input_data, options):
+    import monte_carlo
+    results = monte_carlo.run_monte_carlo(input_data, scenario_input_data, **options)
+    return {name: pa.Table.from_pandas(table, preserve_index=False) for name, table in results.items()}
+
+JOB_KINDS = {'model': _model_shard, 'monte_carlo': _monte_carlo_shard}
+# Sheet order and titles when a job is merged into a workbook
+SHEET_TITLES = {
+    'model': [(result_store.INPUTS_FILE, 'Input Details'), (result_store.SUMMARY_FILE, 'Summary'),
+              (result_store.RESULTS_DIRECTORY, 'Results')],
+    'monte_carlo': [('Summary', 'Summary'), ('Convergence', 'Convergence'), ('Histogram', 'Histogram')],
+}
+
+def job_signature(input_data, scenario_input_data, kind, shard_size, options):
+    digest = hashlib.sha256(f'{kind} {shard_size} {sorted(options.items())!r}'.encode())
+    for table in (input_data, scenario_input_data):
+        digest.update(pd.util.hash_pandas_object(table, index=True).to_numpy().tobytes())
+        digest.update(repr(list(table.columns)).encode())
+    # Shards computed by different versions of the model code must not be mixed in one job
+    digest.update(result_cache.model_version().encode())
+    if kind == 'monte_carlo':
+        import monte_carlo
+        with open(monte_carlo.__file__, 'rb') as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+def read_manifest(job_directory):
+    try:
+        with open(os.path.join(job_directory, MANIFEST_FILE)) as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+
+# Makes a rename inside the directory durable. Windows cannot open directories, and its renames need
+# no separate flush.
+def _fsync_directory(path):
+    if os.name != 'posix':
+        return
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+def _write_manifest(job_directory, manifest):
+    temporary_path = os.path.join(job_directory, f'{MANIFEST_FILE}.{os.getpid()}.tmp')
+    with open(temporary_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+        manifest_file.flush()
+        os.fsync(manifest_file.fileno())
+    os.replace(temporary_path, os.path.join(job_directory, MANIFEST_FILE))
+    _fsync_directory(job_directory)
+
+def _write_shard(job_directory, shard_id, tables):
+    shards_path = os.path.join(job_directory, SHARDS_DIRECTORY)
+    temporary_path = os.path.join(shards_path, f'.{shard_id}.{os.getpid()}.tmp')
+    shutil.rmtree(temporary_path, ignore_errors=True)
+    os.makedirs(temporary_path)
+    # The shard's files reach the disk before the rename, and the rename before the manifest lists it
+    for name, table in tables.items():
+        with open(os.path.join(temporary_path, f'{name}.parquet'), 'wb') as shard_file:
+            pq.write_table(table, shard_file)
+            shard_file.flush()
+            os.fsync(shard_file.fileno())
+    _fsync_directory(temporary_path)
+    final_path = os.path.join(shards_path, shard_id)
+    shutil.rmtree(final_path, ignore_errors=True)
+    os.replace(temporary_path, final_path)
+    _fsync_directory(shards_path)
+    return sorted(tables)
+
+def job_status(job_directory):
+    manifest = read_manifest(job_directory)
+    if manifest is None:
+        return {'done': 0, 'total': 0}
+    return {'done': len(manifest['completed']), 'total': manifest['shards']}
+
+# Runs kind ('model' or 'monte_carlo', whose options are run_monte_carlo's keyword arguments) over
+# Input Details in shards of shard_size rows, each covering all scenarios. A restarted job skips the
+# shards its manifest lists as complete; a job directory holding a different job is refused.
+# restart=True discards whatever the job directory holds. progress(done_shards, total_shards) is called after every shard.
+def run_job(job_directory, input_data, scenario_input_data, kind='model', shard_size=256, options=None,
+            restart=False, progress=None):
+    if kind not in JOB_KINDS:
+        raise ValueError(f"unknown job kind '{kind}', expected one of {sorted(JOB_KINDS)}")
+    options = options or {}
+    signature = job_signature(input_data, scenario_input_data, kind, shard_size, options)
+    manifest = None if restart else read_manifest(job_directory)
+    if manifest is not None and manifest['signature'] != signature:
+        raise ValueError(f"'{job_directory}' holds a different job; pass restart=True to discard it")
+    if manifest is None:
+        shutil.rmtree(os.path.join(job_directory, SHARDS_DIRECTORY), ignore_errors=True)
+        manifest = {'signature': signature, 'kind': kind, 'shards': 0, 'completed': {}}
+    starts = range(0, len(input_data), shard_size)
+    manifest['shards'] = len(starts)
+    os.makedirs(os.path.join(job_directory, SHARDS_DIRECTORY), exist_ok=True)
+    _write_manifest(job_directory, manifest)
+
+    for start in starts:
+        shard_id = f'{start:012d}'
+        if shard_id in manifest['completed']:
+            continue
+        shard = input_data.iloc[start:start + shard_size]
+        tables = _write_shard(job_directory, shard_id, JOB_KINDS[kind](shard, scenario_input_data, options))
+        manifest['completed'][shard_id] = {'rows': len(shard), 'tables': tables}
+        _write_manifest(job_directory, manifest)
+        if progress is not None:
+            progress(len(manifest['completed']), manifest['shards'])
+    return manifest
+
+def _completed_shards(job_directory):
+    manifest = read_manifest(job_directory)
+    if manifest is None or len(manifest['completed']) < manifest['shards']:
+        raise ValueError(f"job in '{job_directory}' is not complete yet")
+    return manifest, [os.path.join(job_directory, SHARDS_DIRECTORY, shard_id) for shard_id in sorted(manifest['completed'])]
+
+def _excel_value(value):
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+# Merges a finished job, one shard at a time, into a workbook (output_path ending in .xlsx, one long
+# sheet per table) or a directory with one Parquet part per shard and table. A merged model job is a
+# result_store directory, so result_store.load_results / load_summary can read it.
+def merge_job(job_directory, output_path):
+    manifest, shard_paths = _completed_shards(job_directory)
+    if str(output_path).lower().endswith('.xlsx'):
+        workbook = openpyxl.Workbook(write_only=True)
+        used_names = set()
+        for name, title in SHEET_TITLES[manifest['kind']]:
+            sheet = None
+            for shard_path in shard_paths:
+                table = pq.read_table(os.path.join(shard_path, f'{name}.parquet')).to_pandas()
+                for column in result_store.PAYBACK_COLUMNS:
+                    if name == result_store.SUMMARY_FILE and column in table:
+                        table[column] = table[column].astype(object).where(table[column].notna(), 'Not achieved')
+                if sheet is None:
+                    sheet = excel_export.RollingSheet(workbook, title, list(table.columns), used_names)
+                for row in table.itertuples(index=False, name=None):
+                    sheet.append([_excel_value(value) for value in row])
+        workbook.save(output_path)
+        return
+
+    # Merged stores carry no yearly hashes; one left from an earlier write_results would be stale
+    if os.path.exists(os.path.join(output_path, result_store.HASHES_FILE)):
+        os.remove(os.path.join(output_path, result_store.HASHES_FILE))
+    for name, _ in SHEET_TITLES[manifest['kind']]:
+        table_path = os.path.join(output_path, name)
+        shutil.rmtree(table_path, ignore_errors=True)
+        os.makedirs(table_path)
+        for shard_path in shard_paths:
+            shutil.copyfile(os.path.join(shard_path, f'{name}.parquet'),
+                            os.path.join(table_path, f'part-{os.path.basename(shard_path)}.parquet'))
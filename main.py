@@ -1,11 +1,19 @@
+import time
+STARTED = time.perf_counter()
+
+import sys
 import tkinter as tk
 from tkinter import filedialog, messagebox
-import threading
 from tkinter.ttk import Progressbar
-import SolarFinancialModelFunctions as sfm  # Placeholder for your function definitions
+import gui_worker
 import shutil
 import os
 
+# How often the Tk loop checks the worker's message queue
+POLL_INTERVAL_MS = 50
+# Seconds from launch until the window is drawn and until the model worker is ready, logged to stderr
+startup_times = {}
+
 # Function to export example input file
 def export_example_input(save_path):
     try:
@@ -19,26 +27,6 @@ def export_example_input(save_path):
     except Exception as e:
         messagebox.showerror("Error", f"An error occurred: {str(e)}")
 
-# Function to run the solar financial model
-def run_solar_financial_model(input_file, save_path, progress_var):
-    try:
-        progress_var.set(10)
-        # Load input file and scenarios
-        inputs, scenarios = sfm.load_input_file(input_file)
-        progress_var.set(30)
-
-        # Perform solar financial modeling
-        results = sfm.run_model(inputs, scenarios, progress_var)
-        progress_var.set(70)
-
-        # Save the results
-        sfm.save_results(results, save_path)
-        progress_var.set(100)
-
-        messagebox.showinfo("Success", "The solar financial model calculations are complete and have been saved successfully.")
-    except Exception as e:
-        messagebox.showerror("Error", f"An error occurred: {str(e)}")
-
 # Function to browse for a file
 def browse_file(entry):
     filename = filedialog.askopenfilename(filetypes=[("Excel Files", "*.xlsx")])
@@ -57,8 +45,8 @@ def export_example_input_file():
     if save_path:
         export_example_input(save_path)
 
-# Function to start the modeling process
-def start_process(input_entry, save_entry, progress_var):
+# Function to queue a modeling run; runs go to the worker process one after another
+def start_process(input_entry, save_entry, jobs, status_var):
     input_file = input_entry.get()
     save_path = save_entry.get()
     
@@ -66,12 +54,61 @@ def start_process(input_entry, save_entry, progress_var):
         messagebox.showwarning("Input Required", "Please provide both the input file and save location.")
         return
     
-    progress_var.set(0)
-    thread = threading.Thread(target=run_solar_financial_model, args=(input_file, save_path, progress_var))
-    thread.start()
+    job_id = jobs.submit(input_file, save_path)
+    if jobs.current is not None:
+        status_var.set(f"Run {job_id} queued ({len(jobs.queued())} waiting)")
+
+# Function to cancel the running job
+def cancel_process(jobs, status_var):
+    if jobs.cancel():
+        status_var.set("Cancelling...")
+
+# Function to pass worker messages on to the UI, called from the Tk loop every POLL_INTERVAL_MS.
+# Only the latest progress message of each poll is shown.
+def poll_jobs(root, jobs, progress_var, status_var):
+    progress = None
+    for job_id, kind, payload in jobs.poll():
+        waiting = f" ({len(jobs.queued())} waiting)" if jobs.queued() else ""
+        if kind == 'ready':
+            if 'time_to_ready' not in startup_times:
+                startup_times['time_to_ready'] = time.perf_counter() - STARTED
+                print(f"startup: window after {startup_times['time_to_window']:.2f}s, "
+                      f"model ready after {startup_times['time_to_ready']:.2f}s", file=sys.stderr)
+            if jobs.current is None:
+                status_var.set("Ready")
+        elif kind == 'started':
+            progress_var.set(0)
+            status_var.set(f"Run {job_id}: starting{waiting}")
+        elif kind == 'progress':
+            progress = (job_id, payload, waiting)
+        elif kind == 'done':
+            progress = None
+            progress_var.set(100)
+            status_var.set(f"Run {job_id}: done{waiting}")
+            messagebox.showinfo("Success", f"The solar financial model calculations are complete and have been saved to {payload}.")
+        elif kind == 'cancelled':
+            progress = None
+            status_var.set(f"Run {job_id}: cancelled{waiting}")
+        elif kind == 'error':
+            progress = None
+            status_var.set(f"Run {job_id}: failed{waiting}")
+            messagebox.showerror("Error", f"An error occurred: {payload}")
+    if progress is not None:
+        job_id, (percent, text), waiting = progress
+        progress_var.set(percent)
+        status_var.set(f"Run {job_id}: {text}{waiting}")
+    root.after(POLL_INTERVAL_MS, poll_jobs, root, jobs, progress_var, status_var)
+
+def close_window(root, jobs):
+    jobs.close()
+    root.destroy()
 
 # Main function to create UI
 def main():
+    # Start loading the model in the worker process first; the window does not wait for it
+    jobs = gui_worker.JobQueue()
+    jobs.start_worker()
+
     # Create main window
     root = tk.Tk()
     root.title("Solar Financial Model UI")
@@ -94,14 +131,23 @@ def main():
     progress_var = tk.DoubleVar()
     progress_bar = Progressbar(root, variable=progress_var, maximum=100)
     progress_bar.pack(pady=5, padx=20, fill=tk.X)
+    status_var = tk.StringVar(value="Loading model...")
+    tk.Label(root, textvariable=status_var).pack()
 
-    # Start button
-    tk.Button(root, text="Run Model", command=lambda: start_process(input_entry, save_entry, progress_var)).pack(pady=(20, 10))
+    # Start and cancel buttons; the model runs in a worker process so the window stays responsive
+    buttons = tk.Frame(root)
+    buttons.pack(pady=(20, 10))
+    tk.Button(buttons, text="Run Model", command=lambda: start_process(input_entry, save_entry, jobs, status_var)).pack(side=tk.LEFT, padx=5)
+    tk.Button(buttons, text="Cancel", command=lambda: cancel_process(jobs, status_var)).pack(side=tk.LEFT, padx=5)
 
     # Export example input button
     tk.Button(root, text="Export Example Input File", command=export_example_input_file).pack(pady=(10, 10))
 
     # Start the main event loop
+    root.protocol("WM_DELETE_WINDOW", lambda: close_window(root, jobs))
+    root.update()
+    startup_times['time_to_window'] = time.perf_counter() - STARTED
+    root.after(POLL_INTERVAL_MS, poll_jobs, root, jobs, progress_var, status_var)
     root.mainloop()
 
 if __name__ == "__main__":
@@ -0,0 +1,91 @@
+from collections.abc import Mapping
+import numpy as np
+import pandas as pd
+
+# Compact container for run_model's output. The yearly series of every input/scenario pair live in one
+# float array per engine chunk, indexed by (pair, year, metric), with pairs in (input, scenario) order.
+# Keys are not stored: 'Input_{n}_{scenario}' is built from the Input Set numbers of each chunk and the
+# shared scenario name table, and parsed back on lookup. It reads like the old dict of DataFrames:
+#   results['Summary']             the Summary table
+#   results['Input_3_Base']        that pair's yearly table, built on access and not kept
+#   results.array('Input_3_Base')  read-only (year, metric) view of the same numbers, no copy
+# so save_results and other callers that iterate items() only hold one pair's DataFrame at a time.
+class ModelResults(Mapping):
+    def __init__(self, columns, scenario_names=()):
+        self.columns = list(columns)
+        self.scenario_names = list(scenario_names)
+        self.scenario_positions = {str(name): position for position, name in enumerate(self.scenario_names)}
+        self.blocks = []
+        self.input_sets = []
+        self.years_projection = []
+        self.summaries = []
+        self.input_positions = {}
+        self.summary_table = None
+
+    # values is one chunk's (pair, year, metric) array over the chunk's input_sets x scenario_names
+    def add(self, input_sets, years_projection, values, summary):
+        if values.shape[-1] != len(self.columns) - 1:
+            raise ValueError('values must have one metric per result column after Year')
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        values.flags.writeable = False
+        block = len(self.blocks)
+        for input_position, input_set in enumerate(input_sets):
+            self.input_positions[int(input_set)] = (block, input_position)
+        self.blocks.append(values)
+        self.input_sets.append(np.asarray(input_sets, dtype=np.int64))
+        self.years_projection.append(np.asarray(years_projection, dtype=np.int64))
+        self.summaries.append(summary)
+        self.summary_table = None
+
+    def summary(self):
+        if self.summary_table is None and self.summaries:
+            self.summary_table = pd.concat(self.summaries, ignore_index=True)
+            self.summaries = [self.summary_table]
+        return self.summary_table
+
+    def _locate(self, key):
+        parts = key.split('_', 2) if isinstance(key, str) else ()
+        if len(parts) != 3 or parts[0] != 'Input' or not parts[1].isdigit():
+            raise KeyError(key)
+        block, input_position = self.input_positions.get(int(parts[1]), (None, None))
+        scenario_position = self.scenario_positions.get(parts[2])
+        if block is None or scenario_position is None:
+            raise KeyError(key)
+        return block, input_position * len(self.scenario_names) + scenario_position, self.years_projection[block][input_position]
+
+    def array(self, key):
+        block, pair, years = self._locate(key)
+        return self.blocks[block][pair, :years]
+
+    def nbytes(self):
+        return sum(values.nbytes for values in self.blocks)
+
+    def __getitem__(self, key):
+        if key == 'Summary' and self.summaries:
+            return self.summary()
+        values = self.array(key)
+        table = {self.columns[0]: np.arange(1, len(values) + 1)}
+        for position, column in enumerate(self.columns[1:]):
+            table[column] = values[:, position]
+        return pd.DataFrame(table)
+
+    def __contains__(self, key):
+        if key == 'Summary':
+            return bool(self.summaries)
+        try:
+            self._locate(key)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        if self.summaries:
+            yield 'Summary'
+        for input_sets in self.input_sets:
+            for input_set in input_sets:
+                for scenario_name in self.scenario_names:
+                    yield f"Input_{input_set}_{scenario_name}"
+
+    def __len__(self):
+        pairs = sum(len(input_sets) for input_sets in self.input_sets) * len(self.scenario_names)
+        return pairs + bool(self.summaries)
@@ -0,0 +1,373 @@
+import argparse
+import asyncio
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+# Local model service for tools that want results on demand without reloading the workbook and the
+# libraries for every call:
+#   python model_service.py --port 8765 --workers 4
+# HTTP on 127.0.0.1 only, JSON in, JSON or NDJSON (one JSON object per line) out:
+#   GET  /status  pool and queue state
+#   POST /load    {"input_file": path}  sheet sizes, or 400 with the validation problems
+#   POST /run     {"input_file": path, "tables": "summary" | "results", "inputs": [1, 3], "scenarios": [...],
+#                  "chunk_size": 64}
+#                 streams {"type": "summary" | "results", "table": {columns, data}} lines as engine chunks
+#                 complete (in any order; rows carry Input Set and Scenario), then {"type": "done"}
+# Identical /run requests share one computation while none of its lines has been sent on yet. When max_active_jobs computations run and
+# max_queued_jobs more are waiting, new ones get 503 with Retry-After.
+DEFAULT_PORT = 8765
+TABLE_KINDS = ['summary', 'results']
+LOADED_WORKBOOKS = 8
+MAX_BUFFERED_LINES = 32
+RETRY_AFTER_SECONDS = 1
+
+# --- worker processes ---
+
+def _warm_worker():
+    import SolarFinancialModelFunctions
+    import result_store
+
+def _ping():
+    return os.getpid()
+
+# Runs one chunk of Input Details rows and returns its NDJSON lines, serialized in the worker
+def _run_chunk(chunk, scenario_input_data, tables, chunk_size):
+    import SolarFinancialModelFunctions as sfm
+    import result_store
+    lines = []
+    for batch in sfm.iter_model(chunk, scenario_input_data, chunk_size):
+        lines.append(_line('summary', batch.summary.to_json(orient='split', index=False)))
+        if tables == 'results':
+            lines.append(_line('results', result_store.batch_table(batch).to_pandas().to_json(orient='split', index=False)))
+    return lines
+
+def _line(kind, table_json):
+    return f'{{"type": "{kind}", "table": {table_json}}}\n'.encode()
+
+# --- service ---
+
+class ServiceBusy(Exception):
+    pass
+
+# One computation and the lines it has streamed that some follower has not sent yet. At most
+# max_buffered_lines are held: publish waits for the slowest follower, which holds the workers back
+# too. A request can join while every line is still buffered and replays them; once the first line has
+# been released, an identical request starts its own computation. When every follower has gone,
+# lines are dropped and abandoned() tells the computation to stop.
+class Computation:
+    def __init__(self, max_buffered_lines=MAX_BUFFERED_LINES):
+        self.max_buffered_lines = max_buffered_lines
+        self.lines = []
+        self.first = 0
+        self.positions = {}
+        self.followers = 0
+        self.done = False
+        self.changed = asyncio.Condition()
+
+    def joinable(self):
+        return self.first == 0 and not self.done
+
+    def abandoned(self):
+        return self.followers > 0 and not self.positions
+
+    # Called without awaiting between the joinable() check and the first follow() step, so a follower
+    # always starts at the first line
+    def join(self):
+        follower = self.followers
+        self.followers += 1
+        self.positions[follower] = 0
+        return follower
+
+    def _release(self):
+        end = self.first + len(self.lines)
+        low = min(self.positions.values()) if self.positions else end
+        if self.followers:
+            del self.lines[:low - self.first]
+            self.first = low
+
+    async def publish(self, line, done=False):
+        async with self.changed:
+            await self.changed.wait_for(lambda: len(self.lines) < self.max_buffered_lines or self.abandoned())
+            self.lines.append(line)
+            self.done = done
+            if self.abandoned():
+                self._release()
+            self.changed.notify_all()
+
+    async def follow(self, follower):
+        try:
+            while True:
+                async with self.changed:
+                    position = self.positions[follower]
+                    await self.changed.wait_for(lambda: position < self.first + len(self.lines))
+                    lines, done = self.lines[position - self.first:], self.done
+                for line in lines:
+                    yield line
+                position += len(lines)
+                async with self.changed:
+                    self.positions[follower] = position
+                    self._release()
+                    self.changed.notify_all()
+                if done and position == self.first + len(self.lines):
+                    return
+        finally:
+            async with self.changed:
+                self.positions.pop(follower, None)
+                self._release()
+                self.changed.notify_all()
+
+class ModelService:
+    def __init__(self, workers=None, max_active_jobs=2, max_queued_jobs=8):
+        self.workers = workers or os.cpu_count()
+        self.max_active_jobs = max_active_jobs
+        self.max_queued_jobs = max_queued_jobs
+        self.pool = None
+        self.slots = asyncio.Semaphore(max_active_jobs)
+        self.waiting = 0
+        self.computations = {}
+        self.active = 0
+        self.workbooks = OrderedDict()
+        self.loading = {}
+        self.stats = {'requests': 0, 'computations': 0, 'coalesced': 0, 'rejected': 0}
+
+    # Starts the pool and has every worker import the model before the first request arrives
+    async def start(self):
+        import SolarFinancialModelFunctions
+        self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'), initializer=_warm_worker)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.pool, _ping) for _ in range(self.workers)])
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+    def status(self):
+        return {'workers': self.workers, 'running': self.active - self.waiting, 'waiting': self.waiting,
+                'loaded_workbooks': len(self.workbooks), **self.stats}
+
+    # Workbooks are kept parsed, keyed by path, size and mtime; concurrent loads of one file share a read
+    async def load(self, input_file):
+        import SolarFinancialModelFunctions as sfm
+        path = os.path.abspath(input_file)
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        if key in self.workbooks:
+            self.workbooks.move_to_end(key)
+            return key, self.workbooks[key]
+        if key not in self.loading:
+            self.loading[key] = asyncio.ensure_future(asyncio.to_thread(sfm.load_input_file, path))
+        try:
+            sheets = await self.loading[key]
+        finally:
+            self.loading.pop(key, None)
+        self.workbooks[key] = sheets
+        while len(self.workbooks) > LOADED_WORKBOOKS:
+            self.workbooks.popitem(last=False)
+        return key, sheets
+
+    async def run(self, request):
+        from run_batch import select_rows
+        tables = request.get('tables', 'summary')
+        if tables not in TABLE_KINDS:
+            raise ValueError(f"unknown tables '{tables}', expected one of {TABLE_KINDS}")
+        chunk_size = int(request.get('chunk_size', 64))
+        input_sets = sorted(request['inputs']) if request.get('inputs') else None
+        scenario_names = [str(name) for name in request['scenarios']] if request.get('scenarios') else None
+        workbook_key, sheets = await self.load(request['input_file'])
+        key = (workbook_key, tables, chunk_size, tuple(input_sets or ()), tuple(scenario_names or ()))
+
+        computation = self.computations.get(key)
+        if computation is not None and computation.joinable():
+            self.stats['coalesced'] += 1
+            return computation, computation.join()
+        if self.active >= self.max_active_jobs + self.max_queued_jobs:
+            self.stats['rejected'] += 1
+            raise ServiceBusy()
+        input_data, scenario_input_data = select_rows(*sheets, set(input_sets) if input_sets else None, scenario_names)
+        computation = self.computations[key] = Computation()
+        self.stats['computations'] += 1
+        self.active += 1
+        self.waiting += 1
+        asyncio.ensure_future(self._compute(key, computation, input_data, scenario_input_data, tables, chunk_size))
+        return computation, computation.join()
+
+    # At most two chunks per worker are in flight, so a large request cannot flood the pool
+    async def _compute(self, key, computation, input_data, scenario_input_data, tables, chunk_size):
+        loop = asyncio.get_running_loop()
+        try:
+            async with self.slots:
+                self.waiting -= 1
+                pending = set()
+                starts = iter(range(0, len(input_data), chunk_size))
+                while not computation.abandoned():
+                    for start in starts:
+                        chunk = input_data.iloc[start:start + chunk_size]
+                        pending.add(loop.run_in_executor(self.pool, _run_chunk, chunk, scenario_input_data, tables, chunk_size))
+                        if len(pending) >= 2 * self.workers:
+                            break
+                    if not pending:
+                        break
+                    finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for future in finished:
+                        for line in future.result():
+                            await computation.publish(line)
+                pairs = len(input_data) * scenario_input_data['Scenario Name'].nunique()
+                await computation.publish(json.dumps({'type': 'done', 'pairs': pairs}).encode() + b'\n', done=True)
+        except Exception as error:
+            await computation.publish(json.dumps({'type': 'error', 'message': str(error)}).encode() + b'\n', done=True)
+        finally:
+            self.active -= 1
+            if self.computations.get(key) is computation:
+                del self.computations[key]
+
+    # --- HTTP ---
+
+    async def handle(self, reader, writer):
+        import SolarFinancialModelFunctions as sfm
+        try:
+            method, path, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            request = json.loads(body) if body else {}
+            self.stats['requests'] += 1
+
+            if method == 'GET' and path == '/status':
+                await _send_json(writer, 200, self.status())
+            elif method == 'POST' and path == '/load':
+                _, (input_data, scenario_input_data) = await self.load(request['input_file'])
+                await _send_json(writer, 200, {'input_sets': len(input_data), 'scenarios': len(scenario_input_data),
+                                               'columns': list(input_data.columns)})
+            elif method == 'POST' and path == '/run':
+                computation, follower = await self.run(request)
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n'
+                             b'Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n')
+                async for line in computation.follow(follower):
+                    writer.write(b'%x\r\n%s\r\n' % (len(line), line))
+                    await writer.drain()
+                writer.write(b'0\r\n\r\n')
+            else:
+                await _send_json(writer, 404, {'error': f'no route {method} {path}'})
+        except ServiceBusy:
+            await _send_json(writer, 503, {'error': 'service busy, retry later'}, {'Retry-After': str(RETRY_AFTER_SECONDS)})
+        except sfm.InputValidationError as error:
+            await _send_json(writer, 400, {'error': 'invalid input', 'problems': error.problems})
+        except (KeyError, ValueError, OSError) as error:
+            await _send_json(writer, 400, {'error': str(error)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            try:
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+async def _send_json(writer, status, payload, headers=None):
+    body = json.dumps(payload).encode()
+    head = [f'HTTP/1.1 {status} {http.client.responses.get(status, "")}', 'Content-Type: application/json',
+            f'Content-Length: {len(body)}', 'Connection: close']
+    head += [f'{name}: {value}' for name, value in (headers or {}).items()]
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + body)
+    await writer.drain()
+
+async def serve(host='127.0.0.1', port=DEFAULT_PORT, workers=None, max_active_jobs=2, max_queued_jobs=8, started=None):
+    service = ModelService(workers, max_active_jobs, max_queued_jobs)
+    await service.start()
+    server = await asyncio.start_server(service.handle, host, port)
+    stop = asyncio.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal_number, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    if started is not None:
+        started(server.sockets[0].getsockname()[1])
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        service.close()
+
+# --- client ---
+
+class ServiceError(Exception):
+    def __init__(self, status, payload):
+        self.status = status
+        self.payload = payload
+        super().__init__(f'{status}: {payload.get("error")}')
+
+# Stand-in client for local tools and tests, standard library only. run() yields the streamed lines
+# as dicts, with each table turned back into a DataFrame when as_frames is set.
+class ModelServiceClient:
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, timeout=600):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def _request(self, method, path, payload=None):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        body = json.dumps(payload).encode() if payload is not None else None
+        connection.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        if response.status != 200:
+            error = ServiceError(response.status, json.loads(response.read() or b'{}'))
+            connection.close()
+            raise error
+        return connection, response
+
+    def _json(self, method, path, payload=None):
+        connection, response = self._request(method, path, payload)
+        try:
+            return json.loads(response.read())
+        finally:
+            connection.close()
+
+    def status(self):
+        return self._json('GET', '/status')
+
+    def load(self, input_file):
+        return self._json('POST', '/load', {'input_file': input_file})
+
+    def run(self, input_file, tables='summary', inputs=None, scenarios=None, chunk_size=64, as_frames=True):
+        request = {'input_file': input_file, 'tables': tables, 'inputs': sorted(inputs) if inputs else None,
+                   'scenarios': scenarios, 'chunk_size': chunk_size}
+        connection, response = self._request('POST', '/run', request)
+        try:
+            for line in response:
+                message = json.loads(line)
+                if message['type'] == 'error':
+                    raise ServiceError(500, {'error': message['message']})
+                if as_frames and 'table' in message:
+                    import pandas as pd
+                    message['table'] = pd.DataFrame(message['table']['data'], columns=message['table']['columns'])
+                yield message
+        finally:
+            connection.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the solar financial model to local tools over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'port to listen on (default {DEFAULT_PORT})')
+    parser.add_argument('--workers', type=int, help='warm worker processes (default: one per CPU)')
+    parser.add_argument('--max-active-jobs', type=int, default=2, help='computations running at once (default 2)')
+    parser.add_argument('--max-queued-jobs', type=int, default=8, help='computations waiting before 503 (default 8)')
+    args = parser.parse_args(argv)
+    started = lambda port: print(f'model service listening on {args.host}:{port}', file=sys.stderr, flush=True)
+    asyncio.run(serve(args.host, args.port, args.workers, args.max_active_jobs, args.max_queued_jobs, started))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
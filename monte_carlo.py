@@ -0,0 +1,212 @@
+import zlib
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import SolarFinancialModelFunctions as sfm
+
+# A distribution is any numpy Generator method and its arguments, drawn as getattr(rng, kind)(*args)
+Distribution = namedtuple('Distribution', ['kind', 'args'])
+
+def normal(sd, mean=0.0):
+    return Distribution('normal', (mean, sd))
+
+def uniform(low, high):
+    return Distribution('uniform', (low, high))
+
+def triangular(low, mode, high):
+    return Distribution('triangular', (low, mode, high))
+
+# Uncertain inputs and how a draw is applied to the sheet value:
+#   specific_yield      relative deviation, a draw of 0.05 means 5% more than 'Specific Yield'
+#   everything else     percentage points added to the sheet percentage
+# consumption_change perturbs each 'Change i Percentage Change' of a scenario with its own draw.
+UNCERTAIN_PARAMETERS = ['specific_yield', 'performance_drop', 'tariff_hike_percentage', 'buyback_hike_percentage',
+                        'opex_hike_percentage', 'consumption_change']
+HIKE_PARAMETERS = ['tariff_hike_percentage', 'buyback_hike_percentage', 'opex_hike_percentage']
+
+HIGHER_IS_BETTER = {'irr_base': True, 'irr_total': True, 'payback_base': False, 'payback_total': False}
+
+# Exceedance levels: P90 is the value reached or bettered in 90% of the samples, i.e. the 10th
+# percentile of IRR and the 90th percentile of payback.
+EXCEEDANCE_LEVELS = [10, 50, 90]
+
+def _check_distributions(distributions):
+    unknown = sorted(set(distributions) - set(UNCERTAIN_PARAMETERS))
+    if unknown:
+        raise ValueError(f"unknown uncertain parameters {unknown}, expected some of {UNCERTAIN_PARAMETERS}")
+
+# One generator per (input set, scenario name, parameter), so a pair's draws do not depend on which
+# other rows are in the run, on the chunk size, or on which other parameters are uncertain. The
+# 'reservoir' generator is split per metric to pick which samples MetricAccumulator keeps, so that
+# choice does not depend on the chunk size either.
+def pair_generators(seed, input_set, scenario_name):
+    scenario_key = zlib.crc32(str(scenario_name).encode())
+    return {
+        name: np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(int(input_set), scenario_key, position)))
+        for position, name in enumerate(UNCERTAIN_PARAMETERS + ['reservoir'])
+    }
+
+def _draw(generator, distribution, size):
+    return getattr(generator, distribution.kind)(*distribution.args, size=size)
+
+# Perturbed copies of one input row and one scenario's change table, size samples at a time
+def sample_parameters(params_row, scenario_changes, distributions, generators, size):
+    params = np.repeat(params_row[None], size)
+    draws = {name: _draw(generators[name], distribution, size) for name, distribution in distributions.items()
+             if name != 'consumption_change'}
+    if 'specific_yield' in draws:
+        params['specific_yield'] = np.maximum(params['specific_yield'] * (1 + draws['specific_yield']), 0)
+    if 'performance_drop' in draws:
+        params['performance_drop'] = np.clip(params['performance_drop'] + draws['performance_drop'] / 100, 0, 1)
+    for name in HIKE_PARAMETERS:
+        if name in draws:
+            params[name] = np.maximum(params[name] + draws[name] / 100, -1)
+
+    change_table = {key: np.repeat(values[None], size, axis=0) for key, values in scenario_changes.items()}
+    if 'consumption_change' in distributions:
+        change_table['percentage_change'] = change_table['percentage_change'] + _draw(
+            generators['consumption_change'], distributions['consumption_change'], change_table['percentage_change'].shape)
+    return params, change_table
+
+# Yields the pair metrics of chunk_size samples at a time; only one chunk of yearly arrays is alive
+def simulate_pair(params_row, scenario_changes, distributions, samples, chunk_size, generators):
+    for start in range(0, samples, chunk_size):
+        size = min(chunk_size, samples - start)
+        params, change_table = sample_parameters(params_row, scenario_changes, distributions, generators, size)
+        annual_consumptions = sfm.consumption_matrix(change_table, int(params_row['years_projection']))
+        flows = sfm.compute_cash_flows(params, annual_consumptions[:, None, :])
+        yield sfm.pair_metrics(params, flows)
+
+# Samples that never reach an IRR or payback count as the worst outcome for the quantiles and are
+# left out of the mean and histogram.
+def exceedance_values(values, metric):
+    worst = -np.inf if HIGHER_IS_BETTER[metric] else np.inf
+    filled = np.where(np.isnan(values), worst, values)
+    levels = [1 - level / 100 if HIGHER_IS_BETTER[metric] else level / 100 for level in EXCEEDANCE_LEVELS]
+    quantiles = np.quantile(filled, levels, method='inverted_cdf')
+    return np.where(np.isfinite(quantiles), quantiles, np.nan)
+
+def metric_statistics(values, metric):
+    achieved = values[~np.isnan(values)]
+    statistics = {
+        'Samples': len(values),
+        'Mean': achieved.mean() if len(achieved) else np.nan,
+        'Std': achieved.std(ddof=1) if len(achieved) > 1 else np.nan,
+        'Not achieved (%)': 100 * (1 - len(achieved) / len(values)),
+    }
+    statistics.update(zip([f'P{level}' for level in EXCEEDANCE_LEVELS], exceedance_values(values, metric)))
+    return statistics
+
+# Streaming statistics of one metric of one pair, updated a chunk at a time. The sample count and the
+# mean and variance of the achieved values are merged chunk by chunk (Welford, in Chan's pairwise form)
+# and are exact. Quantiles and the histogram come from a uniform reservoir of at most reservoir_size
+# samples, so memory stays fixed however many samples are drawn; while samples <= reservoir_size the
+# reservoir holds every sample and they equal metric_statistics over all values.
+class MetricAccumulator:
+    def __init__(self, metric, reservoir_size, generator):
+        self.metric = metric
+        self.generator = generator
+        self.samples = 0
+        self.achieved = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.reservoir = np.empty(reservoir_size)
+        self.filled = 0
+
+    def add(self, values):
+        achieved = values[~np.isnan(values)]
+        if len(achieved):
+            chunk_mean = achieved.mean()
+            total = self.achieved + len(achieved)
+            delta = chunk_mean - self.mean
+            self.mean += delta * len(achieved) / total
+            self.m2 += ((achieved - chunk_mean) ** 2).sum() + delta ** 2 * self.achieved * len(achieved) / total
+            self.achieved = total
+
+        # Algorithm R a chunk at a time: sample i (from 0) replaces a random slot with probability size / (i + 1)
+        fill = min(len(values), len(self.reservoir) - self.filled)
+        self.reservoir[self.filled:self.filled + fill] = values[:fill]
+        self.filled += fill
+        rest = values[fill:]
+        if len(rest):
+            positions = self.samples + fill + np.arange(len(rest))
+            slots = (self.generator.random(len(rest)) * (positions + 1)).astype(np.int64)
+            kept = slots < len(self.reservoir)
+            self.reservoir[slots[kept]] = rest[kept]
+        self.samples += len(values)
+
+    def statistics(self):
+        statistics = {
+            'Samples': self.samples,
+            'Mean': self.mean if self.achieved else np.nan,
+            'Std': np.sqrt(self.m2 / (self.achieved - 1)) if self.achieved > 1 else np.nan,
+            'Not achieved (%)': 100 * (1 - self.achieved / self.samples),
+        }
+        statistics.update(zip([f'P{level}' for level in EXCEEDANCE_LEVELS], exceedance_values(self.reservoir[:self.filled], self.metric)))
+        return statistics
+
+    # (bin start, bin end, count) of the achieved values. Reservoir counts are scaled up to all samples.
+    def histogram(self, bins):
+        values = self.reservoir[:self.filled]
+        achieved = values[~np.isnan(values)]
+        if not len(achieved):
+            return []
+        counts, edges = np.histogram(achieved, bins=bins)
+        if self.filled < self.samples:
+            counts = np.round(counts * self.achieved / len(achieved)).astype(np.int64)
+        return list(zip(edges[:-1], edges[1:], counts))
+
+# Stochastic counterpart of run_model. distributions maps names from UNCERTAIN_PARAMETERS to
+# Distribution values, e.g. {'specific_yield': normal(0.05), 'tariff_hike_percentage': uniform(-1, 1)}.
+# Every input/scenario pair gets samples draws, evaluated chunk_size at a time, and the result is a dict
+# of DataFrames that sfm.save_results can write:
+#   Summary      mean, spread and P10/P50/P90 of IRR and payback per pair
+#   Convergence  the running mean, standard error, P50 and P90 after every chunk
+#   Histogram    bins counts of the achieved values per pair and metric
+# Memory depends on chunk_size and reservoir_size, not on samples (see MetricAccumulator).
+# progress(done_samples, total_samples) is called once per chunk.
+def run_monte_carlo(input_data, scenario_input_data, distributions, samples=10000, chunk_size=2000, seed=0,
+                    bins=50, progress=None, reservoir_size=10000):
+    _check_distributions(distributions)
+    params = sfm.input_parameters(input_data)
+    change_table = sfm.parse_scenarios(scenario_input_data)
+    scenario_names = change_table['names']
+    total_samples = len(input_data) * len(scenario_names) * samples
+    done_samples = 0
+    summary_rows, convergence_rows, histogram_rows = [], [], []
+
+    for input_position, input_index in enumerate(input_data.index):
+        for scenario_position, scenario_name in enumerate(scenario_names):
+            pair = {'Input Set': input_index + 1, 'Scenario': scenario_name}
+            scenario_changes = {key: values[scenario_position] for key, values in change_table.items() if key != 'names'}
+            generators = pair_generators(seed, input_index + 1, scenario_name)
+            accumulators = {
+                metric: MetricAccumulator(metric, reservoir_size, generator)
+                for metric, generator in zip(sfm.PAIR_METRIC_LABELS, generators['reservoir'].spawn(len(sfm.PAIR_METRIC_LABELS)))
+            }
+
+            for chunk_metrics in simulate_pair(params[input_position], scenario_changes, distributions, samples, chunk_size, generators):
+                for metric, label in sfm.PAIR_METRIC_LABELS.items():
+                    accumulators[metric].add(chunk_metrics[metric] * sfm.PAIR_METRIC_SCALE[metric])
+                    statistics = accumulators[metric].statistics()
+                    convergence_rows.append({
+                        **pair, 'Metric': label, 'Samples': statistics['Samples'], 'Mean': statistics['Mean'],
+                        'Standard Error': statistics['Std'] / np.sqrt(statistics['Samples']),
+                        'P50': statistics['P50'], 'P90': statistics['P90'],
+                    })
+                done_samples += len(chunk_metrics['irr_total'])
+                if progress is not None:
+                    progress(done_samples, total_samples)
+
+            for metric, label in sfm.PAIR_METRIC_LABELS.items():
+                summary_rows.append({**pair, 'Metric': label, **accumulators[metric].statistics()})
+                histogram_rows.extend(
+                    {**pair, 'Metric': label, 'Bin Start': low, 'Bin End': high, 'Count': count}
+                    for low, high, count in accumulators[metric].histogram(bins)
+                )
+
+    return {
+        'Summary': pd.DataFrame(summary_rows),
+        'Convergence': pd.DataFrame(convergence_rows),
+        'Histogram': pd.DataFrame(histogram_rows),
+    }
@@ -0,0 +1,92 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+import SolarFinancialModelFunctions as sfm
+import model_results
+
+# Set once per worker process by _init_worker: a read-only view of the parent's consumption matrix
+_shared_memory = None
+_annual_consumptions = None
+_scenario_names = None
+
+def _init_worker(shared_memory_name, shape, scenario_names):
+    global _shared_memory, _annual_consumptions, _scenario_names
+    _shared_memory = shared_memory.SharedMemory(name=shared_memory_name)
+    _annual_consumptions = np.ndarray(shape, dtype=np.float64, buffer=_shared_memory.buf)
+    _annual_consumptions.flags.writeable = False
+    _scenario_names = scenario_names
+
+# The one worker task behind both entry points: a ModelBatch like iter_model's, with contiguous flows
+# so they pickle without copies of broadcast views
+def _run_chunk(input_chunk):
+    params = sfm.input_parameters(input_chunk)
+    annual_consumptions = _annual_consumptions[:, :int(params['years_projection'].max())]
+    flows = sfm.compute_cash_flows(params, annual_consumptions)
+    summary = sfm.summary_table(input_chunk, params, _scenario_names, annual_consumptions, flows)
+    flows = {column: np.ascontiguousarray(values) for column, values in flows.items()}
+    return sfm.ModelBatch(input_chunk, params, _scenario_names, np.array(annual_consumptions), flows, summary)
+
+def _share_consumptions(input_data, scenario_input_data):
+    change_table = sfm.parse_scenarios(scenario_input_data)
+    annual_consumptions = sfm.consumption_matrix(change_table, int(input_data['Years Projection'].max()))
+    block = shared_memory.SharedMemory(create=True, size=max(annual_consumptions.nbytes, 1))
+    np.ndarray(annual_consumptions.shape, dtype=np.float64, buffer=block.buf)[:] = annual_consumptions
+    return block, annual_consumptions.shape, change_table['names']
+
+# Parallel drop-in for sfm.iter_model: yields the same ModelBatch chunks, in input order, computed
+# across a process pool. At most two chunks per worker are in flight, so memory stays bounded when it
+# feeds the streaming exporters.
+def iter_model_parallel(input_data, scenario_input_data, workers=None, chunk_size=64):
+    if not len(input_data):
+        return
+    block, shape, scenario_names = _share_consumptions(input_data, scenario_input_data)
+    try:
+        workers = workers or os.cpu_count()
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(block.name, shape, scenario_names)) as executor:
+            for start in range(0, len(input_data), chunk_size):
+                pending.append(executor.submit(_run_chunk, input_data.iloc[start:start + chunk_size]))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    finally:
+        block.close()
+        block.unlink()
+
+# Same output as run_model, with Input Details rows sharded across a process pool in chunks of
+# chunk_size. The Scenarios sheet is parsed once here and its consumption matrix is handed to the
+# workers through shared memory instead of being pickled into every task. Chunks are gathered in input
+# order; progress(done_pairs, total_pairs) is called as each chunk completes.
+def run_model_parallel(input_data, scenario_input_data, workers=None, chunk_size=64, progress=None):
+    if not len(input_data):
+        return model_results.ModelResults(sfm.RESULT_COLUMNS)
+
+    block, shape, scenario_names = _share_consumptions(input_data, scenario_input_data)
+    try:
+        chunks = [input_data.iloc[start:start + chunk_size] for start in range(0, len(input_data), chunk_size)]
+        total_pairs = len(input_data) * len(scenario_names)
+        done_pairs = 0
+        chunk_results = [None] * len(chunks)
+
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                                 initargs=(block.name, shape, scenario_names)) as executor:
+            futures = {executor.submit(_run_chunk, chunk): position for position, chunk in enumerate(chunks)}
+            for future in as_completed(futures):
+                position = futures[future]
+                batch = future.result()
+                chunk_results[position] = (batch.summary, batch.params['years_projection'], sfm.pack_results(batch.flows))
+                done_pairs += len(chunks[position]) * len(scenario_names)
+                if progress is not None:
+                    progress(done_pairs, total_pairs)
+    finally:
+        block.close()
+        block.unlink()
+
+    scenario_results = model_results.ModelResults(sfm.RESULT_COLUMNS, scenario_names)
+    for chunk, (summary, years_projection, values) in zip(chunks, chunk_results):
+        scenario_results.add(chunk.index.to_numpy() + 1, years_projection, values, summary)
+    return scenario_results
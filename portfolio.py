@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+import SolarFinancialModelFunctions as sfm
+import summary_metrics
+
+# Optional Input Details columns a portfolio run can group sites by
+GROUP_COLUMNS = ['Portfolio', 'Region', 'Client']
+UNASSIGNED_GROUP = 'Unassigned'
+CONSUMPTION_COLUMN = 'Annual Consumption (kWh/year)'
+YEARLY_COLUMNS = [
+    CONSUMPTION_COLUMN,
+    'PV Generation (kWh/year)',
+    'Consumed PV Power (kWh/year)',
+    'Excess Energy Exported (kWh/year)',
+    'Energy Consumption Saving (RM)',
+    'Exported Energy Saving (RM)',
+    'Tax Saving from GITA (RM)',
+    'OPEX (RM)',
+    'Capital Expense (base) (RM)',
+    'Capital Expense (RM)',
+    'Total Expense (base)(RM)',
+    'Total Expense (RM)',
+    'Total Income (RM)',
+    'Annual Cash Flow (base) (RM)',
+    'Annual Cash Flow (RM)',
+]
+SITE_COLUMNS = ['Sites', 'Installed Capacity (kWp)', 'PV Investment Cost (RM)', 'Overall Investment Cost with Structure (RM)']
+
+def group_keys(input_data, group_by):
+    missing = [column for column in group_by if column not in input_data]
+    if missing:
+        raise sfm.InputValidationError([f"'Input Details' has no '{column}' column to group by" for column in missing])
+    if not group_by:
+        return [()] * len(input_data)
+    keys = input_data[list(group_by)].astype(object).where(input_data[list(group_by)].notna(), UNASSIGNED_GROUP)
+    return list(keys.itertuples(index=False, name=None))
+
+# Running per-group totals of the yearly series. Only (group, scenario, year) sums are kept, so memory
+# depends on the number of groups, not on the number of sites streamed through add().
+class PortfolioTotals:
+    def __init__(self, group_by):
+        self.group_by = list(group_by)
+        self.groups = {}
+        self.scenario_names = None
+        self.yearly = {column: np.zeros((0, 0, 0)) for column in YEARLY_COLUMNS}
+        self.sites = {column: np.zeros(0) for column in SITE_COLUMNS}
+
+    def _grow(self, n_groups, n_scenarios, n_years):
+        for column, totals in self.yearly.items():
+            if totals.shape[0] < n_groups or totals.shape[2] < n_years:
+                grown = np.zeros((max(n_groups, totals.shape[0]), n_scenarios, max(n_years, totals.shape[2])))
+                grown[:totals.shape[0], :totals.shape[1], :totals.shape[2]] = totals
+                self.yearly[column] = grown
+        for column, totals in self.sites.items():
+            if len(totals) < n_groups:
+                self.sites[column] = np.concatenate([totals, np.zeros(n_groups - len(totals))])
+
+    def add(self, batch):
+        if self.scenario_names is None:
+            self.scenario_names = list(batch.scenario_names)
+        n_inputs, n_scenarios, n_years = batch.flows['Annual Cash Flow (RM)'].shape
+        codes = np.array([self.groups.setdefault(key, len(self.groups)) for key in group_keys(batch.input_data, self.group_by)])
+        self._grow(len(self.groups), n_scenarios, n_years)
+
+        # Summing rows by group is a (group x site) indicator matrix times the (site x scenario*year) block
+        chunk_groups, chunk_codes = np.unique(codes, return_inverse=True)
+        indicator = np.zeros((len(chunk_groups), n_inputs))
+        indicator[chunk_codes, np.arange(n_inputs)] = 1
+        active = np.arange(1, n_years + 1) <= batch.params['years_projection'][:, None, None]
+        for column in YEARLY_COLUMNS:
+            values = batch.annual_consumptions if column == CONSUMPTION_COLUMN else batch.flows[column]
+            values = np.where(active, values, 0.0).reshape(n_inputs, -1)
+            self.yearly[column][chunk_groups, :, :n_years] += (indicator @ values).reshape(-1, n_scenarios, n_years)
+
+        base_investment_cost = batch.params['capacity_kWp'] * batch.params['cost_per_kwp']
+        site_values = {
+            'Sites': np.ones(n_inputs),
+            'Installed Capacity (kWp)': batch.params['capacity_kWp'],
+            'PV Investment Cost (RM)': base_investment_cost,
+            'Overall Investment Cost with Structure (RM)': base_investment_cost + batch.params['additional_structure_cost'],
+        }
+        for column, values in site_values.items():
+            self.sites[column][chunk_groups] += indicator @ values
+
+    def _key_columns(self, repeat):
+        keys = list(self.groups)
+        return {column: np.repeat(np.array([key[position] for key in keys], dtype=object), repeat)
+                for position, column in enumerate(self.group_by)}
+
+    # Portfolio IRR and payback are computed on the summed cash flow series of each group
+    def summary(self):
+        if not self.groups:
+            return pd.DataFrame()
+        n_groups, n_scenarios = len(self.groups), len(self.scenario_names or [])
+        n_years = self.yearly['Annual Cash Flow (RM)'].shape[2]
+        per_group = lambda values: np.repeat(values, n_scenarios)
+        cash_flows = self.yearly['Annual Cash Flow (RM)'].reshape(-1, n_years)
+        cash_flows_base = self.yearly['Annual Cash Flow (base) (RM)'].reshape(-1, n_years)
+        not_achieved = lambda payback: pd.Series(payback, dtype=object).where(~np.isnan(payback), 'Not achieved')
+        table = {
+            **self._key_columns(n_scenarios),
+            'Scenario': np.tile(np.asarray(self.scenario_names or [], dtype=object), n_groups),
+            **{column: per_group(self.sites[column]) for column in SITE_COLUMNS},
+            'Sites': per_group(self.sites['Sites'].astype(int)),
+            'PV IRR (%)': summary_metrics.irr(cash_flows_base)[0] * 100,
+            'Overall IRR (%)': summary_metrics.irr(cash_flows)[0] * 100,
+            'PV Payback Period (years)': not_achieved(summary_metrics.payback_period(
+                np.cumsum(cash_flows_base, axis=1), per_group(self.sites['PV Investment Cost (RM)']))),
+            'Overall Payback Period (years)': not_achieved(summary_metrics.payback_period(
+                np.cumsum(cash_flows, axis=1), per_group(self.sites['Overall Investment Cost with Structure (RM)']))),
+        }
+        for column in YEARLY_COLUMNS[:4]:
+            table[f'Total {column.replace("/year", "")}'] = self.yearly[column].sum(axis=2).ravel()
+        return pd.DataFrame(table)
+
+    def yearly_table(self):
+        if not self.groups:
+            return pd.DataFrame()
+        n_groups, n_scenarios, n_years = self.yearly['Annual Cash Flow (RM)'].shape
+        table = {
+            **self._key_columns(n_scenarios * n_years),
+            'Scenario': np.tile(np.repeat(np.asarray(self.scenario_names or [], dtype=object), n_years), n_groups),
+            'Year': np.tile(np.arange(1, n_years + 1), n_groups * n_scenarios),
+        }
+        for column in YEARLY_COLUMNS:
+            table[column] = self.yearly[column].ravel()
+        table['Cumulative Cash Flow (base) (RM)'] = np.cumsum(self.yearly['Annual Cash Flow (base) (RM)'], axis=2).ravel()
+        table['Cumulative Cash Flow (RM)'] = np.cumsum(self.yearly['Annual Cash Flow (RM)'], axis=2).ravel()
+        return pd.DataFrame(table)
+
+# Portfolio mode: streams the engine's chunks into per-group totals and returns a dict that
+# sfm.save_results can write, with 'Portfolio Summary' (portfolio IRR and payback per group and
+# scenario) and 'Portfolio Yearly' (summed yearly series). group_by defaults to whichever of
+# GROUP_COLUMNS the sheet has; with none of them all sites form one portfolio. batches works as in
+# excel_export.export_results, e.g. parallel_model.iter_model_parallel.
+def aggregate_portfolio(input_data, scenario_input_data, group_by=None, chunk_size=256, batches=None, progress=None):
+    if group_by is None:
+        group_by = [column for column in GROUP_COLUMNS if column in input_data]
+    totals = PortfolioTotals(group_by)
+    if batches is None:
+        batches = sfm.iter_model(input_data, scenario_input_data, chunk_size)
+    done_sites = 0
+    for batch in batches:
+        totals.add(batch)
+        done_sites += len(batch.input_data)
+        if progress is not None:
+            progress(done_sites, len(input_data))
+    return {'Portfolio Summary': totals.summary(), 'Portfolio Yearly': totals.yearly_table()}
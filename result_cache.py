@@ -0,0 +1,144 @@
+import hashlib
+import os
+import sqlite3
+import time
+import numpy as np
+import SolarFinancialModelFunctions as sfm
+import summary_metrics
+
+# Bump when the cached value layout changes. The source of every module that computes cached values
+# (the engine and the IRR/payback solver) is folded into every key as well, so editing either
+# invalidates all entries written by the old code.
+CACHE_FORMAT_VERSION = 2
+CACHED_COLUMNS = sfm.RESULT_COLUMNS[1:] + sfm.CASH_FLOW_COLUMNS
+CUMULATIVE_COLUMNS = ['Cumulative Cash Flow (base) (RM)', 'Cumulative Cash Flow (RM)']
+MODEL_MODULES = [sfm, summary_metrics]
+
+def model_version():
+    digest = hashlib.sha256(f'format {CACHE_FORMAT_VERSION}'.encode())
+    for module in MODEL_MODULES:
+        with open(module.__file__, 'rb') as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+# On-disk cache of yearly engine output per input/scenario pair, keyed by a hash of the normalized
+# input-row parameters and the scenario's consumption trajectory. Entries live in one SQLite file and
+# the least recently used ones are evicted once max_bytes is exceeded.
+class ResultCache:
+    def __init__(self, directory, max_bytes=1024 ** 3):
+        os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.version = model_version()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.connection = sqlite3.connect(os.path.join(directory, 'results.sqlite'))
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, version TEXT, value BLOB, size INTEGER, last_used REAL)'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+        self.connection.execute('DELETE FROM results WHERE version != ?', (self.version,))
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def report(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def pair_keys(self, params, annual_consumptions):
+        consumption_digests = {}
+        keys = []
+        for row, years_projection in zip(params, params['years_projection']):
+            if years_projection not in consumption_digests:
+                consumption_digests[years_projection] = [
+                    hashlib.sha256(np.ascontiguousarray(consumptions[:years_projection]).tobytes()).digest()
+                    for consumptions in annual_consumptions
+                ]
+            row_digest = hashlib.sha256(self.version.encode() + row.tobytes()).digest()
+            keys.append([hashlib.sha256(row_digest + digest).hexdigest() for digest in consumption_digests[years_projection]])
+        return keys
+
+    def _fetch(self, keys):
+        values = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            values.update(self.connection.execute(f'SELECT key, value FROM results WHERE key IN ({placeholders})', batch))
+        if values:
+            found = list(values)
+            now = time.time()
+            for start in range(0, len(found), 500):
+                batch = found[start:start + 500]
+                self.connection.execute(f"UPDATE results SET last_used = ? WHERE key IN ({','.join('?' * len(batch))})", [now] + batch)
+            self.connection.commit()
+        return values
+
+    def _store(self, entries):
+        now = time.time()
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO results (key, version, value, size, last_used) VALUES (?, ?, ?, ?, ?)',
+            [(key, self.version, value, len(value), now) for key, value in entries],
+        )
+        total_bytes = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        if total_bytes > self.max_bytes:
+            evicted = 0
+            for key, size in self.connection.execute('SELECT key, size FROM results ORDER BY last_used').fetchall():
+                if total_bytes <= self.max_bytes:
+                    break
+                self.connection.execute('DELETE FROM results WHERE key = ?', (key,))
+                total_bytes -= size
+                evicted += 1
+            self.evictions += evicted
+        self.connection.commit()
+
+    # Cached replacement for sfm.compute_cash_flows + sfm.pair_metrics: cached pairs are read back, and
+    # only new or changed input/scenario pairs go through the engine and the IRR solver.
+    # Each entry holds the pair's yearly table followed by its PAIR_METRICS values.
+    def evaluate(self, params, annual_consumptions):
+        years_projection = params['years_projection']
+        n_inputs, n_scenarios, n_years = len(years_projection), len(annual_consumptions), annual_consumptions.shape[-1]
+        n_metrics = len(sfm.PAIR_METRICS)
+        keys = self.pair_keys(params, annual_consumptions)
+        cached = self._fetch([key for row in keys for key in row])
+        tables = np.zeros((n_inputs, n_scenarios, len(CACHED_COLUMNS), n_years))
+        metrics = np.zeros((n_inputs, n_scenarios, n_metrics))
+
+        missing = []
+        for input_position, years in enumerate(years_projection):
+            for scenario_position, key in enumerate(keys[input_position]):
+                value = cached.get(key)
+                if value is None:
+                    missing.append((input_position, scenario_position))
+                    continue
+                value = np.frombuffer(value, dtype=np.float64)
+                tables[input_position, scenario_position, :, :years] = value[:-n_metrics].reshape(-1, years)
+                metrics[input_position, scenario_position] = value[-n_metrics:]
+        self.hits += n_inputs * n_scenarios - len(missing)
+        self.misses += len(missing)
+
+        # Padding years keep the last cumulative value, as the engine's own output does
+        beyond_projection = np.arange(1, n_years + 1) > years_projection[:, None, None]
+        last_year = np.broadcast_to(np.maximum(years_projection - 1, 0)[:, None, None], (n_inputs, n_scenarios, 1))
+        for column in CUMULATIVE_COLUMNS:
+            cumulative = tables[:, :, CACHED_COLUMNS.index(column)]
+            cumulative[:] = np.where(beyond_projection, np.take_along_axis(cumulative, last_year, axis=2), cumulative)
+
+        if missing:
+            input_positions, scenario_positions = (np.array(positions) for positions in zip(*missing))
+            missing_params = params[input_positions]
+            computed = sfm.compute_cash_flows(missing_params, annual_consumptions[scenario_positions][:, None, :])
+            computed_tables = np.stack([computed[column][:, 0] for column in CACHED_COLUMNS], axis=1)
+            computed_metrics = np.column_stack([values for values in sfm.pair_metrics(missing_params, computed).values()])
+            tables[input_positions, scenario_positions] = computed_tables
+            metrics[input_positions, scenario_positions] = computed_metrics
+            self._store([
+                (keys[input_position][scenario_position],
+                 computed_tables[pair, :, :years_projection[input_position]].tobytes() + computed_metrics[pair].tobytes())
+                for pair, (input_position, scenario_position) in enumerate(missing)
+            ])
+
+        flows = {column: tables[:, :, position] for position, column in enumerate(CACHED_COLUMNS)}
+        return flows, {name: metrics[:, :, position].ravel() for position, name in enumerate(sfm.PAIR_METRICS)}
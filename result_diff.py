@@ -0,0 +1,359 @@
+import argparse
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+from collections.abc import Mapping
+import numpy as np
+import pandas as pd
+import SolarFinancialModelFunctions as sfm
+import model_results
+import result_store
+
+# Compares two result sets of the model, e.g. before and after a tariff change:
+#   python result_diff.py old_results.xlsx new_results.xlsx --output changes.xlsx
+# Either side can be a workbook written by save_results or the GUI, an --format xlsx-long workbook, a
+# Parquet result store or merged job directory, or (from Python) what run_model returns.
+EXIT_OK = 0
+EXIT_CHANGED = 1
+EXIT_INVALID_INPUT = 2
+
+VALUE_COLUMNS = sfm.RESULT_COLUMNS[1:]
+SUMMARY_METRICS = ['PV IRR (%)', 'Overall IRR (%)', 'PV Payback Period (years)', 'Overall Payback Period (years)']
+# Report metric -> yearly column whose last projected year it takes
+FINAL_CASH_FLOWS = {
+    'Final Cumulative Cash Flow (base) (RM)': 'Cumulative Cash Flow (base) (RM)',
+    'Final Cumulative Cash Flow (RM)': 'Cumulative Cash Flow (RM)',
+}
+REPORT_METRICS = SUMMARY_METRICS + list(FINAL_CASH_FLOWS)
+DEFAULT_RANK_BY = 'Final Cumulative Cash Flow (RM)'
+# Workbooks keep 15 significant digits, so values closer than this are the same number
+RELATIVE_TOLERANCE = 1e-14
+ABSOLUTE_TOLERANCE = 1e-9
+SHEETS_WITHOUT_PAIRS = re.compile(r'^(Summary|Input Details|Results)( \(\d+\))?$')
+
+# Both sides are normalized to a Summary table and one long yearly table, each keyed by Input Set and
+# Scenario (and Year). Scenario is categorical so names are hashed per distinct name, not per row.
+# A result store with hashes.parquet comes with the hash of each pair's yearly rows instead, and its
+# yearly table is only read for the pairs that turn out to differ.
+ResultSet = namedtuple('ResultSet', ['summary', 'yearly', 'yearly_hashes', 'path'])
+ResultDiff = namedtuple('ResultDiff', ['report', 'pairs', 'identical', 'changed', 'added', 'removed'])
+
+def _scenario_categories(scenarios):
+    scenarios = pd.Categorical(scenarios)
+    return scenarios.rename_categories([str(name) for name in scenarios.categories])
+
+def _summary_frame(summary):
+    summary = summary.copy()
+    summary['Input Set'] = summary['Input Set'].to_numpy(dtype=np.int64)
+    summary['Scenario'] = _scenario_categories(summary['Scenario'])
+    for column in summary.columns.drop(['Input Set', 'Scenario']):
+        summary[column] = pd.to_numeric(summary[column], errors='coerce').astype(float)
+    return summary.reset_index(drop=True)
+
+def _yearly_frame(yearly):
+    yearly = yearly[['Input Set', 'Scenario', 'Year'] + VALUE_COLUMNS]
+    return yearly.assign(**{
+        'Input Set': yearly['Input Set'].to_numpy(dtype=np.int64),
+        'Scenario': _scenario_categories(yearly['Scenario']),
+        'Year': yearly['Year'].to_numpy(dtype=np.int64),
+    }, **{column: yearly[column].astype(float) for column in VALUE_COLUMNS})
+
+def _from_model_results(results):
+    if not len(results):
+        raise ValueError('the results hold no input/scenario pairs')
+    n_scenarios = len(results.scenario_names)
+    yearly = []
+    for values, input_sets, years_projection in zip(results.blocks, results.input_sets, results.years_projection):
+        year = np.arange(1, values.shape[1] + 1)
+        active = year <= np.repeat(years_projection, n_scenarios)[:, None]
+        pair_scenarios = np.tile(np.arange(n_scenarios), len(input_sets))[:, None]
+        table = {
+            'Input Set': np.broadcast_to(np.repeat(input_sets, n_scenarios)[:, None], active.shape)[active],
+            'Scenario': pd.Categorical.from_codes(np.broadcast_to(pair_scenarios, active.shape)[active], results.scenario_names),
+            'Year': np.broadcast_to(year, active.shape)[active],
+        }
+        for position, column in enumerate(VALUE_COLUMNS):
+            table[column] = values[:, :, position][active]
+        yearly.append(pd.DataFrame(table))
+    return ResultSet(_summary_frame(results['Summary']), _yearly_frame(pd.concat(yearly, ignore_index=True)), None, None)
+
+# One yearly table per Summary row, in Summary row order, as save_results and the GUI write them. The
+# tables are matched to pairs by position, since long keys are truncated in sheet names.
+def _from_pair_tables(summary, tables):
+    summary = _summary_frame(summary)
+    if len(tables) != len(summary):
+        raise ValueError(f'{len(tables)} yearly tables for {len(summary)} Summary rows')
+    lengths = np.array([len(table) for table in tables], dtype=np.int64)
+    values = np.concatenate([np.asarray(table, dtype=float).reshape(-1, len(sfm.RESULT_COLUMNS)) for table in tables])
+    yearly = pd.DataFrame(values, columns=sfm.RESULT_COLUMNS)
+    yearly['Input Set'] = np.repeat(summary['Input Set'].to_numpy(), lengths)
+    yearly['Scenario'] = np.repeat(summary['Scenario'].to_numpy(), lengths)
+    return ResultSet(summary, _yearly_frame(yearly), None, None)
+
+def _sheet_frame(sheets):
+    header = None
+    rows = []
+    for worksheet in sheets:
+        sheet_rows = worksheet.iter_rows(values_only=True)
+        header = list(next(sheet_rows, None) or header or [])
+        rows.extend(sheet_rows)
+    return pd.DataFrame(rows, columns=header)
+
+# Columns are picked by name from the header row. Workbooks from older versions of the model name
+# them differently and are refused instead of being read by position.
+def _layout_columns(filepath, title, table, columns):
+    missing = [column for column in columns if column not in table.columns]
+    if missing:
+        raise ValueError(f"unsupported workbook layout in '{filepath}': sheet '{title}' has no column "
+                         f"{', '.join(repr(column) for column in missing)}; compare workbooks written by save_results")
+    return table[columns]
+
+def _from_workbook(filepath):
+    import openpyxl
+    workbook = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        titles = workbook.sheetnames
+        parts = lambda name: [workbook[title] for title in titles if re.fullmatch(rf'{name}( \(\d+\))?', title)]
+        if not parts('Summary'):
+            raise ValueError(f"'{filepath}' has no Summary sheet")
+        summary = _sheet_frame(parts('Summary'))
+        _layout_columns(filepath, 'Summary', summary, ['Input Set', 'Scenario'] + SUMMARY_METRICS)
+        if parts('Results'):
+            yearly = _layout_columns(filepath, 'Results', _sheet_frame(parts('Results')), ['Input Set', 'Scenario'] + sfm.RESULT_COLUMNS)
+            return ResultSet(_summary_frame(summary), _yearly_frame(yearly), None, None)
+        tables = []
+        for title in titles:
+            if not SHEETS_WITHOUT_PAIRS.match(title):
+                tables.append(_layout_columns(filepath, title, _sheet_frame([workbook[title]]), sfm.RESULT_COLUMNS))
+        return _from_pair_tables(summary, tables)
+    finally:
+        workbook.close()
+
+# Stored hashes are only used when they list exactly the Summary's pairs, in the same order
+def _from_store(path):
+    summary = _summary_frame(result_store.load_summary(path))
+    hashes = result_store.load_hashes(path)
+    if (hashes is not None and len(hashes) == len(summary)
+            and np.array_equal(hashes['Input Set'].to_numpy(), summary['Input Set'].to_numpy())
+            and (hashes['Scenario'].astype(str).to_numpy() == summary['Scenario'].astype(str).to_numpy()).all()):
+        return ResultSet(summary, None, hashes['Yearly Hash'].to_numpy(dtype=np.uint64), path)
+    return ResultSet(summary, _yearly_frame(result_store.load_results(path)), None, path)
+
+def load_result_set(source):
+    if isinstance(source, ResultSet):
+        return source
+    if isinstance(source, model_results.ModelResults):
+        return _from_model_results(source)
+    if isinstance(source, Mapping):
+        return _from_pair_tables(source['Summary'], [table[sfm.RESULT_COLUMNS] for key, table in source.items() if key != 'Summary'])
+    if os.path.isdir(source):
+        return _from_store(source)
+    return _from_workbook(source)
+
+def _pair_keys(summary):
+    scenarios = summary['Scenario'].array
+    scenario_hashes = pd.util.hash_array(np.asarray(scenarios.categories, dtype=object))
+    golden_ratio = np.uint64(result_store.GOLDEN_RATIO_64)
+    return result_store.mix_hash(summary['Input Set'].to_numpy().astype(np.uint64) * golden_ratio + scenario_hashes[scenarios.codes])
+
+# Per pair of one result set, in Summary order: its key hash (comparable across result sets), a content
+# hash over its Summary row and yearly rows (the same hashes result_store keeps), and where its rows
+# sit in the yearly table sorted by (pair, Year). Within one result set pairs are told apart by exact
+# integer codes instead of hashes.
+class _PairIndex:
+    def __init__(self, result_set):
+        self.summary, self.yearly, yearly_hashes, self.path = result_set
+        self.keys = _pair_keys(self.summary)
+        self.scenario_count = max(len(self.summary['Scenario'].cat.categories), 1)
+        self.pair_codes = self.summary['Input Set'].to_numpy() * self.scenario_count + self.summary['Scenario'].cat.codes.to_numpy()
+        if len(np.unique(self.pair_codes)) != len(self.pair_codes):
+            raise ValueError('the Summary lists an input/scenario pair more than once')
+        self.content = np.zeros(len(self.summary), dtype=np.uint64)
+        for seed, column in enumerate(self.summary.columns.drop(['Input Set', 'Scenario'])):
+            self.content += result_store.value_hash(self.summary[column], seed)
+        if yearly_hashes is None:
+            self.content += self._index_rows(with_hashes=True)
+        else:
+            self.content += yearly_hashes
+
+    def _index_rows(self, with_hashes=False):
+        scenarios = self.yearly['Scenario'].array
+        scenario_codes = self.summary['Scenario'].cat.categories.get_indexer(scenarios.categories)[scenarios.codes]
+        self.years = self.yearly['Year'].to_numpy()
+        row_codes = self.yearly['Input Set'].to_numpy() * self.scenario_count + scenario_codes
+        self.order = np.argsort(row_codes * (self.years.max(initial=0) + 1) + self.years, kind='stable')
+        sorted_codes = row_codes[self.order]
+        starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]) if len(sorted_codes) else np.array([], dtype=np.int64)
+        by_code = np.argsort(self.pair_codes)
+        positions = by_code[np.minimum(np.searchsorted(self.pair_codes, sorted_codes[starts], sorter=by_code), len(by_code) - 1)]
+        if (scenario_codes < 0).any() or (self.pair_codes[positions] != sorted_codes[starts]).any():
+            raise ValueError('the yearly rows include input/scenario pairs missing from the Summary')
+        self.starts = np.zeros(len(self.pair_codes), dtype=np.int64)
+        self.ends = np.zeros(len(self.pair_codes), dtype=np.int64)
+        self.starts[positions] = starts
+        self.ends[positions] = np.r_[starts[1:], len(sorted_codes)]
+        if not with_hashes:
+            return None
+        if len(starts) != len(self.pair_codes):
+            raise ValueError('the yearly rows do not cover every input/scenario pair of the Summary')
+        yearly_hashes = np.zeros(len(self.pair_codes), dtype=np.uint64)
+        if len(starts):
+            row_hashes = result_store.row_hashes(self.years, self.yearly)
+            yearly_hashes[positions] = result_store.mix_hash(np.add.reduceat(row_hashes[self.order], starts))
+        return yearly_hashes
+
+    # A store with stored hashes reads the yearly rows of the given pairs' Input Sets only
+    def load_rows(self, pairs):
+        if self.yearly is not None:
+            return
+        if len(pairs):
+            input_sets = np.unique(self.summary['Input Set'].to_numpy()[pairs])
+            self.yearly = _yearly_frame(result_store.load_results(self.path, inputs=input_sets.tolist()))
+        else:
+            self.yearly = _yearly_frame(pd.DataFrame(columns=['Input Set', 'Scenario', 'Year'] + VALUE_COLUMNS))
+        self._index_rows()
+        if (self.ends[pairs] <= self.starts[pairs]).any():
+            raise ValueError(f"'{self.path}' has no yearly rows for some input/scenario pairs of its Summary")
+
+    # Yearly row numbers of the given pairs, pair by pair, and the position (in pairs) each belongs to
+    def rows(self, pairs):
+        lengths = self.ends[pairs] - self.starts[pairs]
+        owners = np.repeat(np.arange(len(pairs)), lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return self.order[self.starts[pairs][owners] + offsets], owners
+
+    def final_values(self, pairs, column):
+        if not len(pairs):
+            return np.array([], dtype=float)
+        return self.yearly[column].to_numpy(dtype=float)[self.order[self.ends[pairs] - 1]]
+
+def _yearly_values(yearly, rows):
+    return np.column_stack([yearly[column].to_numpy(dtype=float)[rows] for column in VALUE_COLUMNS])
+
+def _metric_values(index, pairs):
+    values = {metric: index.summary[metric].to_numpy(dtype=float)[pairs] for metric in SUMMARY_METRICS}
+    for metric, column in FINAL_CASH_FLOWS.items():
+        values[metric] = index.final_values(pairs, column)
+    return values
+
+def _same(old_values, new_values):
+    return np.isclose(old_values, new_values, rtol=RELATIVE_TOLERANCE, atol=ABSOLUTE_TOLERANCE, equal_nan=True)
+
+# Aligns the two sides by Input Set and Scenario (and Year within a pair) through hashed keys. Pairs
+# whose content hashes match are counted as identical and never compared value by value (nor read,
+# for a result store that keeps hashes). The others are compared within RELATIVE_TOLERANCE, so a
+# workbook (numbers rounded to 15 digits) can be compared with a Parquet store. The report gives old, new and change of every REPORT_METRICS column, the
+# number of years in which any yearly value differs and the largest change in cumulative cash flow.
+# Changed pairs come first, ranked by the absolute change in rank_by, then added and removed pairs.
+def diff_results(old, new, rank_by=DEFAULT_RANK_BY):
+    if rank_by not in REPORT_METRICS:
+        raise ValueError(f"Unknown rank_by '{rank_by}', expected one of: {', '.join(REPORT_METRICS)}")
+    old_index, new_index = _PairIndex(load_result_set(old)), _PairIndex(load_result_set(new))
+    _, old_common, new_common = np.intersect1d(old_index.keys, new_index.keys, assume_unique=True, return_indices=True)
+    candidates = old_index.content[old_common] != new_index.content[new_common]
+    old_changed, new_changed = old_common[candidates], new_common[candidates]
+    removed = np.flatnonzero(~np.isin(np.arange(len(old_index.keys)), old_common, kind='table'))
+    added = np.flatnonzero(~np.isin(np.arange(len(new_index.keys)), new_common, kind='table'))
+    old_index.load_rows(np.r_[old_changed, removed])
+    new_index.load_rows(np.r_[new_changed, added])
+
+    old_rows, owners = old_index.rows(old_changed)
+    new_rows, new_owners = new_index.rows(new_changed)
+    year_count = max(old_index.years.max(initial=0), new_index.years.max(initial=0)) + 1
+    old_year_keys = owners * year_count + old_index.years[old_rows]
+    new_year_keys = new_owners * year_count + new_index.years[new_rows]
+    _, old_aligned, new_aligned = np.intersect1d(old_year_keys, new_year_keys, assume_unique=True, return_indices=True)
+    old_values = _yearly_values(old_index.yearly, old_rows[old_aligned])
+    new_values = _yearly_values(new_index.yearly, new_rows[new_aligned])
+    aligned_owners = owners[old_aligned]
+    differs = ~_same(old_values, new_values).all(axis=1)
+    # Years present on one side only count as changed
+    years_changed = np.bincount(aligned_owners[differs], minlength=len(old_changed))
+    years_changed += np.bincount(owners, minlength=len(old_changed)) + np.bincount(new_owners, minlength=len(old_changed))
+    years_changed -= 2 * np.bincount(aligned_owners, minlength=len(old_changed))
+    cumulative = VALUE_COLUMNS.index('Cumulative Cash Flow (RM)')
+    largest_change = np.zeros(len(old_changed))
+    np.maximum.at(largest_change, aligned_owners, np.abs(new_values[:, cumulative] - old_values[:, cumulative]))
+
+    summary_columns = old_index.summary.columns.drop(['Input Set', 'Scenario']).intersection(new_index.summary.columns)
+    summary_differs = ~_same(old_index.summary[summary_columns].to_numpy(dtype=float)[old_changed],
+                             new_index.summary[summary_columns].to_numpy(dtype=float)[new_changed]).all(axis=1)
+    changed = (years_changed > 0) | summary_differs
+    old_changed, new_changed = old_changed[changed], new_changed[changed]
+    years_changed, largest_change = years_changed[changed], largest_change[changed]
+
+    old_metrics, new_metrics = _metric_values(old_index, old_changed), _metric_values(new_index, new_changed)
+    report = {
+        'Input Set': old_index.summary['Input Set'].to_numpy()[old_changed],
+        'Scenario': old_index.summary['Scenario'].to_numpy().astype(object)[old_changed],
+        'Status': np.full(len(old_changed), 'changed', dtype=object),
+    }
+    for metric in REPORT_METRICS:
+        report[f'{metric} old'] = old_metrics[metric]
+        report[f'{metric} new'] = new_metrics[metric]
+        report[f'{metric} change'] = new_metrics[metric] - old_metrics[metric]
+    report['Years Changed'] = years_changed
+    report['Largest Cumulative Cash Flow Change (RM)'] = largest_change
+    report = pd.DataFrame(report)
+    ranking = np.abs(report[f'{rank_by} change'].to_numpy())
+    report = report.iloc[np.lexsort((report['Input Set'].to_numpy(), -np.nan_to_num(ranking, nan=-1)))]
+
+    one_sided = []
+    for status, index, pairs in (('added', new_index, added), ('removed', old_index, removed)):
+        if not len(pairs):
+            continue
+        metrics = _metric_values(index, pairs)
+        table = {
+            'Input Set': index.summary['Input Set'].to_numpy()[pairs],
+            'Scenario': index.summary['Scenario'].to_numpy().astype(object)[pairs],
+            'Status': np.full(len(pairs), status, dtype=object),
+        }
+        for metric in REPORT_METRICS:
+            table[f'{metric} {"new" if status == "added" else "old"}'] = metrics[metric]
+        one_sided.append(pd.DataFrame(table))
+    if one_sided:
+        report = pd.concat([report] + one_sided, ignore_index=True)[report.columns]
+        report['Years Changed'] = report['Years Changed'].astype('Int64')
+    return ResultDiff(report.reset_index(drop=True), len(old_common), len(old_common) - len(old_changed), len(old_changed),
+                      len(added), len(removed))
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Compare two result sets of the solar financial model.')
+    parser.add_argument('old', help='earlier results: workbook (.xlsx) or Parquet result store directory')
+    parser.add_argument('new', help='later results, in either format')
+    parser.add_argument('--output', help='write the full change report to this .xlsx or .csv file')
+    parser.add_argument('--rank-by', choices=REPORT_METRICS, default=DEFAULT_RANK_BY,
+                        help=f"metric whose absolute change ranks the report (default '{DEFAULT_RANK_BY}')")
+    parser.add_argument('--top', type=int, default=20, help='changed pairs to print (default 20)')
+    return parser
+
+# Exit codes: 0 no differences, 1 some pairs changed, were added or were removed, 2 unreadable input
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    started = time.perf_counter()
+    try:
+        diff = diff_results(args.old, args.new, rank_by=args.rank_by)
+    except (OSError, KeyError, ValueError) as error:
+        log(f'error: {error}')
+        return EXIT_INVALID_INPUT
+    log(f'diff: {diff.pairs} pairs in both, {diff.identical} identical, {diff.changed} changed, '
+        f'{diff.added} added, {diff.removed} removed ({time.perf_counter() - started:.2f}s)')
+
+    if args.top and diff.changed:
+        columns = ['Input Set', 'Scenario'] + [f'{metric} change' for metric in REPORT_METRICS] + ['Years Changed']
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(diff.report[columns].head(min(args.top, diff.changed)).to_string(index=False))
+    if args.output:
+        if args.output.lower().endswith('.csv'):
+            diff.report.to_csv(args.output, index=False)
+        else:
+            diff.report.to_excel(args.output, sheet_name='Changes', index=False)
+    return EXIT_CHANGED if diff.changed or diff.added or diff.removed else EXIT_OK
+
+if __name__ == '__main__':
+    sys.exit(main())
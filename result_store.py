@@ -0,0 +1,174 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import SolarFinancialModelFunctions as sfm
+import instrumentation
+
+# Layout of a result store directory:
+#   results/Scenario=<name>/part-<chunk>-0.parquet  yearly rows, sorted by Input Set and Year
+#   summary.parquet                                 one row per input/scenario pair
+#   inputs.parquet                                  echo of the Input Details sheet
+#   hashes.parquet                                  content hash of every pair's yearly rows
+RESULTS_DIRECTORY = 'results'
+SUMMARY_FILE = 'summary.parquet'
+INPUTS_FILE = 'inputs.parquet'
+HASHES_FILE = 'hashes.parquet'
+
+PAYBACK_COLUMNS = ['PV Payback Period (years)', 'Overall Payback Period (years)']
+
+# Scenario names are stored as text, as ModelResults keys them: Excel gives names like 2025 as numbers
+def batch_table(batch):
+    n_inputs, n_scenarios, n_years = batch.flows['Annual Cash Flow (RM)'].shape
+    year = np.arange(1, n_years + 1)
+    active = np.broadcast_to(year <= batch.params['years_projection'][:, None, None], (n_inputs, n_scenarios, n_years))
+
+    input_sets = np.broadcast_to((batch.input_data.index.to_numpy() + 1)[:, None, None], active.shape)
+    scenario_positions = np.broadcast_to(np.arange(n_scenarios, dtype=np.int32)[None, :, None], active.shape)
+    columns = {
+        'Input Set': pa.array(input_sets[active], pa.int64()),
+        'Scenario': pa.DictionaryArray.from_arrays(scenario_positions[active], pa.array([str(name) for name in batch.scenario_names], pa.string())),
+        'Year': pa.array(np.broadcast_to(year, active.shape)[active], pa.int32()),
+    }
+    for column in sfm.RESULT_COLUMNS[1:]:
+        columns[column] = pa.array(batch.flows[column][active], pa.float64())
+    return pa.table(columns)
+
+# 64-bit content hashes with the splitmix64 finalizer, in place and with wrapping integer arithmetic.
+# Each column gets its own seed so equal numbers in different columns hash differently; -0.0 is
+# folded into 0.0 so that only real value changes alter a hash.
+GOLDEN_RATIO_64 = 0x9E3779B97F4A7C15
+
+def mix_hash(bits):
+    bits ^= bits >> np.uint64(30)
+    bits *= np.uint64(0xBF58476D1CE4E5B9)
+    bits ^= bits >> np.uint64(27)
+    bits *= np.uint64(0x94D049BB133111EB)
+    bits ^= bits >> np.uint64(31)
+    return bits
+
+def value_hash(values, seed):
+    bits = (np.asarray(values, dtype=float) + 0.0).view(np.uint64)
+    bits += np.uint64(seed * GOLDEN_RATIO_64 % 2 ** 64)
+    return mix_hash(bits)
+
+# Hash of every yearly row: its Year and all RESULT_COLUMNS values. A pair's hash mixes the sum of its
+# row hashes, so it does not depend on row order (the Year keeps rows apart); result_diff computes
+# the same from rows read back from the store or a workbook.
+def row_hashes(years, values):
+    hashes = value_hash(years, 0)
+    for seed, column in enumerate(sfm.RESULT_COLUMNS[1:], start=1):
+        hashes += value_hash(values[column], seed)
+    return mix_hash(hashes)
+
+def batch_hashes(batch):
+    n_inputs, n_scenarios, n_years = batch.flows['Annual Cash Flow (RM)'].shape
+    year = np.arange(1, n_years + 1)
+    hashes = row_hashes(np.broadcast_to(year, (n_inputs, n_scenarios, n_years)), batch.flows)
+    hashes[np.broadcast_to(year > batch.params['years_projection'][:, None, None], hashes.shape)] = 0
+    return pa.table({
+        'Input Set': pa.array(np.repeat(batch.input_data.index.to_numpy() + 1, n_scenarios), pa.int64()),
+        'Scenario': pa.array(np.tile(np.asarray(batch.scenario_names, dtype=object), n_inputs).astype(str), pa.string()),
+        'Yearly Hash': pa.array(mix_hash(hashes.sum(axis=-1, dtype=np.uint64)).ravel(), pa.uint64()),
+    })
+
+# Writing a part name again replaces its files, so a chunk that is re-run after an interruption
+# does not leave duplicate rows behind
+def write_batch(results_path, batch, part_name):
+    partitioning = ds.partitioning(pa.schema([('Scenario', pa.dictionary(pa.int32(), pa.string()))]), flavor='hive')
+    ds.write_dataset(batch_table(batch), results_path, format='parquet', partitioning=partitioning,
+                     basename_template=f'{part_name}-{{i}}.parquet', existing_data_behavior='overwrite_or_ignore')
+
+# Payback is stored as a number with NaN for 'Not achieved' so the column stays numeric.
+def summary_record_batch(summary):
+    summary = summary.copy()
+    summary['Scenario'] = summary['Scenario'].astype(str)
+    for column in PAYBACK_COLUMNS:
+        summary[column] = pd.to_numeric(summary[column], errors='coerce')
+    return pa.Table.from_pandas(summary, preserve_index=False)
+
+# Input Details columns are stored with the PARAMETER_FIELDS dtypes and any other column as text, so
+# every part of a streamed or sharded inputs.parquet has the same schema whatever pandas inferred for
+# that chunk (an all-integer column in one chunk may hold decimals in the next)
+def inputs_schema(columns):
+    types = {column: pa.from_numpy_dtype(dtype) for _, column, dtype, _ in sfm.PARAMETER_FIELDS}
+    return pa.schema([(column, types.get(column, pa.string())) for column in columns])
+
+def inputs_table(input_data):
+    schema = inputs_schema(input_data.columns)
+    input_data = input_data.copy()
+    for field in schema:
+        if field.type == pa.string():
+            input_data[field.name] = input_data[field.name].map(lambda value: None if pd.isna(value) else str(value)).astype(object)
+    return pa.Table.from_pandas(input_data, schema=schema, preserve_index=False)
+
+# Columnar alternative to save_results: streams every chunk from iter_model into a Parquet dataset
+# partitioned by scenario, plus a companion summary table. batches works as in excel_export.export_results.
+def write_results(input_data, scenario_input_data, path, chunk_size=256, batches=None):
+    results_path = os.path.join(path, RESULTS_DIRECTORY)
+    if os.path.isdir(results_path):
+        shutil.rmtree(results_path)
+    os.makedirs(results_path, exist_ok=True)
+    pq.write_table(inputs_table(input_data), os.path.join(path, INPUTS_FILE))
+
+    if batches is None:
+        batches = sfm.iter_model(input_data, scenario_input_data, chunk_size)
+    summary_writer = None
+    hashes_writer = None
+    try:
+        for chunk_number, batch in enumerate(batches):
+            with instrumentation.stage('write_results', pairs=len(batch.input_data) * len(batch.scenario_names)):
+                write_batch(results_path, batch, f'part-{chunk_number}')
+
+                summary = summary_record_batch(batch.summary)
+                if summary_writer is None:
+                    summary_writer = pq.ParquetWriter(os.path.join(path, SUMMARY_FILE), summary.schema)
+                summary_writer.write_table(summary)
+                hashes = batch_hashes(batch)
+                if hashes_writer is None:
+                    hashes_writer = pq.ParquetWriter(os.path.join(path, HASHES_FILE), hashes.schema)
+                hashes_writer.write_table(hashes)
+    finally:
+        for writer in (summary_writer, hashes_writer):
+            if writer is not None:
+                writer.close()
+    if instrumentation.active():
+        with instrumentation.stage('write_results') as record:
+            record.add(bytes_written=sum(os.path.getsize(os.path.join(directory, name))
+                                         for directory, _, names in os.walk(path) for name in names))
+
+def _filter(inputs, scenarios):
+    expression = None
+    if inputs is not None:
+        expression = ds.field('Input Set').isin(list(inputs))
+    if scenarios is not None:
+        scenario_filter = ds.field('Scenario').isin(list(scenarios))
+        expression = scenario_filter if expression is None else expression & scenario_filter
+    return expression
+
+def open_results(path):
+    partitioning = ds.partitioning(pa.schema([('Scenario', pa.string())]), flavor='hive')
+    return ds.dataset(os.path.join(path, RESULTS_DIRECTORY), format='parquet', partitioning=partitioning,
+                      filesystem=pa.fs.LocalFileSystem(use_mmap=True))
+
+# Reads yearly rows for the given Input Set numbers and scenario names only. Files are memory-mapped,
+# and scenario partitions plus row-group statistics on Input Set let Arrow skip what is not needed.
+def load_results(path, inputs=None, scenarios=None, columns=None):
+    return open_results(path).to_table(columns=columns, filter=_filter(inputs, scenarios)).to_pandas()
+
+def load_summary(path, inputs=None, scenarios=None):
+    summary = ds.dataset(os.path.join(path, SUMMARY_FILE), format='parquet', filesystem=pa.fs.LocalFileSystem(use_mmap=True))
+    return summary.to_table(filter=_filter(inputs, scenarios)).to_pandas()
+
+# None for stores written before hashes were kept, or by a writer that does not keep them
+def load_hashes(path):
+    if not os.path.exists(os.path.join(path, HASHES_FILE)):
+        return None
+    hashes = ds.dataset(os.path.join(path, HASHES_FILE), format='parquet', filesystem=pa.fs.LocalFileSystem(use_mmap=True))
+    return hashes.to_table().to_pandas()
+
+def load_inputs(path):
+    return pq.read_table(os.path.join(path, INPUTS_FILE), memory_map=True).to_pandas()
@@ -0,0 +1,182 @@
+import argparse
+import sys
+import time
+import SolarFinancialModelFunctions as sfm
+
+# Headless runner for servers and cron:
+#   python run_batch.py solar_financial_model_inputs.xlsx results.xlsx --format xlsx-long --workers 8
+# Progress goes to stderr. Exit codes: 0 success, 1 run failure, 2 invalid input or arguments.
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_INVALID_INPUT = 2
+
+OUTPUT_FORMATS = ['xlsx', 'xlsx-long', 'parquet']
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+# "1,3,5-8" -> {1, 3, 5, 6, 7, 8}, numbered like the Input_{n} result keys
+def parse_input_sets(text):
+    input_sets = set()
+    try:
+        for part in text.split(','):
+            first, _, last = part.strip().partition('-')
+            input_sets.update(range(int(first), int(last or first) + 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid input set list '{text}', expected e.g. 1,3,5-8")
+    return input_sets
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Run the solar financial model without the GUI.')
+    parser.add_argument('input', help='input workbook with Input Details and Scenarios sheets')
+    parser.add_argument('output', help='output workbook (xlsx formats) or directory (parquet)')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='xlsx',
+                        help='xlsx: one sheet per input/scenario, xlsx-long: a single Results sheet, parquet: columnar result store')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes for the model engine (default 1)')
+    parser.add_argument('--chunk-size', type=int, default=64, help='Input Details rows per engine chunk (default 64)')
+    parser.add_argument('--inputs', type=parse_input_sets, help='only run these input sets, e.g. 1,3,5-8')
+    parser.add_argument('--cache', metavar='DIR', help='reuse results of unchanged input/scenario pairs from this cache directory')
+    parser.add_argument('--cache-size-mb', type=int, default=1024, help='cache size limit before old entries are evicted (default 1024)')
+    parser.add_argument('--sidecar', action='store_true', help='keep a parsed copy of the input workbook next to it for faster reruns')
+    parser.add_argument('--scenarios', nargs='+', metavar='NAME', help='only run these scenario names')
+    parser.add_argument('--stream', type=int, metavar='ROWS',
+                        help='read the input (.xlsx, .csv or .parquet) ROWS rows at a time; parquet output only')
+    parser.add_argument('--scenario-file', help='Scenarios table for --stream when the input is not a workbook')
+    parser.add_argument('--resume', action='store_true', help='with --stream or --job, continue an interrupted run from its last chunk or shard')
+    parser.add_argument('--job', metavar='DIR', help='run in resumable shards kept in this job directory, then merge them into the output')
+    parser.add_argument('--profile', metavar='PREFIX', help='record stage timings into PREFIX.json and a Chrome trace into PREFIX.trace.json')
+    return parser
+
+def select_rows(input_data, scenario_input_data, input_sets=None, scenario_names=None):
+    problems = []
+    if input_sets is not None:
+        available = set(input_data.index + 1)
+        missing = sorted(input_sets - available)
+        if missing:
+            problems.append(f"input sets not found in 'Input Details': {', '.join(map(str, missing))}")
+        input_data = input_data[(input_data.index + 1).isin(input_sets)]
+    if scenario_names is not None:
+        # Names are compared as text, as result keys show them: Excel gives names like 2030 as numbers
+        scenario_names = [str(name) for name in scenario_names]
+        sheet_names = scenario_input_data['Scenario Name'].astype(str)
+        missing = [name for name in scenario_names if name not in set(sheet_names)]
+        if missing:
+            problems.append(f"scenarios not found in 'Scenarios': {', '.join(missing)}")
+        scenario_input_data = scenario_input_data[sheet_names.isin(scenario_names).to_numpy()]
+    if problems:
+        raise sfm.InputValidationError(problems)
+    return input_data, scenario_input_data
+
+def report_progress(batches, total_pairs, started):
+    done_pairs = 0
+    for batch in batches:
+        yield batch
+        done_pairs += len(batch.input_data) * len(batch.scenario_names)
+        elapsed = time.perf_counter() - started
+        log(f'model: {done_pairs}/{total_pairs} scenarios ({done_pairs / elapsed if elapsed else 0:,.0f} scenarios/s)')
+
+def run_stream(args):
+    import stream_pipeline
+    started = time.perf_counter()
+    report = lambda done_rows: log(f'stream: {done_rows} input rows done in {time.perf_counter() - started:.2f}s')
+    try:
+        done_rows = stream_pipeline.run_streaming(args.input, args.output, args.scenario_file, args.stream,
+                                                  args.chunk_size, resume=args.resume, progress=report)
+    except sfm.InputValidationError as error:
+        log(str(error))
+        return EXIT_INVALID_INPUT
+    except Exception as error:
+        log(f'error: {error}')
+        return EXIT_FAILURE
+    log(f'done: {done_rows} input rows written to {args.output} in {time.perf_counter() - started:.2f}s')
+    return EXIT_OK
+
+def run_job(args, input_data, scenario_input_data):
+    import job_runner
+    started = time.perf_counter()
+    report = lambda done, total: log(f'job: {done}/{total} shards done in {time.perf_counter() - started:.2f}s')
+    status = job_runner.job_status(args.job)
+    if status['done']:
+        log(f"job: resuming with {status['done']}/{status['total']} shards already done")
+    job_runner.run_job(args.job, input_data, scenario_input_data, shard_size=args.chunk_size,
+                       restart=not args.resume, progress=report)
+    job_runner.merge_job(args.job, args.output)
+    log(f'done: job merged into {args.output} in {time.perf_counter() - started:.2f}s')
+    return EXIT_OK
+
+def run(parser, args):
+    if args.cache and args.workers > 1:
+        parser.error('--cache is only supported with --workers 1')
+    if args.stream:
+        if args.format != 'parquet':
+            parser.error('--stream is only supported with --format parquet')
+        if args.inputs or args.scenarios or args.cache or args.workers > 1:
+            parser.error('--stream cannot be combined with --inputs, --scenarios, --cache or --workers')
+        return run_stream(args)
+    if args.job:
+        if args.format == 'xlsx-long' or args.cache or args.workers > 1:
+            parser.error('--job cannot be combined with --format xlsx-long, --cache or --workers')
+        if (args.format == 'parquet') == str(args.output).lower().endswith('.xlsx'):
+            parser.error('--job writes a .xlsx output for --format xlsx and a directory for --format parquet')
+    cache = None
+    try:
+        started = time.perf_counter()
+        input_data, scenario_input_data = sfm.load_input_file(args.input, sidecar=args.sidecar)
+        log(f'load: {len(input_data)} input sets, {len(scenario_input_data)} scenarios in {time.perf_counter() - started:.2f}s')
+
+        input_data, scenario_input_data = select_rows(input_data, scenario_input_data, args.inputs, args.scenarios)
+        if args.job:
+            return run_job(args, input_data, scenario_input_data)
+        total_pairs = len(input_data) * len(sfm.parse_scenarios(scenario_input_data)['names'])
+
+        started = time.perf_counter()
+        if args.workers > 1:
+            import parallel_model
+            batches = parallel_model.iter_model_parallel(input_data, scenario_input_data, args.workers, args.chunk_size)
+        else:
+            if args.cache:
+                import result_cache
+                cache = result_cache.ResultCache(args.cache, args.cache_size_mb * 1024 ** 2)
+            batches = sfm.iter_model(input_data, scenario_input_data, args.chunk_size, cache=cache)
+        batches = report_progress(batches, total_pairs, started)
+
+        if args.format == 'parquet':
+            import result_store
+            result_store.write_results(input_data, scenario_input_data, args.output, batches=batches)
+        else:
+            import excel_export
+            layout = 'long' if args.format == 'xlsx-long' else 'sheets'
+            excel_export.export_results(input_data, scenario_input_data, args.output, layout=layout, batches=batches)
+
+        elapsed = time.perf_counter() - started
+        log(f'done: {total_pairs} scenarios written to {args.output} in {elapsed:.2f}s '
+            f'({total_pairs / elapsed if elapsed else 0:,.0f} scenarios/s)')
+        if cache is not None:
+            report = cache.report()
+            log(f"cache: {report['hits']} hits, {report['misses']} misses, {report['evictions']} evictions")
+    except sfm.InputValidationError as error:
+        log(str(error))
+        return EXIT_INVALID_INPUT
+    except Exception as error:
+        log(f'error: {error}')
+        return EXIT_FAILURE
+    finally:
+        if cache is not None:
+            cache.close()
+    return EXIT_OK
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.profile:
+        return run(parser, args)
+    import instrumentation
+    with instrumentation.profiling() as profile:
+        status = run(parser, args)
+    profile.write_report(f'{args.profile}.json')
+    profile.write_chrome_trace(f'{args.profile}.trace.json')
+    log(f'profile: stage report in {args.profile}.json, Chrome trace in {args.profile}.trace.json')
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import itertools
+import numpy as np
+import numpy.lib.recfunctions as rfn
+import pandas as pd
+import SolarFinancialModelFunctions as sfm
+
+SENSITIVITY_PARAMETERS = [name for name, _, _, _ in sfm.PARAMETER_FIELDS]
+PARAMETER_COLUMNS = {name: column for name, column, _, _ in sfm.PARAMETER_FIELDS}
+PARAMETER_SCALES = {name: scale for name, _, _, scale in sfm.PARAMETER_FIELDS}
+# The parameters the PV generation and energy balance depend on; variants that agree on these share it
+PV_PARAMETERS = ['capacity_kWp', 'specific_yield', 'performance_drop', 'energy_export_allowed']
+MINIMUM_VALUES = {
+    'years_projection': 1,
+    'tariff_hike_interval': 1,
+    'buyback_hike_interval': 1,
+    'opex_hike_interval': 1,
+    'opex_start_year': 0,
+    'performance_drop': 0,
+}
+MAX_FACTORIAL_PARAMETERS = 8
+
+# Low and high values of one parameter for a ±delta perturbation. Whole-number parameters move by at
+# least one year, and Energy Export Allowed is switched off and on.
+def perturbed_values(values, name, delta):
+    if values.dtype == np.bool_:
+        return np.zeros_like(values), np.ones_like(values)
+    if values.dtype.kind == 'i':
+        step = np.maximum(1, np.round(np.abs(values) * delta)).astype(values.dtype)
+        return np.maximum(values - step, MINIMUM_VALUES.get(name, 0)), values + step
+    low = np.maximum(values * (1 - delta), MINIMUM_VALUES.get(name, -np.inf))
+    high = values * (1 + delta)
+    if name == 'performance_drop':
+        high = np.minimum(high, 1)
+    return low, high
+
+# Runs the engine once over every variant row against all scenarios and returns PAIR_METRICS arrays of
+# shape (variant, scenario). The consumption matrix is built once for all variants, and the energy
+# balance is only computed for distinct PV set-ups: variants that change tariffs, costs or escalation
+# reuse the PV generation and self-consumption of the row they were derived from.
+def evaluate_variants(variants, change_table):
+    n_years = int(variants['years_projection'].max())
+    annual_consumptions = sfm.consumption_matrix(change_table, n_years)
+
+    pv_setups, setup_of_variant = np.unique(rfn.repack_fields(variants[PV_PARAMETERS]), return_inverse=True)
+    _, pv_generations = sfm.pv_generation_paths(pv_setups, n_years)
+    consumed, exported = sfm.energy_balance(pv_generations[:, None, :], annual_consumptions,
+                                            pv_setups['energy_export_allowed'][:, None, None])
+    energy = consumed[setup_of_variant], exported[setup_of_variant]
+
+    flows = sfm.compute_cash_flows(variants, annual_consumptions, energy=energy)
+    metrics = sfm.pair_metrics(variants, flows)
+    return {name: values.reshape(len(variants), -1) for name, values in metrics.items()}
+
+# Base rows followed by a low and a high block per parameter, every block in input row order
+def one_at_a_time_variants(params, names, delta):
+    blocks = [params]
+    for name in names:
+        for values in perturbed_values(params[name], name, delta):
+            block = params.copy()
+            block[name] = values
+            blocks.append(block)
+    return np.concatenate(blocks)
+
+def _sheet_values(values, name):
+    return values.astype(float) * PARAMETER_SCALES[name]
+
+def _tornado_rows(chunk, params, names, scenario_names, variants, metrics):
+    n_inputs, n_scenarios, n_parameters = len(chunk), len(scenario_names), len(names)
+    metric_names = list(sfm.PAIR_METRIC_LABELS)
+    shape = (n_inputs, n_scenarios, len(metric_names), n_parameters)
+
+    # metric values as (input, scenario, metric, parameter); the variant blocks are (1 + 2 * parameter, input)
+    stacked = np.stack([metrics[name] * sfm.PAIR_METRIC_SCALE[name] for name in metric_names])
+    stacked = stacked.reshape(len(metric_names), 1 + 2 * n_parameters, n_inputs, n_scenarios)
+    base = np.broadcast_to(stacked[:, 0].transpose(1, 2, 0)[..., None], shape)
+    low = stacked[:, 1::2].transpose(2, 3, 0, 1)
+    high = stacked[:, 2::2].transpose(2, 3, 0, 1)
+    swing = np.abs(high - low)
+    order = np.argsort(-np.where(np.isnan(swing), -np.inf, swing), axis=-1, kind='stable')
+    ranked = lambda values: np.take_along_axis(np.broadcast_to(values, shape), order, axis=-1).ravel()
+
+    variant_blocks = variants.reshape(1 + 2 * n_parameters, n_inputs)
+    input_values = lambda block: np.stack([_sheet_values(variant_blocks[block + 2 * position][name], name)
+                                           for position, name in enumerate(names)], axis=-1)[:, None, None, :]
+    return pd.DataFrame({
+        'Input Set': ranked((chunk.index.to_numpy() + 1)[:, None, None, None]),
+        'Scenario': ranked(np.asarray(scenario_names, dtype=object)[None, :, None, None]),
+        'Metric': ranked(np.asarray([sfm.PAIR_METRIC_LABELS[name] for name in metric_names], dtype=object)[None, None, :, None]),
+        'Parameter': ranked(np.asarray([PARAMETER_COLUMNS[name] for name in names], dtype=object)),
+        'Rank': np.tile(np.arange(1, n_parameters + 1), n_inputs * n_scenarios * len(metric_names)),
+        'Low Input': ranked(input_values(1)),
+        'Base Input': ranked(np.stack([_sheet_values(params[name], name) for name in names], axis=-1)[:, None, None, :]),
+        'High Input': ranked(input_values(2)),
+        'Base': ranked(base),
+        'Low': ranked(low),
+        'High': ranked(high),
+        'Low Delta': ranked(low - base),
+        'High Delta': ranked(high - base),
+        'Swing': ranked(swing),
+    })
+
+# Tornado table: for every input row, scenario and metric, the change in IRR and payback when each
+# parameter alone moves by ±delta (relative), ranked by swing. All perturbations of a chunk of input
+# rows go through the engine in one pass.
+def tornado_table(input_data, scenario_input_data, parameters=None, delta=0.1, chunk_size=64):
+    names = list(parameters or SENSITIVITY_PARAMETERS)
+    change_table = sfm.parse_scenarios(scenario_input_data)
+    frames = []
+    for start in range(0, len(input_data), chunk_size):
+        chunk = input_data.iloc[start:start + chunk_size]
+        params = sfm.input_parameters(chunk)
+        variants = one_at_a_time_variants(params, names, delta)
+        metrics = evaluate_variants(variants, change_table)
+        frames.append(_tornado_rows(chunk, params, names, change_table['names'], variants, metrics))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+# Full-factorial grid over low, base and high values of a few parameters: 3 ** len(parameters) variants
+# per input row, one output row per variant and scenario with the inputs used and the resulting metrics.
+def factorial_table(input_data, scenario_input_data, parameters, delta=0.1, chunk_size=16):
+    names = list(parameters)
+    if len(names) > MAX_FACTORIAL_PARAMETERS:
+        raise ValueError(f'a full-factorial grid supports at most {MAX_FACTORIAL_PARAMETERS} parameters, got {len(names)}')
+    change_table = sfm.parse_scenarios(scenario_input_data)
+    scenario_names = change_table['names']
+    frames = []
+    for start in range(0, len(input_data), chunk_size):
+        chunk = input_data.iloc[start:start + chunk_size]
+        params = sfm.input_parameters(chunk)
+        levels = {name: (low, params[name], high) for name, (low, high) in
+                  ((name, perturbed_values(params[name], name, delta)) for name in names)}
+        blocks = []
+        for combination in itertools.product(range(3), repeat=len(names)):
+            block = params.copy()
+            for name, level in zip(names, combination):
+                block[name] = levels[name][level]
+            blocks.append(block)
+        variants = np.concatenate(blocks)
+        metrics = evaluate_variants(variants, change_table)
+
+        n_variants = len(variants)
+        table = {
+            'Input Set': np.repeat(np.tile(chunk.index.to_numpy() + 1, len(blocks)), len(scenario_names)),
+            'Scenario': np.tile(np.asarray(scenario_names, dtype=object), n_variants),
+        }
+        for name in names:
+            table[PARAMETER_COLUMNS[name]] = np.repeat(_sheet_values(variants[name], name), len(scenario_names))
+        for name, label in sfm.PAIR_METRIC_LABELS.items():
+            table[label] = metrics[name].ravel() * sfm.PAIR_METRIC_SCALE[name]
+        frames.append(pd.DataFrame(table).sort_values('Input Set', kind='stable'))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
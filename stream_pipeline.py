@@ -0,0 +1,158 @@
+import json
+import os
+import shutil
+import numpy as np
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import SolarFinancialModelFunctions as sfm
+import result_store
+
+CHECKPOINT_FILE = 'checkpoint.json'
+
+def _file_format(path):
+    extension = os.path.splitext(str(path))[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        return 'xlsx'
+    if extension in ('.parquet', '.pq'):
+        return 'parquet'
+    if extension == '.csv':
+        return 'csv'
+    raise ValueError(f"unsupported input file '{path}', expected .xlsx, .csv or .parquet")
+
+# Each reader yields DataFrames of at most chunk_size rows whose index is the row position in the whole
+# table, so Input Set numbers and validation row numbers match a full load. start skips that many rows.
+def _csv_chunks(path, chunk_size, start):
+    reader = pd.read_csv(path, chunksize=chunk_size, skiprows=range(1, start + 1))
+    for chunk in reader:
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        start += len(chunk)
+        yield chunk
+
+def _parquet_chunks(path, chunk_size, start):
+    parquet_file = pq.ParquetFile(path)
+    row_group_starts = np.cumsum([0] + [parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)])
+    first_group = max(int(np.searchsorted(row_group_starts, start, side='right')) - 1, 0)
+    skip = start - int(row_group_starts[first_group])
+    position = start
+    pending = None
+    for record_batch in parquet_file.iter_batches(batch_size=chunk_size, row_groups=range(first_group, parquet_file.num_row_groups)):
+        if skip:
+            dropped = min(skip, record_batch.num_rows)
+            record_batch, skip = record_batch.slice(dropped), skip - dropped
+        pending = record_batch if pending is None else pa.concat_batches([pending, record_batch])
+        while pending.num_rows >= chunk_size:
+            chunk = pending.slice(0, chunk_size).to_pandas()
+            chunk.index = pd.RangeIndex(position, position + len(chunk))
+            position += len(chunk)
+            pending = pending.slice(chunk_size)
+            yield chunk
+    if pending is not None and pending.num_rows:
+        chunk = pending.to_pandas()
+        chunk.index = pd.RangeIndex(position, position + len(chunk))
+        yield chunk
+
+# Blank rows are skipped but still counted, so positions stay those of the sheet
+def _xlsx_chunks(path, chunk_size, start, sheet='Input Details'):
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        header = list(next(workbook[sheet].iter_rows(values_only=True)))
+        rows, positions = [], []
+        for position, row in enumerate(workbook[sheet].iter_rows(min_row=start + 2, values_only=True), start=start):
+            if all(value is None for value in row):
+                continue
+            rows.append(row)
+            positions.append(position)
+            if len(rows) == chunk_size:
+                yield pd.DataFrame(rows, columns=header, index=positions)
+                rows, positions = [], []
+        if rows:
+            yield pd.DataFrame(rows, columns=header, index=positions)
+    finally:
+        workbook.close()
+
+def read_input_chunks(path, chunk_size=10000, start=0):
+    readers = {'csv': _csv_chunks, 'parquet': _parquet_chunks, 'xlsx': _xlsx_chunks}
+    return readers[_file_format(path)](path, chunk_size, start)
+
+# The Scenarios table is small and read in full: from the 'Scenarios' sheet of a workbook, or from a
+# CSV or Parquet file
+def read_scenarios(path):
+    file_format = _file_format(path)
+    if file_format == 'xlsx':
+        return pd.read_excel(path, sheet_name='Scenarios')
+    if file_format == 'csv':
+        return pd.read_csv(path)
+    return pd.read_parquet(path)
+
+def _input_signature(input_path, scenario_path, chunk_size):
+    signature = {'chunk_size': chunk_size}
+    for key, path in (('input', input_path), ('scenarios', scenario_path)):
+        stat = os.stat(path)
+        signature[key] = {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    return signature
+
+def read_checkpoint(output_path):
+    try:
+        with open(os.path.join(output_path, CHECKPOINT_FILE)) as checkpoint_file:
+            return json.load(checkpoint_file)
+    except (OSError, ValueError):
+        return None
+
+def _write_checkpoint(output_path, checkpoint):
+    temporary_path = os.path.join(output_path, CHECKPOINT_FILE + '.tmp')
+    with open(temporary_path, 'w') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.replace(temporary_path, os.path.join(output_path, CHECKPOINT_FILE))
+
+# Out-of-core run into a result_store directory: Input Details rows are read chunk_size at a time from
+# .xlsx (read-only), .csv or .parquet, validated, run through the engine and written out before the
+# next chunk is read. summary.parquet, inputs.parquet and hashes.parquet become directories with one
+# part per chunk, which result_store.load_summary / load_inputs / load_hashes read like the single files.
+# After every chunk the next row offset is saved in checkpoint.json; with resume=True a run over the
+# same, unchanged input files continues from there instead of starting over.
+def run_streaming(input_path, output_path, scenario_path=None, chunk_size=10000, engine_chunk_size=256,
+                  resume=False, progress=None):
+    scenario_path = scenario_path or input_path
+    scenario_input_data = read_scenarios(scenario_path)
+    signature = _input_signature(input_path, scenario_path, chunk_size)
+
+    checkpoint = read_checkpoint(output_path) if resume else None
+    if checkpoint is None or checkpoint['signature'] != signature:
+        if os.path.isdir(output_path):
+            for name in (result_store.RESULTS_DIRECTORY, result_store.SUMMARY_FILE, result_store.INPUTS_FILE, result_store.HASHES_FILE,
+                         CHECKPOINT_FILE):
+                target = os.path.join(output_path, name)
+                if os.path.isdir(target):
+                    shutil.rmtree(target)
+                elif os.path.exists(target):
+                    os.remove(target)
+        checkpoint = {'signature': signature, 'next_row': 0}
+    for name in (result_store.RESULTS_DIRECTORY, result_store.SUMMARY_FILE, result_store.INPUTS_FILE, result_store.HASHES_FILE):
+        os.makedirs(os.path.join(output_path, name), exist_ok=True)
+
+    results_path = os.path.join(output_path, result_store.RESULTS_DIRECTORY)
+    for chunk in read_input_chunks(input_path, chunk_size, checkpoint['next_row']):
+        if not len(chunk):
+            continue
+        sfm.validate_inputs(chunk, scenario_input_data)
+        offset = int(chunk.index[0])
+        summaries = []
+        hashes = []
+        for engine_chunk, batch in enumerate(sfm.iter_model(chunk, scenario_input_data, engine_chunk_size)):
+            result_store.write_batch(results_path, batch, f'part-{offset:012d}-{engine_chunk}')
+            summaries.append(batch.summary)
+            hashes.append(result_store.batch_hashes(batch))
+        part_file = f'part-{offset:012d}.parquet'
+        pq.write_table(result_store.summary_record_batch(pd.concat(summaries, ignore_index=True)),
+                       os.path.join(output_path, result_store.SUMMARY_FILE, part_file))
+        pq.write_table(pa.concat_tables(hashes), os.path.join(output_path, result_store.HASHES_FILE, part_file))
+        pq.write_table(result_store.inputs_table(chunk),
+                       os.path.join(output_path, result_store.INPUTS_FILE, part_file))
+
+        checkpoint['next_row'] = int(chunk.index[-1]) + 1
+        _write_checkpoint(output_path, checkpoint)
+        if progress is not None:
+            progress(checkpoint['next_row'])
+    return checkpoint['next_row']
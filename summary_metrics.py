@@ -0,0 +1,140 @@
+import numpy as np
+
+# IRR is searched in x = 1 / (1 + rate), where NPV is a polynomial in x (the same form numpy_financial
+# solves with np.roots). The grid spans rates from -99.9% to +99900%.
+IRR_SEARCH_GRID = np.geomspace(1e-3, 1e3, 193)
+
+def npv(cash_flows, rates):
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=float))
+    rates = np.atleast_1d(np.asarray(rates, dtype=float))
+    periods = np.arange(cash_flows.shape[1])
+    discount_factors = (1 + rates[None, :]) ** -periods[:, None]
+    return cash_flows @ discount_factors
+
+def _polynomial_and_slope(cash_flows, x):
+    value = np.zeros(len(x))
+    slope = np.zeros(len(x))
+    for column in cash_flows.T[::-1]:
+        slope = slope * x + value
+        value = value * x + column
+    return value, slope
+
+# Number of sign changes along each row, zero flows skipped
+def _sign_changes(cash_flows):
+    signs = np.sign(cash_flows)
+    columns = np.arange(signs.shape[1])
+    last_nonzero = np.maximum.accumulate(np.where(signs != 0, columns, 0), axis=1)
+    signs = np.take_along_axis(signs, last_nonzero, axis=1)
+    return (signs[:, 1:] * signs[:, :-1] < 0).sum(axis=1)
+
+# Bracket the root on IRR_SEARCH_GRID, then refine every row at once with Newton steps that fall back
+# to bisection whenever a step leaves the bracket. Rows drop out of the iteration as soon as they
+# converge. Rows without a sign change on the grid come back as NaN.
+def _bracketed_irr(cash_flows, tol, max_iter):
+    n_rows = len(cash_flows)
+    periods = np.arange(cash_flows.shape[1])
+    with np.errstate(over='ignore', invalid='ignore'):
+        grid_values = cash_flows @ (IRR_SEARCH_GRID[None, :] ** periods[:, None])
+
+    grid_signs = np.sign(grid_values)
+    sign_change = grid_signs[:, :-1] * grid_signs[:, 1:] <= 0
+    bracket = sign_change.argmax(axis=1)
+    found = sign_change[np.arange(n_rows), bracket]
+
+    lower = IRR_SEARCH_GRID[bracket]
+    upper = IRR_SEARCH_GRID[bracket + 1]
+    lower_value = grid_values[np.arange(n_rows), bracket]
+    x = np.where(lower_value == 0, lower, 0.5 * (lower + upper))
+    active = found & (lower_value != 0)
+
+    for _ in range(max_iter):
+        rows = np.flatnonzero(active)
+        if not rows.size:
+            break
+        x_rows = x[rows]
+        value, slope = _polynomial_and_slope(cash_flows[rows], x_rows)
+
+        keeps_lower_sign = np.sign(value) == np.sign(lower_value[rows])
+        lower[rows] = np.where(keeps_lower_sign, x_rows, lower[rows])
+        lower_value[rows] = np.where(keeps_lower_sign, value, lower_value[rows])
+        upper[rows] = np.where(keeps_lower_sign, upper[rows], x_rows)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = x_rows - value / slope
+        in_bracket = (newton > lower[rows]) & (newton < upper[rows])
+        x_next = np.where(in_bracket, newton, 0.5 * (lower[rows] + upper[rows]))
+
+        converged = (value == 0) | (np.abs(x_next - x_rows) <= tol * x_next)
+        x[rows] = np.where(value == 0, x_rows, x_next)
+        active[rows[converged]] = False
+
+    return np.where(found, 1 / x - 1, np.nan)
+
+# np.roots for many rows at once: the eigenvalues of each row's companion matrix, for rows grouped by
+# the span from their first to their last non-zero flow (zero flows outside it only add roots at x = 0).
+# As in npf.irr, the real positive roots are kept and the rate closest to 0% is returned.
+def _companion_irr(cash_flows):
+    rates = np.full(len(cash_flows), np.nan)
+    nonzero = cash_flows != 0
+    first = nonzero.argmax(axis=1)
+    last = cash_flows.shape[1] - 1 - nonzero[:, ::-1].argmax(axis=1)
+    for first_flow, last_flow in set(zip(first.tolist(), last.tolist())):
+        degree = last_flow - first_flow
+        if degree < 1:
+            continue
+        rows = np.flatnonzero((first == first_flow) & (last == last_flow))
+        coefficients = cash_flows[rows, first_flow:last_flow + 1][:, ::-1]
+        companion = np.zeros((len(rows), degree, degree))
+        companion[:, 0, :] = -coefficients[:, 1:] / coefficients[:, :1]
+        companion[:, np.arange(1, degree), np.arange(degree - 1)] = 1
+        roots = np.linalg.eigvals(companion)
+
+        real = (roots.imag == 0) & (roots.real > 0)
+        with np.errstate(divide='ignore'):
+            root_rates = np.where(real, 1 / np.where(real, roots.real, 1) - 1, np.nan)
+        closest = np.where(real, np.abs(root_rates), np.inf).argmin(axis=1)
+        rates[rows] = root_rates[np.arange(len(rows)), closest]
+    return rates
+
+# One IRR per row, the one npf.irr returns: of all real positive roots x of NPV, the rate closest to 0%.
+# Rows whose flows change sign once (investment, then income) have exactly one root by Descartes' rule
+# of signs, found by _bracketed_irr. Rows with several sign changes, such as a mid-life capex or
+# negative late years, and rows whose root lies off the grid are solved like np.roots. Rows without a
+# sign change, all-zero rows included, have no IRR and come back as NaN with found=False.
+def irr(cash_flows, tol=1e-12, max_iter=100):
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=float))
+    rates = np.full(len(cash_flows), np.nan)
+    sign_changes = _sign_changes(cash_flows)
+    single = np.flatnonzero(sign_changes == 1)
+    rates[single] = _bracketed_irr(cash_flows[single], tol, max_iter)
+    several = np.flatnonzero((sign_changes > 1) | ((sign_changes == 1) & np.isnan(rates)))
+    rates[several] = _companion_irr(cash_flows[several])
+    return rates, ~np.isnan(rates)
+
+# Interpolated payback as in the reference script: the first year whose cumulative cash flow is
+# non-negative, plus the fraction of that year needed to close the previous year's deficit.
+# Rows that never pay back are NaN.
+def payback_period(cumulative_cash_flows, initial_investment):
+    cumulative = np.atleast_2d(np.asarray(cumulative_cash_flows, dtype=float))
+    rows = np.arange(len(cumulative))
+    reached = cumulative >= 0
+    achieved = reached.any(axis=1)
+    year = reached.argmax(axis=1)
+
+    current = cumulative[rows, year]
+    previous = np.where(year > 0, cumulative[rows, np.maximum(year - 1, 0)], -np.asarray(initial_investment, dtype=float))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        payback = year + np.abs(previous) / (current - previous)
+    return np.where(achieved, payback, np.nan)
+
+def cash_flow_metrics(cash_flows, initial_investment, discount_rates=()):
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=float))
+    rates, found = irr(cash_flows)
+    metrics = {
+        'irr': rates,
+        'irr_found': found,
+        'payback': payback_period(np.cumsum(cash_flows, axis=1), initial_investment),
+    }
+    if len(discount_rates):
+        metrics['npv'] = npv(cash_flows, discount_rates)
+    return metrics
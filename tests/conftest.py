@@ -0,0 +1,12 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark
+
+# Small Input Details and Scenarios tables that pass validate_inputs, with padded years and missing changes
+@pytest.fixture
+def sheets():
+    return benchmark.synthetic_inputs(12, 3, 2, 20, seed=4)
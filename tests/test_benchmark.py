@@ -0,0 +1,38 @@
+import copy
+import json
+import SolarFinancialModelFunctions as sfm
+import benchmark
+
+def report(seconds, peak_mb):
+    stages = {'engine': {'seconds': seconds, 'peak_mb': peak_mb}, 'load': {'seconds': 0.5, 'peak_mb': 10.0}}
+    return {'workloads': {'small': {'workload': {'rows': 10}, 'stages': stages}}}
+
+def test_compare_flags_only_changes_beyond_threshold_and_noise_floor():
+    baseline = report(1.0, 100.0)
+    rows = benchmark.compare_reports(baseline, report(1.05, 130.0), threshold=0.1)
+    regressed = {(row['stage'], row['measure']) for row in rows if row['regressed']}
+    assert regressed == {('engine', 'peak_mb')}
+    # A large relative change below the noise floor is not a regression
+    assert not any(row['regressed'] for row in benchmark.compare_reports(report(0.001, 0.1), report(0.003, 0.5)))
+    resized = copy.deepcopy(baseline)
+    resized['workloads']['small']['workload'] = {'rows': 20}
+    assert benchmark.compare_reports(resized, report(5.0, 500.0)) == []
+
+def test_run_writes_a_report_that_compares_clean_against_itself(tmp_path):
+    path = tmp_path / 'report.json'
+    arguments = ['--rows', '6', '--scenarios', '2', '--changes', '1', '--years', '8']
+    assert benchmark.main(['run', *arguments, '--repeat', '1', '--output', str(path)]) == benchmark.EXIT_OK
+    stages = json.loads(path.read_text())['workloads']['custom']['stages']
+    assert list(stages) == benchmark.STAGES
+    assert all(values['seconds'] >= 0 and values['peak_mb'] >= 0 for values in stages.values())
+    assert benchmark.main(['compare', str(path), str(path)]) == benchmark.EXIT_OK
+
+    slower = json.loads(path.read_text())
+    slower['workloads']['custom']['stages']['engine']['seconds'] += 1.0
+    (tmp_path / 'slower.json').write_text(json.dumps(slower))
+    assert benchmark.main(['compare', str(path), str(tmp_path / 'slower.json')]) == benchmark.EXIT_REGRESSION
+
+def test_synthetic_inputs_are_valid_and_every_engine_matches_the_loop():
+    for seed in range(3):
+        sfm.validate_inputs(*benchmark.synthetic_inputs(8, 3, 4, 15, seed=seed))
+    assert benchmark.check_engines({'rows': 9, 'scenarios': 3, 'changes': 2, 'years': 12}, seeds=(0,)) == 0
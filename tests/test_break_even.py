@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+import SolarFinancialModelFunctions as sfm
+import break_even
+
+def rerun(input_data, scenario_input_data, row):
+    edited = input_data.copy()
+    edited[row['Parameter']] = edited[row['Parameter']].astype(float)
+    edited.loc[row['Input Set'] - 1, row['Parameter']] = row['Break-even Value']
+    summary = sfm.run_model(edited, scenario_input_data)['Summary']
+    return summary[(summary['Input Set'] == row['Input Set']) & (summary['Scenario'] == row['Scenario'])].iloc[0]
+
+@pytest.mark.parametrize('parameter', break_even.BREAK_EVEN_PARAMETERS)
+def test_break_even_values_hit_the_target_irr_in_run_model(sheets, parameter):
+    input_data, scenario_input_data = sheets
+    table = break_even.break_even(input_data, scenario_input_data, parameter=parameter, metric='irr_total', target=8.0)
+    assert len(table) == len(input_data) * len(scenario_input_data)
+    solved = table.dropna(subset=['Break-even Value'])
+    assert len(solved) > 0
+    if parameter == 'tnb_buyback_rate':
+        # Without export the buyback rate does not enter the cash flows
+        no_export = ~np.repeat(sfm.input_parameters(input_data)['energy_export_allowed'], len(scenario_input_data))
+        assert table['Break-even Value'][no_export].isna().all()
+    for row in solved.to_dict('records'):
+        assert rerun(input_data, scenario_input_data, row)['Overall IRR (%)'] == pytest.approx(8.0, abs=1e-6)
+
+def test_break_even_payback_matches_run_model(sheets):
+    input_data, scenario_input_data = sheets[0].iloc[:3], sheets[1]
+    table = break_even.break_even(input_data, scenario_input_data, parameter='electricity_tariff', metric='payback_total', target=6)
+    for row in table.dropna(subset=['Break-even Value']).to_dict('records'):
+        assert rerun(input_data, scenario_input_data, row)['Overall Payback Period (years)'] == pytest.approx(6, abs=1e-6)
+
+def test_bad_arguments_are_rejected(sheets):
+    with pytest.raises(ValueError):
+        break_even.break_even(*sheets, parameter='opex')
+    with pytest.raises(ValueError):
+        break_even.break_even(*sheets, metric='npv')
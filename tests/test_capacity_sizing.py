@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+import SolarFinancialModelFunctions as sfm
+import capacity_sizing
+import summary_metrics
+
+def engine_flows(input_data, scenario_input_data, input_position, capacities):
+    params = np.repeat(sfm.input_parameters(input_data)[[input_position]], len(capacities))
+    params['capacity_kWp'] = capacities
+    change_table = sfm.parse_scenarios(scenario_input_data)
+    return params, sfm.compute_cash_flows(params, sfm.consumption_matrix(change_table, int(params['years_projection'].max())))
+
+def test_npv_optimum_beats_a_dense_scan_with_the_full_engine(sheets):
+    input_data, scenario_input_data = sheets[0].iloc[:3], sheets[1]
+    table = capacity_sizing.size_capacity(input_data, scenario_input_data, objective='npv', discount_rate=0.06)
+    assert len(table) == 3 * len(scenario_input_data)
+
+    for row in table.to_dict('records'):
+        scenario_position = sfm.parse_scenarios(scenario_input_data)['names'].index(row['Scenario'])
+        scan = np.linspace(row['Lower Bound (kWp)'], row['Upper Bound (kWp)'], 201)
+        _, flows = engine_flows(input_data, scenario_input_data, row['Input Set'] - 1, np.append(scan, row['Optimal Capacity (kWp)']))
+        values = summary_metrics.npv(flows['Annual Cash Flow (RM)'][:, scenario_position], [0.06])[:, 0]
+        assert values[-1] >= values[:-1].max() - 1e-6 * abs(values[:-1].max())
+        assert row['NPV (RM)'] == pytest.approx(values[-1], rel=1e-9)
+
+def test_reported_metrics_match_run_model_at_the_optimal_capacity(sheets):
+    input_data, scenario_input_data = sheets[0].iloc[:2], sheets[1]
+    table = capacity_sizing.size_capacity(input_data, scenario_input_data, objective='irr')
+    for row in table.to_dict('records'):
+        edited = input_data.copy()
+        edited['Capacity (kWp)'] = edited['Capacity (kWp)'].astype(float)
+        edited.loc[row['Input Set'] - 1, 'Capacity (kWp)'] = row['Optimal Capacity (kWp)']
+        summary = sfm.run_model(edited, scenario_input_data)['Summary']
+        expected = summary[(summary['Input Set'] == row['Input Set']) & (summary['Scenario'] == row['Scenario'])]
+        assert row['Overall IRR (%)'] == pytest.approx(expected['Overall IRR (%)'].iloc[0], rel=1e-9)
+        assert row['PV IRR (%)'] == pytest.approx(expected['PV IRR (%)'].iloc[0], rel=1e-9)
+
+def test_payback_objective_finds_the_largest_capacity_within_target(sheets):
+    input_data, scenario_input_data = sheets[0].iloc[:3], sheets[1]
+    table = capacity_sizing.size_capacity(input_data, scenario_input_data, objective='payback', target_payback=8)
+    names = sfm.parse_scenarios(scenario_input_data)['names']
+    for row in table.dropna(subset=['Optimal Capacity (kWp)']).to_dict('records'):
+        capacity = row['Optimal Capacity (kWp)']
+        trial = np.array([capacity, capacity * (1 + 1e-3)])
+        params, flows = engine_flows(input_data, scenario_input_data, row['Input Set'] - 1, trial)
+        cumulative = flows['Cumulative Cash Flow (RM)'][:, names.index(row['Scenario'])]
+        payback = summary_metrics.payback_period(cumulative, flows['Capital Expense (RM)'][:, 0, 0])
+        assert payback[0] <= 8
+        if trial[1] <= row['Upper Bound (kWp)']:
+            assert not payback[1] <= 8
+
+def test_bad_arguments_are_rejected(sheets):
+    with pytest.raises(ValueError):
+        capacity_sizing.size_capacity(*sheets, objective='roi')
+    with pytest.raises(ValueError):
+        capacity_sizing.size_capacity(*sheets, objective='payback')
@@ -0,0 +1,40 @@
+import numpy as np
+import numpy_financial as npf
+import pytest
+import SolarFinancialModelFunctions as sfm
+import benchmark
+from reference.loop_model import run_model_loop
+
+def test_run_model_matches_the_row_by_row_loop(sheets):
+    input_data, scenario_input_data = sheets
+    expected = run_model_loop(input_data, scenario_input_data)
+    assert benchmark._worst_difference(expected, sfm.run_model(input_data, scenario_input_data)) <= benchmark.CHECK_TOLERANCE
+
+def test_summary_irr_and_payback_follow_the_cash_flows(sheets):
+    input_data, scenario_input_data = sheets
+    summary = sfm.run_model(input_data, scenario_input_data)['Summary']
+    params = sfm.input_parameters(input_data)
+    change_table = sfm.parse_scenarios(scenario_input_data)
+    flows = sfm.compute_cash_flows(params, sfm.consumption_matrix(change_table, int(params['years_projection'].max())))
+
+    for row in summary.iloc[::5].to_dict('records'):
+        input_position = row['Input Set'] - 1
+        scenario_position = change_table['names'].index(row['Scenario'])
+        years = params['years_projection'][input_position]
+        cash_flows = flows['Annual Cash Flow (RM)'][input_position, scenario_position, :years]
+        assert row['Overall IRR (%)'] == pytest.approx(npf.irr(cash_flows) * 100, rel=1e-9, nan_ok=True)
+        cumulative = np.cumsum(cash_flows)
+        if (cumulative < 0).all():
+            assert row['Overall Payback Period (years)'] == 'Not achieved'
+        else:
+            assert row['Overall Payback Period (years)'] > 0
+
+def test_the_split_cash_flow_steps_compose_to_compute_cash_flows(sheets):
+    input_data, scenario_input_data = sheets
+    params = sfm.input_parameters(input_data)
+    consumptions = sfm.consumption_matrix(sfm.parse_scenarios(scenario_input_data), 20)
+    flows = sfm.compute_cash_flows(params, consumptions)
+    tariffs, buyback_rates, opex_values = sfm.escalation_paths(params, 20)
+    np.testing.assert_array_equal(flows['Electricity Tariff (RM/kWh)'][:, 0], tariffs)
+    np.testing.assert_array_equal(flows['OPEX (RM)'][:, 0], opex_values)
+    np.testing.assert_array_equal(flows['Capital Expense (RM)'][:, 0], sfm.investment_paths(params, 20)[2])
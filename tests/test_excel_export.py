@@ -0,0 +1,34 @@
+import numpy as np
+import openpyxl
+import pandas as pd
+import SolarFinancialModelFunctions as sfm
+import excel_export
+
+def test_sheet_layout_matches_save_results(sheets, tmp_path):
+    input_data, scenario_input_data = sheets
+    input_data, scenario_input_data = input_data.iloc[:4], scenario_input_data
+    sfm.save_results(sfm.run_model(input_data, scenario_input_data), tmp_path / 'saved.xlsx')
+    excel_export.export_results(input_data, scenario_input_data, tmp_path / 'streamed.xlsx', chunk_size=3)
+
+    saved = pd.read_excel(tmp_path / 'saved.xlsx', sheet_name=None)
+    streamed = pd.read_excel(tmp_path / 'streamed.xlsx', sheet_name=None)
+    pair_sheets = [name for name in saved if name.startswith('Input_')]
+    assert pair_sheets == [name for name in streamed if name.startswith('Input_')]
+    for name in pair_sheets:
+        pd.testing.assert_frame_equal(streamed[name], saved[name])
+    pd.testing.assert_frame_equal(streamed['Summary'], saved['Summary'])
+
+def test_long_layout_rolls_over_to_new_sheets(sheets, tmp_path, monkeypatch):
+    input_data, scenario_input_data = sheets
+    monkeypatch.setattr(excel_export, 'MAX_EXCEL_ROWS', 200)
+    excel_export.export_results(input_data, scenario_input_data, tmp_path / 'long.xlsx', layout='long', chunk_size=5)
+
+    workbook = openpyxl.load_workbook(tmp_path / 'long.xlsx', read_only=True)
+    parts = [name for name in workbook.sheetnames if name.startswith('Results')]
+    assert parts[:2] == ['Results', 'Results (2)']
+    rows = pd.concat([pd.read_excel(tmp_path / 'long.xlsx', sheet_name=name) for name in parts], ignore_index=True)
+    workbook.close()
+    assert len(rows) == int(input_data['Years Projection'].sum()) * len(scenario_input_data)
+    expected = sfm.run_model(input_data, scenario_input_data)['Input_7_Scenario 2']
+    pair = rows[(rows['Input Set'] == 7) & (rows['Scenario'] == 'Scenario 2')]
+    np.testing.assert_allclose(pair['Cumulative Cash Flow (RM)'].to_numpy(), expected['Cumulative Cash Flow (RM)'].to_numpy(), rtol=1e-14)
@@ -0,0 +1,61 @@
+import os
+import queue
+import time
+from types import SimpleNamespace
+import pandas as pd
+import pytest
+import SolarFinancialModelFunctions as sfm
+import benchmark
+import gui_worker
+
+@pytest.fixture
+def workbook(sheets, tmp_path):
+    path = str(tmp_path / 'inputs.xlsx')
+    benchmark.write_workbook(path, *sheets)
+    return path
+
+def drain(messages):
+    drained = []
+    while not messages.empty():
+        drained.append(messages.get())
+    return drained
+
+def test_run_job_saves_the_workbook_and_reports_progress(workbook, tmp_path):
+    messages, save_path = queue.Queue(), str(tmp_path / 'results.xlsx')
+    gui_worker.run_job(1, workbook, save_path, messages, SimpleNamespace(value=-1))
+    drained = drain(messages)
+    assert drained[-1] == (1, 'done', save_path)
+    assert all(kind == 'progress' for _, kind, _ in drained[:-1])
+    percents = [payload[0] for _, _, payload in drained[:-1]]
+    assert percents == sorted(percents)
+    assert os.path.exists(save_path) and not os.path.exists(save_path + gui_worker.PARTIAL_SUFFIX)
+
+def test_cancelled_and_failed_jobs_leave_no_file(workbook, tmp_path):
+    messages, save_path = queue.Queue(), str(tmp_path / 'results.xlsx')
+    gui_worker.run_job(2, workbook, save_path, messages, SimpleNamespace(value=2))
+    assert drain(messages)[-1] == (2, 'cancelled', None)
+    gui_worker.run_job(3, str(tmp_path / 'missing.xlsx'), save_path, messages, SimpleNamespace(value=-1))
+    assert drain(messages)[-1][:2] == (3, 'error')
+    assert os.listdir(tmp_path) == ['inputs.xlsx']
+
+def test_job_queue_runs_jobs_in_order_in_the_worker(workbook, tmp_path):
+    jobs = gui_worker.JobQueue()
+    try:
+        first = jobs.submit(workbook, str(tmp_path / 'first.xlsx'))
+        dropped = jobs.submit(workbook, str(tmp_path / 'dropped.xlsx'))
+        last = jobs.submit(workbook, str(tmp_path / 'last.xlsx'))
+        assert jobs.cancel(dropped) and jobs.queued() == [first, last]
+
+        finished = []
+        deadline = time.monotonic() + 120
+        while jobs.busy() and time.monotonic() < deadline:
+            finished += [(job_id, kind) for job_id, kind, _ in jobs.poll() if kind in ('done', 'error', 'cancelled')]
+            time.sleep(0.05)
+        assert finished == [(first, 'done'), (last, 'done')]
+        assert jobs.ready
+    finally:
+        jobs.close()
+    assert sorted(os.listdir(tmp_path)) == ['first.xlsx', 'inputs.xlsx', 'last.xlsx']
+    saved = pd.read_excel(tmp_path / 'last.xlsx', sheet_name='Summary')
+    expected = sfm.run_model(*sfm.load_input_file(workbook))['Summary']
+    assert saved['Overall IRR (%)'].tolist() == pytest.approx(expected['Overall IRR (%)'].tolist(), rel=1e-9, nan_ok=True)
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+import SolarFinancialModelFunctions as sfm
+import benchmark
+import hourly_model
+from reference.loop_model import run_model_loop
+
+def random_profiles(seed):
+    rng = np.random.default_rng(seed)
+    hours = np.arange(hourly_model.HOURS_PER_YEAR)
+    pv = np.maximum(0, np.sin((hours % 24 - 6) / 12 * np.pi)) * rng.uniform(0.5, 1.0, len(hours))
+    load = rng.uniform(0.2, 1.0, len(hours))
+    return pv / pv.sum(), load / load.sum()
+
+def test_self_consumption_curve_matches_an_hourly_sum():
+    pv_shape, load_shape = random_profiles(1)
+    curve = hourly_model.SelfConsumptionCurve(pv_shape, load_shape)
+    for k in [0.0, 0.05, 0.4, 1.0, 2.5, 30.0]:
+        assert curve(k) == pytest.approx(np.minimum(pv_shape, k * load_shape).sum(), rel=1e-12, abs=1e-15)
+
+def test_matching_flat_profiles_reproduce_the_annual_model(sheets, tmp_path):
+    input_data, scenario_input_data = sheets
+    flat = np.ones(hourly_model.HOURS_PER_YEAR)
+    hourly_model.write_profiles(tmp_path, {'flat': flat})
+    store = hourly_model.ProfileStore(tmp_path)
+    results = hourly_model.run_model_hourly(input_data, scenario_input_data, store, pv_profile='flat', load_profile='flat')
+    assert benchmark._worst_difference(run_model_loop(input_data, scenario_input_data), results) <= benchmark.CHECK_TOLERANCE
+
+def test_site_profiles_set_consumed_and_exported_energy(sheets, tmp_path):
+    input_data, scenario_input_data = sheets[0].iloc[:4].copy(), sheets[1]
+    pv_shape, load_shape = random_profiles(2)
+    hourly_model.write_profiles(tmp_path, {'pv': pv_shape * 3.0, 'load': load_shape})
+    store = hourly_model.ProfileStore(tmp_path)
+    np.testing.assert_allclose(store['pv'], pv_shape)
+    input_data[hourly_model.PV_PROFILE_COLUMN] = 'pv'
+    input_data[hourly_model.LOAD_PROFILE_COLUMN] = 'load'
+
+    batch = next(hourly_model.iter_model_hourly(input_data, scenario_input_data, store))
+    pv_generations = batch.flows['PV Generation (kWh/year)']
+    consumed = batch.flows['Consumed PV Power (kWh/year)']
+    for input_position, scenario_position, year in [(0, 0, 0), (1, 2, 7), (3, 1, 15)]:
+        a = pv_generations[input_position, scenario_position, year]
+        b = batch.annual_consumptions[scenario_position, year]
+        assert consumed[input_position, scenario_position, year] == pytest.approx(np.minimum(a * pv_shape, b * load_shape).sum(), rel=1e-9)
+    exported = batch.flows['Excess Energy Exported (kWh/year)']
+    allowed = batch.params['energy_export_allowed'][:, None, None]
+    np.testing.assert_allclose(exported, np.where(allowed, pv_generations - consumed, 0.0), atol=1e-6)
+
+def test_missing_profiles_are_validation_errors(sheets, tmp_path):
+    hourly_model.write_profiles(tmp_path, {'flat': np.ones(hourly_model.HOURS_PER_YEAR)})
+    store = hourly_model.ProfileStore(tmp_path)
+    with pytest.raises(sfm.InputValidationError):
+        list(hourly_model.iter_model_hourly(*sheets, store, pv_profile='flat', load_profile='office'))
+    with pytest.raises(sfm.InputValidationError):
+        list(hourly_model.iter_model_hourly(*sheets, store))
+    with pytest.raises(ValueError):
+        hourly_model.write_profiles(tmp_path, {'short': np.ones(24)})
@@ -0,0 +1,59 @@
+import json
+import math
+import sys
+import time
+import pytest
+import SolarFinancialModelFunctions as sfm
+import instrumentation
+
+def test_stages_outside_a_profile_record_nothing():
+    assert not instrumentation.active()
+    with instrumentation.stage('engine', rows=3) as record:
+        record.add(rows=2)
+    with instrumentation.profiling() as profile:
+        pass
+    assert profile.totals == {}
+
+def test_nested_stages_split_wall_and_self_time(tmp_path):
+    with instrumentation.profiling() as profile:
+        assert instrumentation.active()
+        with instrumentation.stage('outer', rows=1) as record:
+            with instrumentation.stage('inner'):
+                time.sleep(0.02)
+            record.add(rows=4, bytes_written=10)
+    assert not instrumentation.active()
+
+    outer, inner = profile.totals['outer'], profile.totals['inner']
+    assert outer['counts'] == {'rows': 5, 'bytes_written': 10}
+    assert inner['wall_seconds'] >= 0.02
+    assert outer['wall_seconds'] >= inner['wall_seconds']
+    assert outer['self_seconds'] == pytest.approx(outer['wall_seconds'] - inner['wall_seconds'], abs=1e-9)
+
+    profile.write_report(tmp_path / 'report.json')
+    assert set(json.loads((tmp_path / 'report.json').read_text())['stages']) == {'outer', 'inner'}
+    profile.write_chrome_trace(tmp_path / 'trace.json')
+    events = json.loads((tmp_path / 'trace.json').read_text())['traceEvents']
+    assert [event['name'] for event in events] == ['inner', 'outer']
+    assert all(event['ph'] == 'X' and event['dur'] >= 0 for event in events)
+    assert events[1]['args']['rows'] == 5
+
+def test_a_profiled_run_counts_every_pair(sheets):
+    input_data, scenario_input_data = sheets
+    with instrumentation.profiling() as profile:
+        results = sfm.run_model(input_data, scenario_input_data)
+    pairs = len(input_data) * len(scenario_input_data)
+    assert profile.totals['engine']['counts']['pairs'] == pairs
+    assert profile.totals['metrics']['counts']['pairs'] == pairs
+    assert len(results['Summary']) == pairs
+
+# resource is Unix-only; without it and without psutil the peak RSS is reported as NaN
+def test_profiles_work_without_the_resource_module(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'resource', None)
+    monkeypatch.setitem(sys.modules, 'psutil', None)
+    with instrumentation.profiling() as profile:
+        with instrumentation.stage('engine'):
+            pass
+        with instrumentation.stage('engine'):
+            pass
+    assert math.isnan(profile.totals['engine']['peak_rss_mb'])
+    assert math.isnan(profile.report()['peak_rss_mb'])
@@ -0,0 +1,80 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import job_runner
+import monte_carlo as mc
+import result_store
+import summary_metrics
+
+class Interrupted(Exception):
+    pass
+
+def interrupt_after(shards):
+    def progress(done, total):
+        if done == shards:
+            raise Interrupted
+    return progress
+
+def sorted_rows(table, keys):
+    return table.sort_values(keys, kind='stable').reset_index(drop=True)
+
+def test_resumed_model_job_merges_into_the_full_store(sheets, tmp_path):
+    input_data, scenario_input_data = sheets
+    with pytest.raises(Interrupted):
+        job_runner.run_job(tmp_path / 'job', input_data, scenario_input_data, shard_size=5, progress=interrupt_after(1))
+    assert job_runner.job_status(tmp_path / 'job') == {'done': 1, 'total': 3}
+    with pytest.raises(ValueError):
+        job_runner.merge_job(tmp_path / 'job', tmp_path / 'merged')
+
+    calls = []
+    job_runner.run_job(tmp_path / 'job', input_data, scenario_input_data, shard_size=5, progress=lambda done, total: calls.append(done))
+    assert calls == [2, 3]
+    job_runner.merge_job(tmp_path / 'job', tmp_path / 'merged')
+    result_store.write_results(input_data, scenario_input_data, tmp_path / 'full')
+
+    keys = ['Input Set', 'Scenario']
+    pd.testing.assert_frame_equal(sorted_rows(result_store.load_summary(tmp_path / 'merged'), keys),
+                                  sorted_rows(result_store.load_summary(tmp_path / 'full'), keys))
+    merged = result_store.load_results(tmp_path / 'merged')
+    full = result_store.load_results(tmp_path / 'full')
+    pd.testing.assert_frame_equal(sorted_rows(merged, keys + ['Year']), sorted_rows(full[merged.columns], keys + ['Year']))
+    pd.testing.assert_frame_equal(result_store.load_inputs(tmp_path / 'merged'), result_store.load_inputs(tmp_path / 'full'))
+
+def test_monte_carlo_shards_reproduce_a_single_run(sheets, tmp_path):
+    input_data, scenario_input_data = sheets[0].iloc[:4], sheets[1]
+    options = {'distributions': {'specific_yield': mc.normal(0.05)}, 'samples': 200, 'chunk_size': 100}
+    job_runner.run_job(tmp_path / 'job', input_data, scenario_input_data, kind='monte_carlo', shard_size=3, options=options)
+    job_runner.merge_job(tmp_path / 'job', tmp_path / 'merged')
+    merged = pd.read_parquet(tmp_path / 'merged' / 'Summary')
+    expected = mc.run_monte_carlo(input_data, scenario_input_data, **options)['Summary']
+    np.testing.assert_allclose(merged.select_dtypes('number').to_numpy(), expected.select_dtypes('number').to_numpy(), rtol=1e-12)
+
+def test_a_directory_holding_another_job_is_refused(sheets, tmp_path):
+    input_data, scenario_input_data = sheets
+    job_runner.run_job(tmp_path, input_data, scenario_input_data, shard_size=6)
+    with pytest.raises(ValueError):
+        job_runner.run_job(tmp_path, input_data, scenario_input_data, shard_size=4)
+    manifest = job_runner.run_job(tmp_path, input_data, scenario_input_data, shard_size=4, restart=True)
+    assert manifest['shards'] == len(manifest['completed']) == 3
+    with pytest.raises(ValueError):
+        job_runner.run_job(tmp_path, input_data, scenario_input_data, kind='hourly')
+
+def test_editing_the_metric_code_invalidates_a_job(sheets, tmp_path, monkeypatch):
+    input_data, scenario_input_data = sheets
+    job_runner.run_job(tmp_path / 'job', input_data, scenario_input_data, shard_size=5)
+    edited = tmp_path / 'summary_metrics.py'
+    edited.write_bytes(open(summary_metrics.__file__, 'rb').read() + b'\n# changed solver\n')
+    monkeypatch.setattr(summary_metrics, '__file__', str(edited))
+    with pytest.raises(ValueError, match='different job'):
+        job_runner.run_job(tmp_path / 'job', input_data, scenario_input_data, shard_size=5)
+
+@pytest.mark.skipif(os.name != 'posix', reason='directories are only synced on POSIX')
+def test_shard_files_are_flushed_to_disk_before_they_are_listed(sheets, tmp_path, monkeypatch):
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, 'fsync', lambda descriptor: synced.append(descriptor) or real_fsync(descriptor))
+    manifest = job_runner.run_job(tmp_path, *sheets, shard_size=6)
+    shard_files = sum(len(shard['tables']) for shard in manifest['completed'].values())
+    # Every shard file, both shard directories and the manifest with its directory on each write
+    assert len(synced) >= shard_files + 2 * len(manifest['completed']) + 2 * len(manifest['completed'])
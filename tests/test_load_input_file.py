@@ -0,0 +1,44 @@
+import pickle
+import pandas as pd
+import pytest
+import SolarFinancialModelFunctions as sfm
+import benchmark
+
+@pytest.fixture
+def workbook(sheets, tmp_path):
+    path = str(tmp_path / 'inputs.xlsx')
+    benchmark.write_workbook(path, *sheets)
+    return path
+
+def test_sidecar_round_trip(workbook, sheets):
+    first = sfm.load_input_file(workbook, sidecar=True)
+    second = sfm.load_input_file(workbook, sidecar=True)
+    for loaded in (first, second):
+        pd.testing.assert_frame_equal(loaded[0], sheets[0], check_dtype=False)
+
+@pytest.mark.parametrize('content', [
+    b'\x80\x05\x95',
+    pickle.dumps(['not', 'a', 'dict']),
+    pickle.dumps({'format': sfm.SIDECAR_FORMAT_VERSION}),
+    pickle.dumps({'format': sfm.SIDECAR_FORMAT_VERSION})[:-3] + b'\x00\x00\x00',
+    b'\x80\x05\x95\x10\x00\x00\x00\x00\x00\x00\x00\x8c\x08no_such_\x94\x8c\x04name\x94\x93\x94.',
+])
+def test_corrupt_sidecar_falls_back_to_the_workbook(workbook, sheets, content):
+    with open(workbook + sfm.SIDECAR_SUFFIX, 'wb') as sidecar_file:
+        sidecar_file.write(content)
+    input_data, scenario_input_data = sfm.load_input_file(workbook, sidecar=True)
+    pd.testing.assert_frame_equal(input_data, sheets[0], check_dtype=False)
+    assert sfm.load_input_file(workbook, sidecar=True)[1]['Scenario Name'].tolist() == sheets[1]['Scenario Name'].tolist()
+
+def test_validation_lists_every_problem_with_sheet_rows(sheets):
+    input_data, scenario_input_data = sheets
+    input_data['OPEX Start Year'] = input_data['OPEX Start Year'].astype(float)
+    input_data.loc[3, 'Years Projection'] = 0
+    input_data.loc[5, 'OPEX Start Year'] = 2.5
+    with pytest.raises(sfm.InputValidationError) as error:
+        sfm.validate_inputs(input_data, scenario_input_data.drop(columns='Baseline Consumption (kWh/year)'))
+    assert error.value.problems == [
+        "'Scenarios' is missing column 'Baseline Consumption (kWh/year)'",
+        "'Input Details' column 'Years Projection' must be at least 1 in rows 5",
+        "'Input Details' column 'OPEX Start Year' needs whole numbers in rows 7",
+    ]
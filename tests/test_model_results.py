@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+import SolarFinancialModelFunctions as sfm
+from reference.loop_model import run_model_loop
+
+def test_chunked_results_read_like_the_loop_dict(sheets):
+    input_data, scenario_input_data = sheets
+    expected = run_model_loop(input_data, scenario_input_data)
+    results = sfm.run_model(input_data, scenario_input_data, batches=sfm.iter_model(input_data, scenario_input_data, 5))
+
+    assert list(results) == ['Summary'] + list(expected)
+    assert len(results) == len(expected) + 1
+    for key in list(expected)[::7]:
+        pd.testing.assert_frame_equal(results[key], expected[key], check_dtype=False, rtol=1e-9)
+    assert dict(results.items()).keys() == set(['Summary', *expected])
+
+def test_arrays_are_read_only_views(sheets):
+    results = sfm.run_model(*sheets)
+    values = results.array('Input_4_Scenario 2')
+    assert not values.flags.writeable
+    with pytest.raises(ValueError):
+        values[0, 0] = 1.0
+    assert np.shares_memory(values, results.array('Input_4_Scenario 2'))
+    np.testing.assert_array_equal(values, results['Input_4_Scenario 2'][sfm.RESULT_COLUMNS[1:]].to_numpy())
+    assert results.nbytes() >= values.nbytes
+
+def test_unknown_keys(sheets):
+    results = sfm.run_model(*sheets)
+    assert 'Input_1_Scenario 1' in results
+    for key in ['Input_99_Scenario 1', 'Input_1_Scenario 9', 'Input_x_Scenario 1', 'Results', 3]:
+        assert key not in results
+        with pytest.raises(KeyError):
+            results[key]
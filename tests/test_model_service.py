@@ -0,0 +1,69 @@
+import asyncio
+import benchmark
+import model_service
+
+def test_computation_buffer_is_bounded_and_replays_only_while_complete():
+    async def scenario():
+        computation = model_service.Computation(max_buffered_lines=4)
+        first = computation.join()
+        late = computation.join()
+        buffered = []
+
+        async def produce():
+            for number in range(20):
+                await computation.publish(b'%d\n' % number, done=number == 19)
+
+        async def consume(follower, delay):
+            received = []
+            async for line in computation.follow(follower):
+                buffered.append(len(computation.lines))
+                received.append(line)
+                await asyncio.sleep(delay)
+            return received
+
+        producer = asyncio.ensure_future(produce())
+        await asyncio.sleep(0)
+        assert computation.joinable()
+        first_lines, late_lines = await asyncio.gather(consume(first, 0), consume(late, 0.001))
+        await producer
+        assert first_lines == late_lines == [b'%d\n' % number for number in range(20)]
+        assert max(buffered) <= 4
+        assert not computation.joinable()
+
+    asyncio.run(scenario())
+
+def test_abandoned_computation_drops_lines():
+    async def scenario():
+        computation = model_service.Computation(max_buffered_lines=2)
+        follower = computation.join()
+        stream = computation.follow(follower)
+        await computation.publish(b'0\n')
+        assert await stream.__anext__() == b'0\n'
+        await stream.aclose()
+        assert computation.abandoned()
+        for number in range(10):
+            await asyncio.wait_for(computation.publish(b'%d\n' % number), 1)
+        assert computation.lines == []
+
+    asyncio.run(scenario())
+
+# The model keeps one scenario per name, so a repeated name must not be counted twice
+def test_run_streams_summary_and_counts_distinct_scenarios(sheets, tmp_path):
+    input_data, scenario_input_data = sheets
+    scenario_input_data.loc[2, 'Scenario Name'] = scenario_input_data.loc[0, 'Scenario Name']
+    benchmark.write_workbook(tmp_path / 'inputs.xlsx', input_data, scenario_input_data)
+
+    async def scenario():
+        service = model_service.ModelService(workers=1)
+        await service.start()
+        server = await asyncio.start_server(service.handle, '127.0.0.1', 0)
+        client = model_service.ModelServiceClient(port=server.sockets[0].getsockname()[1], timeout=60)
+        try:
+            return await asyncio.to_thread(lambda: list(client.run(str(tmp_path / 'inputs.xlsx'), chunk_size=5)))
+        finally:
+            server.close()
+            service.close()
+
+    messages = asyncio.run(scenario())
+    assert messages[-1] == {'type': 'done', 'pairs': len(input_data) * 2}
+    assert sum(len(message['table']) for message in messages if message['type'] == 'summary') == len(input_data) * 2
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+import SolarFinancialModelFunctions as sfm
+import monte_carlo as mc
+
+DISTRIBUTIONS = {'specific_yield': mc.normal(0.08), 'tariff_hike_percentage': mc.uniform(-3, 3), 'consumption_change': mc.uniform(-4, 4)}
+
+def single_pass(input_data, scenario_input_data, samples, chunk_size, seed=0):
+    params = sfm.input_parameters(input_data)
+    change_table = sfm.parse_scenarios(scenario_input_data)
+    values = {}
+    for input_position, input_index in enumerate(input_data.index):
+        for scenario_position, scenario_name in enumerate(change_table['names']):
+            scenario_changes = {key: table[scenario_position] for key, table in change_table.items() if key != 'names'}
+            generators = mc.pair_generators(seed, input_index + 1, scenario_name)
+            chunks = list(mc.simulate_pair(params[input_position], scenario_changes, DISTRIBUTIONS, samples, chunk_size, generators))
+            for metric in sfm.PAIR_METRIC_LABELS:
+                values[input_index + 1, scenario_name, metric] = np.concatenate([chunk[metric] for chunk in chunks]) * sfm.PAIR_METRIC_SCALE[metric]
+    return values
+
+def test_streaming_statistics_match_a_single_pass(sheets):
+    input_data, scenario_input_data = sheets[0].iloc[:2], sheets[1]
+    results = mc.run_monte_carlo(input_data, scenario_input_data, DISTRIBUTIONS, samples=900, chunk_size=250, seed=0)
+    values = single_pass(input_data, scenario_input_data, 900, 250)
+
+    labels = {label: metric for metric, label in sfm.PAIR_METRIC_LABELS.items()}
+    assert len(results['Summary']) == len(values)
+    for row in results['Summary'].to_dict('records'):
+        metric = labels[row['Metric']]
+        expected = mc.metric_statistics(values[row['Input Set'], row['Scenario'], metric], metric)
+        for key, value in expected.items():
+            assert row[key] == pytest.approx(value, rel=1e-10, nan_ok=True)
+    assert results['Histogram'].groupby(['Input Set', 'Scenario', 'Metric'])['Count'].sum().max() <= 900
+
+def test_reservoir_bounds_memory_and_keeps_moments_exact():
+    rng = np.random.default_rng(3)
+    values = rng.normal(8, 2, 50000)
+    values[rng.random(50000) < 0.04] = np.nan
+    accumulator = mc.MetricAccumulator('irr_total', 2000, np.random.default_rng(0))
+    for chunk in np.array_split(values, 37):
+        accumulator.add(chunk)
+
+    assert accumulator.reservoir.size == 2000
+    statistics = accumulator.statistics()
+    expected = mc.metric_statistics(values, 'irr_total')
+    for key in ('Samples', 'Mean', 'Std', 'Not achieved (%)'):
+        assert statistics[key] == pytest.approx(expected[key], rel=1e-10)
+    for key in ('P10', 'P50', 'P90'):
+        assert statistics[key] == pytest.approx(expected[key], abs=0.2)
+    assert sum(count for _, _, count in accumulator.histogram(20)) == pytest.approx(np.count_nonzero(~np.isnan(values)), rel=0.01)
+
+def test_reservoir_does_not_depend_on_chunk_size():
+    values = np.random.default_rng(5).normal(size=10000)
+    reservoirs = []
+    for chunks in (7, 40):
+        accumulator = mc.MetricAccumulator('irr_total', 500, np.random.default_rng(1))
+        for chunk in np.array_split(values, chunks):
+            accumulator.add(chunk)
+        reservoirs.append(accumulator.reservoir)
+    np.testing.assert_array_equal(*reservoirs)
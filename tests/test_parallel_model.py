@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+import SolarFinancialModelFunctions as sfm
+import parallel_model
+
+def test_parallel_runs_match_run_model(sheets):
+    input_data, scenario_input_data = sheets
+    expected = sfm.run_model(input_data, scenario_input_data)
+    progress = []
+
+    results = parallel_model.run_model_parallel(input_data, scenario_input_data, workers=2, chunk_size=5,
+                                                progress=lambda done, total: progress.append((done, total)))
+    pd.testing.assert_frame_equal(results['Summary'], expected['Summary'])
+    for key in ('Input_1_Scenario 1', 'Input_12_Scenario 3'):
+        pd.testing.assert_frame_equal(results[key], expected[key])
+    assert sorted(progress)[-1] == (36, 36)
+
+    batches = list(parallel_model.iter_model_parallel(input_data, scenario_input_data, workers=2, chunk_size=5))
+    assert [len(batch.input_data) for batch in batches] == [5, 5, 2]
+    pd.testing.assert_frame_equal(pd.concat([batch.summary for batch in batches], ignore_index=True), expected['Summary'])
+    np.testing.assert_array_equal(batches[2].flows['Annual Cash Flow (RM)'][1], sfm.compute_cash_flows(
+        sfm.input_parameters(input_data.iloc[10:]), batches[2].annual_consumptions)['Annual Cash Flow (RM)'][1])
@@ -0,0 +1,52 @@
+import numpy as np
+import numpy_financial as npf
+import pandas as pd
+import pytest
+import SolarFinancialModelFunctions as sfm
+import portfolio
+
+@pytest.fixture
+def grouped_sheets(sheets):
+    input_data, scenario_input_data = sheets
+    input_data = input_data.copy()
+    input_data['Region'] = ['North', 'South', 'East', None] * (len(input_data) // 4)
+    return input_data, scenario_input_data
+
+def test_portfolio_totals_are_sums_of_the_site_flows(grouped_sheets):
+    input_data, scenario_input_data = grouped_sheets
+    tables = portfolio.aggregate_portfolio(input_data, scenario_input_data, chunk_size=5)
+    params = sfm.input_parameters(input_data)
+    change_table = sfm.parse_scenarios(scenario_input_data)
+    n_years = int(params['years_projection'].max())
+    flows = sfm.compute_cash_flows(params, sfm.consumption_matrix(change_table, n_years))
+    active = np.arange(1, n_years + 1) <= params['years_projection'][:, None, None]
+    cash_flows = np.where(active, flows['Annual Cash Flow (RM)'], 0.0)
+
+    summary = tables['Portfolio Summary'].set_index(['Region', 'Scenario'])
+    yearly = tables['Portfolio Yearly']
+    regions = input_data['Region'].fillna(portfolio.UNASSIGNED_GROUP).to_numpy()
+    assert sorted(summary.index.get_level_values('Region').unique()) == sorted(set(regions))
+    for region in set(regions):
+        sites = regions == region
+        for scenario_position, scenario in enumerate(change_table['names']):
+            expected = cash_flows[sites, scenario_position].sum(axis=0)
+            rows = yearly[(yearly['Region'] == region) & (yearly['Scenario'] == scenario)]
+            np.testing.assert_allclose(rows['Annual Cash Flow (RM)'].to_numpy(), expected, rtol=1e-12, atol=1e-6)
+            row = summary.loc[(region, scenario)]
+            assert row['Sites'] == sites.sum()
+            assert row['Overall IRR (%)'] == pytest.approx(npf.irr(expected) * 100, rel=1e-9, nan_ok=True)
+
+def test_chunking_does_not_change_the_portfolio(grouped_sheets):
+    small = portfolio.aggregate_portfolio(*grouped_sheets, chunk_size=3)
+    whole = portfolio.aggregate_portfolio(*grouped_sheets)
+    for name in small:
+        pd.testing.assert_frame_equal(small[name], whole[name], rtol=1e-12)
+
+def test_without_group_columns_all_sites_form_one_portfolio(sheets):
+    summary = portfolio.aggregate_portfolio(*sheets)['Portfolio Summary']
+    assert len(summary) == len(sheets[1])
+    assert (summary['Sites'] == len(sheets[0])).all()
+
+def test_missing_group_column_is_a_validation_error(sheets):
+    with pytest.raises(sfm.InputValidationError):
+        portfolio.aggregate_portfolio(*sheets, group_by=['Client'])
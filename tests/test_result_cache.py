@@ -0,0 +1,26 @@
+import numpy as np
+import SolarFinancialModelFunctions as sfm
+import result_cache
+import summary_metrics
+
+def test_cached_runs_match_run_model(sheets, tmp_path):
+    input_data, scenario_input_data = sheets
+    expected = sfm.run_model(input_data, scenario_input_data)['Summary']
+
+    cache = result_cache.ResultCache(tmp_path)
+    first = sfm.run_model(input_data, scenario_input_data, cache=cache)['Summary']
+    assert cache.report()['misses'] == len(expected) and cache.report()['hits'] == 0
+    second = sfm.run_model(input_data, scenario_input_data, cache=cache)['Summary']
+    assert cache.report()['hits'] == len(expected)
+    cache.close()
+    for summary in (first, second):
+        np.testing.assert_allclose(summary['Overall IRR (%)'].to_numpy(dtype=float), expected['Overall IRR (%)'].to_numpy(dtype=float), rtol=1e-12)
+        assert summary['PV Payback Period (years)'].tolist() == expected['PV Payback Period (years)'].tolist()
+
+# Cached IRR and payback come from summary_metrics, so editing it must invalidate the cache too
+def test_model_version_follows_summary_metrics(tmp_path, monkeypatch):
+    version = result_cache.model_version()
+    edited = tmp_path / 'summary_metrics.py'
+    edited.write_bytes(open(summary_metrics.__file__, 'rb').read() + b'\n# edited\n')
+    monkeypatch.setattr(summary_metrics, '__file__', str(edited))
+    assert result_cache.model_version() != version
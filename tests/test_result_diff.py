@@ -0,0 +1,71 @@
+import os
+import numpy as np
+import openpyxl
+import pytest
+import SolarFinancialModelFunctions as sfm
+import result_diff
+import result_store
+
+def raised_tariff(input_data, input_set, factor=1.1):
+    edited = input_data.copy()
+    edited['Electricity Tariff (RM/kWh)'] = edited['Electricity Tariff (RM/kWh)'].astype(float)
+    edited.loc[input_set - 1, 'Electricity Tariff (RM/kWh)'] *= factor
+    return edited
+
+def test_the_same_results_in_every_format_have_no_changes(sheets, tmp_path):
+    input_data, scenario_input_data = sheets
+    results = sfm.run_model(input_data, scenario_input_data)
+    sfm.save_results(results, str(tmp_path / 'results.xlsx'))
+    result_store.write_results(input_data, scenario_input_data, tmp_path / 'store')
+    for old, new in [(results, results), (str(tmp_path / 'results.xlsx'), str(tmp_path / 'store')),
+                     (str(tmp_path / 'store'), results)]:
+        diff = result_diff.diff_results(old, new)
+        assert (diff.pairs, diff.identical, diff.changed, diff.added, diff.removed) == (36, 36, 0, 0, 0)
+        assert diff.report.empty
+
+def test_changed_pairs_are_reported_and_ranked(sheets):
+    input_data, scenario_input_data = sheets
+    old = sfm.run_model(input_data, scenario_input_data)
+    new = sfm.run_model(raised_tariff(raised_tariff(input_data, 3), 8, 1.01), scenario_input_data)
+    diff = result_diff.diff_results(old, new)
+    assert (diff.changed, diff.identical) == (6, 30)
+    assert set(diff.report['Input Set']) == {3, 8}
+    ranking = diff.report[f'{result_diff.DEFAULT_RANK_BY} change'].abs().to_numpy()
+    assert (np.diff(ranking) <= 0).all()
+
+    for row in diff.report.to_dict('records'):
+        old_row = old['Summary'][(old['Summary']['Input Set'] == row['Input Set']) & (old['Summary']['Scenario'] == row['Scenario'])]
+        new_row = new['Summary'][(new['Summary']['Input Set'] == row['Input Set']) & (new['Summary']['Scenario'] == row['Scenario'])]
+        assert row['Overall IRR (%) old'] == pytest.approx(old_row['Overall IRR (%)'].iloc[0], rel=1e-12)
+        assert row['Overall IRR (%) new'] == pytest.approx(new_row['Overall IRR (%)'].iloc[0], rel=1e-12)
+        final = new[f"Input_{row['Input Set']}_{row['Scenario']}"]['Cumulative Cash Flow (RM)'].iloc[-1]
+        assert row['Final Cumulative Cash Flow (RM) new'] == pytest.approx(final, rel=1e-12)
+        assert row['Years Changed'] > 0
+
+def test_added_and_removed_pairs_and_exit_codes(sheets, tmp_path):
+    input_data, scenario_input_data = sheets
+    result_store.write_results(input_data, scenario_input_data, tmp_path / 'old')
+    result_store.write_results(raised_tariff(input_data, 2), scenario_input_data.iloc[:2], tmp_path / 'new')
+    diff = result_diff.diff_results(str(tmp_path / 'old'), str(tmp_path / 'new'))
+    assert (diff.pairs, diff.changed, diff.added, diff.removed) == (24, 2, 0, 12)
+    assert diff.report['Status'].tolist() == ['changed'] * 2 + ['removed'] * 12
+
+    assert result_diff.main([str(tmp_path / 'old'), str(tmp_path / 'old')]) == result_diff.EXIT_OK
+    assert result_diff.main([str(tmp_path / 'old'), str(tmp_path / 'new'), '--output', str(tmp_path / 'changes.csv')]) == result_diff.EXIT_CHANGED
+    assert (tmp_path / 'changes.csv').exists()
+    assert result_diff.main([str(tmp_path / 'old'), str(tmp_path / 'missing.xlsx')]) == result_diff.EXIT_INVALID_INPUT
+
+def test_workbooks_in_an_older_layout_are_refused(sheets, tmp_path):
+    # The checked-in example workbook predates the current Summary and yearly columns
+    old_layout = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'solar_financial_model_scenarios_results.xlsx')
+    with pytest.raises(ValueError, match='unsupported workbook layout'):
+        result_diff.load_result_set(old_layout)
+    assert result_diff.main([old_layout, old_layout]) == result_diff.EXIT_INVALID_INPUT
+
+    path = str(tmp_path / 'results.xlsx')
+    sfm.save_results(sfm.run_model(*sheets), path)
+    workbook = openpyxl.load_workbook(path)
+    workbook['Input_2_Scenario 1'].delete_cols(sfm.RESULT_COLUMNS.index('OPEX (RM)') + 1)
+    workbook.save(path)
+    with pytest.raises(ValueError, match="unsupported workbook layout.*'Input_2_Scenario 1'.*'OPEX \\(RM\\)'"):
+        result_diff.load_result_set(path)
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import SolarFinancialModelFunctions as sfm
+import result_store
+
+def test_store_round_trip_matches_run_model(sheets, tmp_path):
+    input_data, scenario_input_data = sheets
+    result_store.write_results(input_data, scenario_input_data, tmp_path, chunk_size=5)
+    results = sfm.run_model(input_data, scenario_input_data)
+
+    rows = result_store.load_results(tmp_path, inputs=[3], scenarios=['Scenario 2'])
+    expected = results['Input_3_Scenario 2']
+    assert rows['Year'].tolist() == expected['Year'].tolist()
+    np.testing.assert_array_equal(rows[sfm.RESULT_COLUMNS[1:]].to_numpy(), expected[sfm.RESULT_COLUMNS[1:]].to_numpy())
+
+    summary = result_store.load_summary(tmp_path)
+    assert len(summary) == len(results['Summary'])
+    np.testing.assert_array_equal(summary['Overall IRR (%)'].to_numpy(), results['Summary']['Overall IRR (%)'].to_numpy(dtype=float))
+    assert len(result_store.load_hashes(tmp_path)) == len(summary)
+    pd.testing.assert_frame_equal(result_store.load_inputs(tmp_path), input_data, check_dtype=False)
+
+# Excel gives scenario names like 2025 as numbers, which batch_table could not convert to text
+def test_numeric_scenario_names(sheets, tmp_path):
+    input_data, scenario_input_data = sheets
+    scenario_input_data['Scenario Name'] = pd.Series([1, 2025, 'Base'], dtype=object)
+    result_store.write_results(input_data, scenario_input_data, tmp_path)
+    results = sfm.run_model(input_data, scenario_input_data)
+
+    rows = result_store.load_results(tmp_path, inputs=[2], scenarios=['2025'])
+    assert set(rows['Scenario']) == {'2025'}
+    np.testing.assert_array_equal(rows['Cumulative Cash Flow (RM)'].to_numpy(), results['Input_2_2025']['Cumulative Cash Flow (RM)'].to_numpy())
+    assert result_store.load_summary(tmp_path, scenarios=['1'])['Input Set'].tolist() == list(range(1, 13))
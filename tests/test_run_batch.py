@@ -0,0 +1,50 @@
+import argparse
+import pandas as pd
+import pytest
+import benchmark
+import result_store
+import run_batch
+
+@pytest.fixture
+def workbook(sheets, tmp_path):
+    path = str(tmp_path / 'inputs.xlsx')
+    benchmark.write_workbook(path, *sheets)
+    return path
+
+def test_parse_input_sets():
+    assert run_batch.parse_input_sets('1,3,5-8') == {1, 3, 5, 6, 7, 8}
+    with pytest.raises(argparse.ArgumentTypeError):
+        run_batch.parse_input_sets('1,x')
+
+def test_parquet_run_of_selected_rows(workbook, tmp_path, capsys):
+    output = str(tmp_path / 'store')
+    status = run_batch.main([workbook, output, '--format', 'parquet', '--inputs', '2-4', '--scenarios', 'Scenario 3'])
+    assert status == run_batch.EXIT_OK
+    summary = result_store.load_summary(output)
+    assert summary['Input Set'].tolist() == [2, 3, 4] and set(summary['Scenario']) == {'Scenario 3'}
+    assert 'model: 3/3 scenarios' in capsys.readouterr().err
+
+def test_long_workbook_run_has_every_year(workbook, sheets, tmp_path):
+    output = str(tmp_path / 'results.xlsx')
+    assert run_batch.main([workbook, output, '--format', 'xlsx-long', '--chunk-size', '5']) == run_batch.EXIT_OK
+    results = pd.read_excel(output, sheet_name='Results')
+    assert len(results) == int(sheets[0]['Years Projection'].sum()) * len(sheets[1])
+
+def test_exit_codes_for_invalid_input(workbook, tmp_path, capsys):
+    status = run_batch.main([workbook, str(tmp_path / 'out.xlsx'), '--inputs', '99'])
+    assert status == run_batch.EXIT_INVALID_INPUT
+    status = run_batch.main([str(tmp_path / 'missing.xlsx'), str(tmp_path / 'out.xlsx')])
+    assert status == run_batch.EXIT_FAILURE
+
+# Excel hands back a scenario named 2030 as a number, while --scenarios gives text
+def test_numeric_scenario_names_can_be_selected(sheets, tmp_path):
+    input_data, scenario_input_data = sheets
+    scenario_input_data['Scenario Name'] = pd.Series(['Base', 2030, 'Scenario 3'], dtype=object)
+    path = str(tmp_path / 'inputs.xlsx')
+    benchmark.write_workbook(path, input_data, scenario_input_data)
+    output = str(tmp_path / 'store')
+    assert run_batch.main([path, output, '--format', 'parquet', '--scenarios', '2030', 'Base']) == run_batch.EXIT_OK
+    assert set(result_store.load_summary(output)['Scenario']) == {'2030', 'Base'}
+
+    _, selected = run_batch.select_rows(input_data, scenario_input_data, scenario_names=[2030])
+    assert selected['Scenario Name'].tolist() == [2030]
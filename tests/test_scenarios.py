@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+import SolarFinancialModelFunctions as sfm
+
+def changes_of(row):
+    changes = []
+    for i in range(1, sfm.MAX_CONSUMPTION_CHANGES + 1):
+        key = f'Change {i} Percentage Change'
+        if key in row and pd.notna(row[key]):
+            changes.append({'Percentage Change': row[key], 'Start Year': row[f'Change {i} Start Year'],
+                            'Duration': row[f'Change {i} Duration']})
+    return changes
+
+def test_consumption_matrix_matches_per_scenario_generation(sheets):
+    _, scenario_input_data = sheets
+    matrix = sfm.consumption_matrix(sfm.parse_scenarios(scenario_input_data), 20)
+    for position, row in scenario_input_data.iterrows():
+        expected = sfm.generate_consumption_scenarios(20, row['Baseline Consumption (kWh/year)'], changes_of(row))
+        np.testing.assert_array_equal(matrix[position], expected)
+    np.testing.assert_array_equal(sfm.consumption_matrix(sfm.parse_scenarios(scenario_input_data), 8), matrix[:, :8])
+
+# A repeated scenario name keeps the first position and the last row's values, as the dict of the
+# original loop did
+def test_repeated_scenario_name_keeps_last_values(sheets):
+    _, scenario_input_data = sheets
+    scenario_input_data.loc[2, 'Scenario Name'] = scenario_input_data.loc[0, 'Scenario Name']
+    change_table = sfm.parse_scenarios(scenario_input_data)
+    assert change_table['names'] == list(scenario_input_data['Scenario Name'].iloc[:2])
+    assert change_table['baseline_consumption'][0] == scenario_input_data.loc[2, 'Baseline Consumption (kWh/year)']
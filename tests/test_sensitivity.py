@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+import SolarFinancialModelFunctions as sfm
+import sensitivity
+
+def summary_value(input_data, scenario_input_data, input_set, scenario, column):
+    summary = sfm.run_model(input_data, scenario_input_data)['Summary']
+    return summary[(summary['Input Set'] == input_set) & (summary['Scenario'] == scenario)][column].iloc[0]
+
+def test_tornado_low_and_high_match_reruns_with_perturbed_inputs(sheets):
+    input_data, scenario_input_data = sheets[0].iloc[:3], sheets[1]
+    tornado = sensitivity.tornado_table(input_data, scenario_input_data, ['electricity_tariff', 'cost_per_kwp', 'years_projection'])
+    assert tornado.groupby(['Input Set', 'Scenario', 'Metric'])['Swing'].apply(lambda swings: swings.fillna(-np.inf).is_monotonic_decreasing).all()
+
+    for row in tornado[tornado['Metric'] == 'Overall IRR (%)'].iloc[::4].to_dict('records'):
+        for side in ('Low', 'High'):
+            edited = input_data.copy()
+            edited[row['Parameter']] = edited[row['Parameter']].astype(float)
+            edited.loc[row['Input Set'] - 1, row['Parameter']] = row[f'{side} Input']
+            expected = summary_value(edited, scenario_input_data, row['Input Set'], row['Scenario'], 'Overall IRR (%)')
+            assert row[side] == pytest.approx(expected, rel=1e-9)
+            assert row[f'{side} Delta'] == pytest.approx(row[side] - row['Base'], abs=1e-12)
+
+def test_factorial_rows_match_reruns(sheets):
+    input_data, scenario_input_data = sheets[0].iloc[:2], sheets[1]
+    grid = sensitivity.factorial_table(input_data, scenario_input_data, ['electricity_tariff', 'opex'])
+    assert len(grid) == 2 * 3 ** 2 * len(scenario_input_data)
+    for row in grid.iloc[::7].to_dict('records'):
+        edited = input_data.copy()
+        for column in ('Electricity Tariff (RM/kWh)', 'OPEX (RM)'):
+            edited.loc[row['Input Set'] - 1, column] = row[column]
+        expected = summary_value(edited, scenario_input_data, row['Input Set'], row['Scenario'], 'PV IRR (%)')
+        assert row['PV IRR (%)'] == pytest.approx(expected, rel=1e-9)
+
+def test_unknown_parameter_is_rejected(sheets):
+    with pytest.raises(ValueError):
+        sensitivity.tornado_table(*sheets, ['not_a_parameter'])
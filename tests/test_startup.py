@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+import time
+import benchmark
+import gui_worker
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def wait_until_idle(jobs, timeout=120):
+    messages = []
+    deadline = time.monotonic() + timeout
+    while jobs.busy() and time.monotonic() < deadline:
+        messages += jobs.poll()
+        time.sleep(0.05)
+    return messages
+
+def test_importing_the_gui_does_not_load_the_model_libraries():
+    script = ('import sys, main; '
+              "print(sorted(name for name in ('pandas', 'numpy', 'openpyxl', 'SolarFinancialModelFunctions') if name in sys.modules))")
+    output = subprocess.run([sys.executable, '-c', script], cwd=REPOSITORY, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == '[]'
+
+def test_a_second_run_reuses_the_warm_worker(sheets, tmp_path):
+    workbook = str(tmp_path / 'inputs.xlsx')
+    benchmark.write_workbook(workbook, *sheets)
+    jobs = gui_worker.JobQueue()
+    try:
+        jobs.start_worker()
+        worker = jobs.worker
+        jobs.submit(workbook, str(tmp_path / 'first.xlsx'))
+        first = wait_until_idle(jobs)
+        jobs.submit(workbook, str(tmp_path / 'second.xlsx'))
+        second = wait_until_idle(jobs)
+        assert jobs.worker is worker and worker.is_alive()
+    finally:
+        jobs.close()
+    assert [kind for _, kind, _ in first if kind in ('ready', 'done')] == ['ready', 'done']
+    assert [kind for _, kind, _ in second if kind in ('ready', 'done')] == ['done']
+    assert jobs.ready_seconds > 0
@@ -0,0 +1,36 @@
+import pandas as pd
+import SolarFinancialModelFunctions as sfm
+import result_store
+import stream_pipeline
+
+def test_streamed_store_matches_run_model(sheets, tmp_path):
+    input_data, scenario_input_data = sheets
+    input_data.to_csv(tmp_path / 'inputs.csv', index=False)
+    scenario_input_data.to_csv(tmp_path / 'scenarios.csv', index=False)
+
+    next_row = stream_pipeline.run_streaming(tmp_path / 'inputs.csv', tmp_path / 'store', tmp_path / 'scenarios.csv', chunk_size=5)
+
+    assert next_row == len(input_data)
+    expected = sfm.run_model(input_data, scenario_input_data)['Summary']
+    summary = result_store.load_summary(tmp_path / 'store').sort_values(['Input Set', 'Scenario'], ignore_index=True)
+    expected = expected.sort_values(['Input Set', 'Scenario'], ignore_index=True)
+    pd.testing.assert_series_equal(summary['Overall IRR (%)'], expected['Overall IRR (%)'].astype(float))
+
+# An all-integer column in the first chunk and decimals in the next used to give the parts of
+# inputs.parquet different schemas, and load_inputs failed on the finished store
+def test_chunks_of_mixed_dtypes_read_back(sheets, tmp_path):
+    input_data, scenario_input_data = sheets
+    input_data['Tariff Hike Percentage (%)'] = [2, 3, 4, 5, 2.5, 3.5, 1.5, 2.5, 3, 4, 5, 6]
+    input_data['Additional Structure Cost (RM)'] = input_data['Additional Structure Cost (RM)'].astype(object)
+    input_data.loc[4:, 'Additional Structure Cost (RM)'] = 1000.5
+    input_data['Site'] = [1, 2, 3, 4, 'North', 'South', None, 'East', 9, 10, 11, 12]
+    input_data.to_csv(tmp_path / 'inputs.csv', index=False)
+    scenario_input_data.to_csv(tmp_path / 'scenarios.csv', index=False)
+
+    stream_pipeline.run_streaming(tmp_path / 'inputs.csv', tmp_path / 'store', tmp_path / 'scenarios.csv', chunk_size=4)
+
+    inputs = result_store.load_inputs(tmp_path / 'store')
+    assert len(inputs) == len(input_data)
+    assert inputs['Tariff Hike Percentage (%)'].tolist() == input_data['Tariff Hike Percentage (%)'].tolist()
+    assert inputs['Additional Structure Cost (RM)'].tolist() == input_data['Additional Structure Cost (RM)'].astype(float).tolist()
+    assert inputs['Site'].tolist()[4:6] == ['North', 'South'] and pd.isna(inputs['Site'][6])
@@ -0,0 +1,52 @@
+import numpy as np
+import numpy_financial as npf
+import pytest
+import summary_metrics
+
+def assert_matches_npf(cash_flows):
+    rates, found = summary_metrics.irr(cash_flows)
+    expected = np.array([npf.irr(row) for row in cash_flows])
+    np.testing.assert_allclose(rates, expected, rtol=1e-9, atol=1e-12)
+    np.testing.assert_array_equal(found, ~np.isnan(expected))
+
+def test_irr_matches_npf_on_project_cash_flows():
+    rng = np.random.default_rng(0)
+    cash_flows = rng.uniform(1000, 20000, (500, 25))
+    cash_flows[:, 0] = -rng.uniform(20000, 400000, 500)
+    cash_flows[:100, 15:] = 0
+    assert_matches_npf(cash_flows)
+
+# Several sign changes give several roots; npf.irr returns the rate closest to 0%
+@pytest.mark.parametrize('cash_flows', [
+    [-100, 100, 0, -7],
+    [-5, 10.5, 1, -8, 1],
+    [-100000, 30000, 30000, 30000, -80000, 30000, 30000, 30000, 30000],
+    [-1000, 500, 500, 500, 500, -600, -600, -600],
+    [-100, 230, -132],
+    [-1, 3.1, -3.2, 1.1],
+    [-10, 0, 0, 25, 0, 0],
+])
+def test_irr_picks_npf_root_with_several_sign_changes(cash_flows):
+    assert_matches_npf(np.array([cash_flows], dtype=float))
+
+def test_irr_matches_npf_on_random_multi_sign_flows():
+    rng = np.random.default_rng(1)
+    cash_flows = rng.normal(0, 1, (3000, 12)) * rng.choice([1, 1e3, 1e6], (3000, 1))
+    cash_flows[::3, 8:] = 0
+    assert_matches_npf(cash_flows)
+
+@pytest.mark.parametrize('cash_flows', [
+    [0, 0, 0, 0],
+    [100, 20, 30],
+    [-100, -20, 0],
+    [0, 0, 5, 0],
+    [-1, 10000],
+])
+def test_irr_degenerate_flows(cash_flows):
+    assert_matches_npf(np.array([cash_flows], dtype=float))
+
+def test_payback_period_interpolates_first_non_negative_year():
+    cumulative = np.cumsum([[-100, 40, 40, 40, 40], [-100, 10, 10, 10, 10]], axis=1)
+    payback = summary_metrics.payback_period(cumulative, [100, 100])
+    assert payback[0] == pytest.approx(3 + 20 / 40)
+    assert np.isnan(payback[1])
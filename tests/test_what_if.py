@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+import SolarFinancialModelFunctions as sfm
+import what_if
+
+def assert_matches_run_model(model):
+    expected = sfm.run_model(model.input_data, model.scenario_input_data)
+    pd.testing.assert_frame_equal(model.summary.reset_index(drop=True), expected['Summary'], check_dtype=False, rtol=1e-9)
+    results = model.results()
+    for key in list(expected)[1::5]:
+        np.testing.assert_allclose(results.array(key), expected.array(key), rtol=1e-9, atol=1e-9)
+
+def test_edits_match_run_model_on_the_edited_sheets(sheets):
+    model = what_if.WhatIfModel(*sheets)
+    model.set_input(3, 'Electricity Tariff (RM/kWh)', 0.61)
+    model.set_input(5, 'Capacity (kWp)', 812.5)
+    model.set_scenario('Scenario 2', 'Change 1 Percentage Change', -12.5)
+    assert_matches_run_model(model)
+
+def test_edits_recompute_only_dependent_nodes(sheets):
+    model = what_if.WhatIfModel(*sheets)
+    rows = model.set_input(2, 'OPEX (RM)', 4321.0)
+    assert set(rows['Input Set']) == {2}
+    assert model.last_update['nodes'] == {'opex': 1, 'cash_flows': 3, 'metrics': 3}
+    assert model.last_update['pairs'] == 3
+
+    rows = model.set_scenario('Scenario 3', 'Baseline Consumption (kWh/year)', 123456.0)
+    assert set(rows['Scenario']) == {'Scenario 3'}
+    assert list(model.last_update['nodes']) == ['consumption', 'energy', 'savings', 'cash_flows', 'metrics']
+    assert model.last_update['pairs'] == 12
+    assert_matches_run_model(model)
+
+def test_a_longer_projection_rebuilds_the_model(sheets):
+    model = what_if.WhatIfModel(*sheets)
+    model.set_input(1, 'Years Projection', model.n_years + 5)
+    assert model.n_years == model.params['years_projection'][0]
+    assert all(size is None for size in model.last_update['nodes'].values())
+    assert_matches_run_model(model)
+
+def test_invalid_edits_are_rejected_and_leave_the_model_unchanged(sheets):
+    model = what_if.WhatIfModel(*sheets)
+    summary = model.summary.copy()
+    with pytest.raises(KeyError):
+        model.set_input(99, 'OPEX (RM)', 1.0)
+    with pytest.raises(KeyError):
+        model.set_scenario('Scenario 9', 'Change 1 Duration', 2)
+    with pytest.raises(ValueError):
+        model.set_input(1, 'Scenario Name', 'x')
+    with pytest.raises(ValueError):
+        model.set_scenario('Scenario 1', 'Scenario Name', 'x')
+    with pytest.raises(sfm.InputValidationError):
+        model.set_input(1, 'Capacity (kWp)', 'large')
+    with pytest.raises(sfm.InputValidationError):
+        model.set_input(1, 'Years Projection', 2.5)
+    pd.testing.assert_frame_equal(model.summary, summary)
+
+# run_batch --inputs hands over a filtered sheet; its Input Sets keep their index + 1 numbers
+def test_a_filtered_sheet_keeps_its_input_set_numbers(sheets):
+    input_data, scenario_input_data = sheets[0].iloc[[2, 5, 9]], sheets[1]
+    model = what_if.WhatIfModel(input_data, scenario_input_data)
+    rows = model.set_input(6, 'OPEX (RM)', 2500.0)
+    assert set(rows['Input Set']) == {6}
+    assert model.input_data.at[5, 'OPEX (RM)'] == 2500.0
+    assert input_data.at[5, 'OPEX (RM)'] != 2500.0
+    with pytest.raises(KeyError):
+        model.set_input(1, 'OPEX (RM)', 2500.0)
+    assert list(model.results())[1:4] == ['Input_3_Scenario 1', 'Input_3_Scenario 2', 'Input_3_Scenario 3']
+    assert_matches_run_model(model)
@@ -0,0 +1,228 @@
+import time
+import numpy as np
+import SolarFinancialModelFunctions as sfm
+import model_results
+
+# Incremental model for interactive what-if edits on sheets that are already loaded:
+#   model = what_if.WhatIfModel(input_data, scenario_input_data)
+#   model.set_input(3, 'Tariff Hike Percentage (%)', 5)              edits Input Set 3
+#   model.set_scenario('Base', 'Change 2 Percentage Change', -10)
+#   model.summary                                                    the Summary table after the edits
+#   model.results()                                                  a ModelResults like run_model's
+# Each intermediate series is a node. NODES lists every node in dependency order, together with its
+# scope and the Input Details parameters (PARAMETER_FIELDS names), 'scenario' or other nodes it is
+# computed from. An edit marks the nodes that depend on the changed field, directly or through another
+# node, and recomputes only those. Input nodes are recomputed for the edited Input Set, pair nodes for
+# that Input Set with every scenario. A scenario edit recomputes its consumption and the pairs of that
+# scenario with every Input Set. The numbers match run_model on the edited sheets.
+SCENARIO_FIELD = 'scenario'
+
+NODES = [
+    ('tariff', 'input', ['electricity_tariff', 'tariff_hike_percentage', 'tariff_hike_interval']),
+    ('buyback', 'input', ['tnb_buyback_rate', 'buyback_hike_percentage', 'buyback_hike_interval']),
+    ('opex', 'input', ['opex', 'opex_hike_percentage', 'opex_hike_interval', 'opex_start_year']),
+    ('pv_generation', 'input', ['capacity_kWp', 'specific_yield', 'performance_drop']),
+    ('investment', 'input', ['capacity_kWp', 'cost_per_kwp', 'additional_structure_cost']),
+    ('consumption', 'scenario', [SCENARIO_FIELD]),
+    ('energy', 'pair', ['pv_generation', 'consumption', 'energy_export_allowed']),
+    ('savings', 'pair', ['energy', 'tariff', 'buyback', 'energy_export_allowed']),
+    ('cash_flows', 'pair', ['savings', 'opex', 'investment', 'years_projection']),
+    ('metrics', 'pair', ['cash_flows', 'investment']),
+]
+
+# Result column -> (node, position of the series in that node's arrays)
+FLOW_SOURCES = {
+    'PV Generation Rate (kWh/kWp/year)': ('pv_generation', 0),
+    'PV Generation (kWh/year)': ('pv_generation', 1),
+    'Consumed PV Power (kWh/year)': ('energy', 0),
+    'Excess Energy Exported (kWh/year)': ('energy', 1),
+    'Electricity Tariff (RM/kWh)': ('tariff', 0),
+    'TNB Buyback Rate (RM/kWh)': ('buyback', 0),
+    'Energy Consumption Saving (RM)': ('savings', 0),
+    'Exported Energy Saving (RM)': ('savings', 1),
+    'Tax Saving from GITA (RM)': ('investment', 0),
+    'OPEX (RM)': ('opex', 0),
+    'Capital Expense (base) (RM)': ('investment', 1),
+    'Capital Expense (RM)': ('investment', 2),
+    'Total Expense (base)(RM)': ('cash_flows', 0),
+    'Total Expense (RM)': ('cash_flows', 1),
+    'Total Income (RM)': ('cash_flows', 2),
+    'Cumulative Cash Flow (base) (RM)': ('cash_flows', 5),
+    'Cumulative Cash Flow (RM)': ('cash_flows', 6),
+    'Annual Cash Flow (base) (RM)': ('cash_flows', 3),
+    'Annual Cash Flow (RM)': ('cash_flows', 4),
+}
+
+INPUT_FIELDS = {column: name for name, column, _, _ in sfm.PARAMETER_FIELDS}
+SCENARIO_EDIT_COLUMNS = ['Baseline Consumption (kWh/year)'] + [
+    f'Change {i} {key}' for i in range(1, sfm.MAX_CONSUMPTION_CHANGES + 1) for key in ('Percentage Change', 'Start Year', 'Duration')
+]
+
+# Nodes to recompute after the given fields change, in NODES order
+def dirty_nodes(fields):
+    dirty = set(fields)
+    nodes = []
+    for node, _, dependencies in NODES:
+        if not dirty.isdisjoint(dependencies):
+            dirty.add(node)
+            nodes.append(node)
+    return nodes
+
+# Sets one cell in place. A value the column's dtype cannot hold (text in a number column, or a
+# fraction in an integer one) turns that column into objects, so validate_inputs can report it.
+def _set_value(data, position, column, value):
+    if column not in data:
+        data[column] = np.nan
+    column_position = data.columns.get_loc(column)
+    try:
+        data.iloc[position, column_position] = value
+    except (TypeError, ValueError):
+        data[column] = data[column].astype(object)
+        data.iloc[position, column_position] = value
+
+class WhatIfModel:
+    def __init__(self, input_data, scenario_input_data):
+        sfm.validate_inputs(input_data, scenario_input_data)
+        # Input Sets are numbered index + 1, as run_model numbers them, so a filtered sheet keeps its numbers
+        self.input_data = input_data.copy()
+        self.scenario_input_data = scenario_input_data.reset_index(drop=True)
+        self.input_positions = {int(index) + 1: position for position, index in enumerate(self.input_data.index)}
+        sheet_rows = {}
+        for position, scenario_name in enumerate(self.scenario_input_data['Scenario Name']):
+            sheet_rows[scenario_name] = position
+        self.scenario_names = list(sheet_rows)
+        self.scenario_positions = {name: position for position, name in enumerate(self.scenario_names)}
+        self.scenario_sheet_rows = np.array(list(sheet_rows.values()), dtype=np.int64)
+        self.last_update = None
+        self._build()
+
+    def _build(self):
+        self.params = sfm.input_parameters(self.input_data)
+        self.n_years = int(self.params['years_projection'].max()) if len(self.params) else 0
+        rows = np.arange(len(self.params))
+        scenarios = np.arange(len(self.scenario_names))
+        self.values = {}
+        for node, _, _ in NODES:
+            self.values[node] = tuple(np.array(values, dtype=float) for values in self._compute(node, rows, scenarios))
+        self.summary = self._summary_rows(rows, scenarios)
+
+    def _compute(self, node, rows, scenarios):
+        params = self.params[rows]
+        if node == 'tariff':
+            return (sfm.tariff_path(params, self.n_years),)
+        if node == 'buyback':
+            return (sfm.buyback_path(params, self.n_years),)
+        if node == 'opex':
+            return (sfm.opex_path(params, self.n_years),)
+        if node == 'pv_generation':
+            return sfm.pv_generation_paths(params, self.n_years)
+        if node == 'investment':
+            return sfm.investment_paths(params, self.n_years)
+        if node == 'consumption':
+            change_table = sfm.parse_scenarios(self.scenario_input_data.iloc[self.scenario_sheet_rows[scenarios]])
+            return (sfm.consumption_matrix(change_table, self.n_years),)
+
+        per_input = lambda node: tuple(values[rows] for values in self.values[node])
+        per_pair = lambda node: tuple(values[np.ix_(rows, scenarios)] for values in self.values[node])
+        if node == 'energy':
+            pv_generations = self.values['pv_generation'][1][rows][:, None, :]
+            return sfm.energy_balance(pv_generations, self.values['consumption'][0][scenarios], params['energy_export_allowed'][:, None, None])
+        if node == 'savings':
+            return sfm.energy_savings(params, per_pair('energy'), self.values['tariff'][0][rows], self.values['buyback'][0][rows])
+        if node == 'cash_flows':
+            total_expenses_base, total_expenses, total_incomes, cash_flows_base, cash_flows = sfm.cash_flow_paths(
+                params, per_pair('savings'), self.values['opex'][0][rows], per_input('investment'))
+            shape = cash_flows.shape
+            return (np.broadcast_to(total_expenses_base[:, None, :], shape), np.broadcast_to(total_expenses[:, None, :], shape),
+                    total_incomes, cash_flows_base, cash_flows, np.cumsum(cash_flows_base, axis=-1), np.cumsum(cash_flows, axis=-1))
+        if node == 'metrics':
+            metrics = sfm.pair_metrics(params, self.flows(rows, scenarios))
+            return tuple(metrics[name].reshape(len(rows), len(scenarios)) for name in sfm.PAIR_METRICS)
+        raise ValueError(f"Unknown node '{node}'")
+
+    # Result series of rows x scenarios, keyed like compute_cash_flows' output
+    def flows(self, rows, scenarios):
+        shape = (len(rows), len(scenarios), self.n_years)
+        flows = {}
+        for column, (node, position) in FLOW_SOURCES.items():
+            values = self.values[node][position]
+            if values.ndim == 2:
+                flows[column] = np.broadcast_to(values[rows][:, None, :], shape)
+            else:
+                flows[column] = values[np.ix_(rows, scenarios)]
+        return flows
+
+    def _summary_rows(self, rows, scenarios):
+        metrics = {name: values[np.ix_(rows, scenarios)].ravel() for name, values in zip(sfm.PAIR_METRICS, self.values['metrics'])}
+        scenario_names = [self.scenario_names[position] for position in scenarios]
+        return sfm.summary_table(self.input_data.iloc[rows], self.params[rows], scenario_names,
+                                 self.values['consumption'][0][scenarios], self.flows(rows, scenarios), metrics)
+
+    def _update(self, fields, rows, scenarios):
+        start = time.perf_counter()
+        recomputed = {}
+        for node in dirty_nodes(fields):
+            scope = next(scope for name, scope, _ in NODES if name == node)
+            if scope == 'input':
+                index, size = rows, len(rows)
+            elif scope == 'scenario':
+                index, size = scenarios, len(scenarios)
+            else:
+                index, size = np.ix_(rows, scenarios), len(rows) * len(scenarios)
+            for stored, values in zip(self.values[node], self._compute(node, rows, scenarios)):
+                stored[index] = values
+            recomputed[node] = size
+
+        table = self._summary_rows(rows, scenarios)
+        positions = (rows[:, None] * len(self.scenario_names) + scenarios[None, :]).ravel()
+        for column_position, column in enumerate(table.columns):
+            self.summary.iloc[positions, column_position] = table[column].to_numpy()
+        self.last_update = {'nodes': recomputed, 'pairs': len(positions), 'seconds': time.perf_counter() - start}
+        return self.summary.iloc[positions]
+
+    # Sets one Input Details value of an Input Set (index + 1, as in the Summary) and returns the
+    # updated Summary rows of that Input Set
+    def set_input(self, input_set, column, value):
+        position = self.input_positions.get(input_set)
+        if position is None:
+            raise KeyError(f'No Input Set {input_set}')
+        if column not in INPUT_FIELDS:
+            raise ValueError(f"'{column}' is not an 'Input Details' parameter")
+        row = self.input_data.iloc[[position]].copy()
+        _set_value(row, 0, column, value)
+        sfm.validate_inputs(row, self.scenario_input_data.iloc[:0])
+
+        _set_value(self.input_data, position, column, value)
+        self.params[position] = sfm.input_parameters(row)[0]
+        if self.params['years_projection'][position] > self.n_years:
+            # Longer than every series held so far: rebuild at the new length
+            start = time.perf_counter()
+            self._build()
+            self.last_update = {'nodes': {node: None for node, _, _ in NODES}, 'pairs': len(self.summary),
+                                'seconds': time.perf_counter() - start}
+            return self.summary.iloc[position * len(self.scenario_names):(position + 1) * len(self.scenario_names)]
+        return self._update([INPUT_FIELDS[column]], np.array([position]), np.arange(len(self.scenario_names)))
+
+    # Sets one Scenarios value of a scenario and returns the updated Summary rows of that scenario.
+    # A repeated scenario name edits the row the model uses, which is the last one.
+    def set_scenario(self, scenario_name, column, value):
+        position = self.scenario_positions.get(scenario_name)
+        if position is None:
+            raise KeyError(f"No scenario '{scenario_name}'")
+        if column not in SCENARIO_EDIT_COLUMNS:
+            raise ValueError(f"'{column}' is not an editable 'Scenarios' column")
+        sheet_row = int(self.scenario_sheet_rows[position])
+        row = self.scenario_input_data.iloc[[sheet_row]].copy()
+        _set_value(row, 0, column, value)
+        sfm.validate_inputs(self.input_data.iloc[:0], row)
+
+        _set_value(self.scenario_input_data, sheet_row, column, value)
+        return self._update([SCENARIO_FIELD], np.arange(len(self.params)), np.array([position]))
+
+    def results(self):
+        results = model_results.ModelResults(sfm.RESULT_COLUMNS, self.scenario_names)
+        rows = np.arange(len(self.params))
+        if len(rows):
+            flows = self.flows(rows, np.arange(len(self.scenario_names)))
+            results.add(self.input_data.index.to_numpy() + 1, self.params['years_projection'], sfm.pack_results(flows), self.summary.copy())
+        return results